@@ -109,4 +109,17 @@ class DungeonSystem:
             self.state, 
             debug_show_all=debug,
             visibility_system=self.state.visibility_system
+        )
+
+    def get_image_version(self, debug=False):
+        """Frame version of the last get_image(debug)"""
+        return self.renderer.frame_version(debug)
+
+    def get_image_patches(self, since, debug=False):
+        """(version, patches) bringing a get_image(debug) at frame version since up to date"""
+        return self.renderer.render_patches(
+            self.state,
+            since,
+            debug_show_all=debug,
+            visibility_system=self.state.visibility_system
         )
\ No newline at end of file
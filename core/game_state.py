@@ -15,6 +15,12 @@ class GameState:
             return img.convert('RGB')
         return img
     
+    def get_dungeon_image_version(self, debug=False):
+        return self.dungeon.get_image_version(debug)
+    
+    def get_dungeon_patches(self, since, debug=False):
+        return self.dungeon.get_image_patches(since, debug)
+    
     def get_current_room(self):
         return self.dungeon.get_current_room_description()
 
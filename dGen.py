@@ -1,10 +1,448 @@
 import math
+import os
 import random
 import time
-from collections import defaultdict
+import sys
+import contextlib
+import functools
+import heapq
+import json
+import logging
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import chain, islice
 from PIL import Image, ImageDraw, ImageFont
 import io
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the 'numpy' grid backend and 'pcg64' prng
+    np = None
+
+logger = logging.getLogger('dGen')
+
+# Call counters kept in DungeonGenerator.counters: PRNG draws (rand_int),
+# room placement probes, tunnel probes and dead-end collapse steps
+PROFILE_COUNTERS = ('rand', 'sound_room', 'sound_tunnel', 'collapse')
+
+# Number of doubles drawn per refill by the buffered PRNG engines
+PRNG_BUFFER_SIZE = 4096
+
+
+def legacy_sin_random(seed):
+    """Original sin-hash generator; bit-exact with dungeons saved by seed"""
+    def prng():
+        nonlocal seed
+        current = seed
+        seed += 1
+        value = math.sin(current) * 10000
+        return value - math.floor(value)
+    return prng
+
+
+def pcg64_random(seed):
+    """numpy PCG64 stream served from pre-drawn buffers of PRNG_BUFFER_SIZE doubles"""
+    if np is None:
+        raise ImportError("prng='pcg64' requires numpy to be installed")
+    rng = np.random.Generator(np.random.PCG64(seed & 0xFFFFFFFFFFFFFFFF))
+    
+    def stream():
+        while True:
+            yield from rng.random(PRNG_BUFFER_SIZE).tolist()
+    return stream().__next__
+
+
+def mt19937_random(seed):
+    """Standard library Mersenne Twister; fast and needs no extra packages"""
+    return random.Random(seed).random
+
+
+# PRNG engines selectable with opts['prng']; each takes a seed and returns a
+# callable yielding floats in [0, 1)
+PRNG_ENGINES = {
+    'legacy-sin': legacy_sin_random,
+    'pcg64': pcg64_random,
+    'mt19937': mt19937_random,
+}
+
+
+def sector_seed(seed, index):
+    """Seed of sector index of a mega dungeon: splitmix64 of (seed, index), cut to 48 bits"""
+    # Sectors must not share streams, and legacy-sin streams of nearby
+    # seeds overlap (seed n + 1 is seed n one draw later)
+    z = (seed + (index + 1) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return (z ^ (z >> 31)) >> 16
+
+
+def _generate_chunk(chunk):
+    """Process-pool worker: build each (index, options) pair into a compact result"""
+    results = []
+    for index, options in chunk:
+        with contextlib.redirect_stdout(io.StringIO()):  # create_dungeon prints its counts
+            generator = DungeonGenerator(options).create_dungeon()
+        result = generator.to_result()
+        result['index'] = index
+        results.append(result)
+    return results
+
+
+def _generate_sector(job):
+    """Process-pool worker: one sector of DungeonGenerator.create_mega_dungeon as a compact result"""
+    generator = DungeonGenerator(job['options'])
+    generator.create_sector(job['seams'], job['stairs'])
+    return generator.to_result()
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Render colours
+BACKGROUND_COLOR = '#5f5e67'
+ROOM_COLOR = '#ffffff'  # Eggshell
+CORRIDOR_COLOR = '#d3d3d3'  # Light gray
+DOOR_COLOR = '#8B4513'
+ARCH_COLOR = '#A07828'
+STAIR_COLOR = '#111111'
+GRID_COLOR = '#000000'
+LABEL_COLOR = '#2c3e50'
+LEGEND_COLOR = '#3a3a3a'
+
+# zlib level for generate_png output; palette PNGs at a light level keep
+# encoding from dominating the render time
+PNG_COMPRESS_LEVEL = 3
+
+# Corridor segments per 'corridors' event of create_dungeon_iter
+STREAM_BATCH = 64
+
+# create_mega_dungeon: side of the square sectors generated in parallel, and
+# seam length (cells) per guaranteed corridor between neighbouring sectors
+MEGA_SECTOR_SIZE = 256
+SEAM_SPACING = 64
+
+# Slippy-map tiles: edge length in px, and the smallest cell size in px at
+# which a zoom level still draws labels, glyphs and grid
+TILE_SIZE = 256
+TILE_DETAIL_MIN = 6
+
+# Maps are composed as palette images. The first entries are fixed (their
+# index is the position here); the rest of the 256 slots hold the legend's
+# anti-aliased text colours. DungeonGenerator.base_layer only uses the
+# first three: 0 background, 1 corridor, 2 room.
+MAP_COLORS = [BACKGROUND_COLOR, CORRIDOR_COLOR, ROOM_COLOR, DOOR_COLOR, ARCH_COLOR,
+              STAIR_COLOR, GRID_COLOR, LABEL_COLOR, LEGEND_COLOR]
+
+
+def palette_bytes(colors):
+    return [int(color[k:k + 2], 16) for color in colors for k in (1, 3, 5)]
+
+
+def png_bytes(image):
+    img_io = io.BytesIO()
+    image.save(img_io, 'PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return img_io.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def label_font(size):
+    """Room label font, loaded once per size for the whole process"""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_sprite(kind, glyph_type, orientation, cell_size):
+    """
+    Door ('door') or stair ('stair') glyph covering one cell and its far edges,
+    as (palette image, mask) ready to paste onto a map.
+    """
+    sprite = Image.new('RGBA', (cell_size + 1, cell_size + 1), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    if kind == 'door':
+        draw_door(draw, 0, 0, cell_size, glyph_type, orientation)
+    else:
+        draw_stairs(draw, 0, 0, cell_size, glyph_type, orientation)
+    
+    # Glyphs only use MAP_COLORS, so quantizing against them is exact
+    palette = Image.new('P', (1, 1))
+    palette.putpalette(palette_bytes(MAP_COLORS))
+    indexed = sprite.convert('RGB').quantize(palette=palette, dither=Image.Dither.NONE)
+    return indexed, sprite.getchannel('A')
+
+
+@functools.lru_cache(maxsize=None)
+def legend_panel():
+    """
+    Feature legend pasted to the right of every map, as a palette image whose
+    palette is the full map palette (MAP_COLORS then the legend's own colours).
+    """
+    legend_width = 200
+    panel = Image.new('RGB', (legend_width, 600), color=LEGEND_COLOR)
+    legend_draw = ImageDraw.Draw(panel)
+    legend_x = 10
+    legend_y = 10
+    icon_size = 20
+    spacing = 10
+    font = ImageFont.load_default()
+    legend_draw.text((legend_x, legend_y), "Dungeon Features Legend", fill='white', font=font)
+    legend_y += 25
+    
+    items = [
+        {'name': 'Room', 'draw': lambda d, x, y: d.rectangle([x, y, x+icon_size, y+icon_size], fill=ROOM_COLOR)},
+        {'name': 'Corridor', 'draw': lambda d, x, y: d.rectangle([x, y, x+icon_size, y+icon_size], fill=CORRIDOR_COLOR)},
+        {'name': 'Closed Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'door', 'horizontal', True)},
+        {'name': 'Open Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'door_open', 'horizontal', True)},
+        {'name': 'Broken Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'door_broken', 'horizontal', True)},
+        {'name': 'Locked Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'lock', 'horizontal', True)},
+        {'name': 'Trapped Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'trap', 'horizontal', True)},
+        {'name': 'Portcullis', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'portc', 'horizontal', True)},
+        {'name': 'Open Portcullis', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'portc_open', 'horizontal', True)},
+        {'name': 'Broken Portcullis', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'portc_broken', 'horizontal', True)},
+        {'name': 'Stairs Up', 'draw': lambda d, x, y: 
+            (d.rectangle([x, y, x+icon_size, y+icon_size], fill=CORRIDOR_COLOR),
+             draw_stairs(d, x, y, icon_size, 'up', 'vertical'))},
+        {'name': 'Stairs Down', 'draw': lambda d, x, y: 
+            (d.rectangle([x, y, x+icon_size, y+icon_size], fill=CORRIDOR_COLOR),
+             draw_stairs(d, x, y, icon_size, 'down', 'vertical'))}
+    ]
+    
+    for i, item in enumerate(items):
+        y_pos = legend_y + i * (icon_size + spacing)
+        item['draw'](legend_draw, legend_x, y_pos)
+        legend_draw.text((legend_x + icon_size + 10, y_pos + icon_size//2), 
+                       item['name'], fill='white', anchor='lm', font=font)
+    
+    # Quantize once into the slots after MAP_COLORS and shift the indices there
+    n_fixed = len(MAP_COLORS)
+    quantized = panel.quantize(colors=256 - n_fixed, method=Image.Quantize.FASTOCTREE,
+                               dither=Image.Dither.NONE)
+    n_colors = len(quantized.getcolors(256))
+    shift = bytes(min(k + n_fixed, 255) for k in range(256))
+    indexed = Image.frombytes('P', panel.size, quantized.tobytes().translate(shift))
+    indexed.putpalette(palette_bytes(MAP_COLORS) + quantized.getpalette()[:3 * n_colors])
+    return indexed
+
+
+# Door drawing shared by the map sprites and the legend
+def draw_door(draw, x, y, cell_size, door_type, orientation, is_legend=False):
+    door_color = DOOR_COLOR
+    arch_color = ARCH_COLOR
+    door_width = cell_size // 3
+    arch_height = cell_size // 6
+    
+    if is_legend:
+        bg_color = CORRIDOR_COLOR
+        draw.rectangle([x, y, x+cell_size, y+cell_size], fill=bg_color)
+    
+    if door_type != 'arch':
+        if orientation == 'horizontal':
+            draw.rectangle([
+                x + (cell_size - door_width)//2, y,
+                x + (cell_size + door_width)//2, y + arch_height
+            ], fill=arch_color)
+            draw.rectangle([
+                x + (cell_size - door_width)//2, y + cell_size - arch_height,
+                x + (cell_size + door_width)//2, y + cell_size
+            ], fill=arch_color)
+        else:
+            draw.rectangle([
+                x, y + (cell_size - door_width)//2,
+                x + arch_height, y + (cell_size + door_width)//2
+            ], fill=arch_color)
+            draw.rectangle([
+                x + cell_size - arch_height, y + (cell_size - door_width)//2,
+                x + cell_size, y + (cell_size + door_width)//2
+            ], fill=arch_color)
+    
+    if door_type in ['door', 'lock', 'trap']:
+        if orientation == 'horizontal':
+            draw.rectangle([
+                x + (cell_size - door_width)//2, y + arch_height,
+                x + (cell_size + door_width)//2, y + cell_size - arch_height
+            ], fill=door_color)
+        else:
+            draw.rectangle([
+                x + arch_height, y + (cell_size - door_width)//2,
+                x + cell_size - arch_height, y + (cell_size + door_width)//2
+            ], fill=door_color)
+        
+        if door_type == 'lock':
+            lock_size = cell_size // 6
+            center_x = x + cell_size // 2
+            center_y = y + cell_size // 2
+            diamond = [
+                (center_x, center_y - lock_size//2),
+                (center_x + lock_size//2, center_y),
+                (center_x, center_y + lock_size//2),
+                (center_x - lock_size//2, center_y)
+            ]
+            draw.polygon(diamond, fill='#ffffff')
+    
+    elif door_type == 'arch':
+        pass
+    
+    elif door_type == 'secret':
+        pass
+
+    elif door_type == 'door_open':
+        door_width = cell_size // 3
+        door_length = cell_size * 2 // 3
+        sin60 = 0.866
+        cos60 = 0.5
+        
+        if orientation == 'horizontal':
+            hinge_x = x + cell_size // 2
+            hinge_y = y + arch_height
+            unrotated = [
+                (hinge_x - door_width//2, hinge_y),
+                (hinge_x + door_width//2, hinge_y),
+                (hinge_x + door_width//2, hinge_y + door_length),
+                (hinge_x - door_width//2, hinge_y + door_length)
+            ]
+            rotated = []
+            for px, py in unrotated:
+                tx = px - hinge_x
+                ty = py - hinge_y
+                rx = tx * cos60 + ty * sin60
+                ry = -tx * sin60 + ty * cos60
+                rotated.append((int(hinge_x + rx), int(hinge_y + ry)))
+            draw.polygon(rotated, fill=door_color)
+        else:
+            hinge_x = x + arch_height
+            hinge_y = y + cell_size // 2
+            unrotated = [
+                (hinge_x, hinge_y - door_width//2),
+                (hinge_x, hinge_y + door_width//2),
+                (hinge_x + door_length, hinge_y + door_width//2),
+                (hinge_x + door_length, hinge_y - door_width//2)
+            ]
+            rotated = []
+            for px, py in unrotated:
+                tx = px - hinge_x
+                ty = py - hinge_y
+                rx = tx * cos60 + ty * sin60
+                ry = -tx * sin60 + ty * cos60
+                rotated.append((int(hinge_x + rx), int(hinge_y + ry)))
+            draw.polygon(rotated, fill=door_color)
+    
+    elif door_type == 'door_broken':
+        plank_width = max(1, cell_size // 6)
+        offset = cell_size // 4
+        offset2 = cell_size // 6
+        draw.line([
+            (x + offset, y + offset2),
+            (x + cell_size//2 - offset2, y + cell_size - offset2)
+        ], fill=door_color, width=plank_width)
+        draw.line([
+            (x + cell_size - offset2, y + offset),
+            (x + offset2, y + cell_size - offset)
+        ], fill=door_color, width=plank_width)
+            
+    elif door_type == 'portc':
+        bar_count = 5
+        bar_radius = max(1, cell_size // 20)
+        bar_spacing = cell_size / (bar_count + 1)
+        if orientation == 'horizontal':
+            for i in range(1, bar_count + 1):
+                bar_y = y + i * bar_spacing
+                draw.ellipse([
+                    x + cell_size//2 - bar_radius, bar_y - bar_radius,
+                    x + cell_size//2 + bar_radius, bar_y + bar_radius
+                ], fill=door_color)
+        else:
+            for i in range(1, bar_count + 1):
+                bar_x = x + i * bar_spacing
+                draw.ellipse([
+                    bar_x - bar_radius, y + cell_size//2 - bar_radius,
+                    bar_x + bar_radius, y + cell_size//2 + bar_radius
+                ], fill=door_color)
+
+    elif door_type == 'portc_open':
+        bar_radius = max(1, cell_size // 20)
+        if orientation == 'horizontal':
+            for i in range(1, 4):
+                bar_x = x + i * cell_size // 4
+                draw.ellipse([
+                    bar_x - bar_radius, y + bar_radius,
+                    bar_x + bar_radius, y + 3 * bar_radius
+                ], fill=door_color)
+                draw.ellipse([
+                    bar_x - bar_radius, y + cell_size - 3 * bar_radius,
+                    bar_x + bar_radius, y + cell_size - bar_radius
+                ], fill=door_color)
+        else:
+            for i in range(1, 4):
+                bar_y = y + i * cell_size // 4
+                draw.ellipse([
+                    x + bar_radius, bar_y - bar_radius,
+                    x + 3 * bar_radius, bar_y + bar_radius
+                ], fill=door_color)
+                draw.ellipse([
+                    x + cell_size - 3 * bar_radius, bar_y - bar_radius,
+                    x + cell_size - bar_radius, bar_y + bar_radius
+                ], fill=door_color)
+
+    elif door_type == 'portc_broken':
+        bar_count = 3
+        bar_radius = max(1, cell_size // 20)
+        bar_spacing = cell_size / (bar_count + 1)
+        if orientation == 'horizontal':
+            for i in range(1, bar_count + 1):
+                bar_y = y + i * bar_spacing
+                draw.ellipse([
+                    x + cell_size//2 - bar_radius, bar_y - bar_radius,
+                    x + cell_size//2 + bar_radius, bar_y + bar_radius
+                ], fill=door_color)
+        else:
+            for i in range(1, bar_count + 1):
+                bar_x = x + i * bar_spacing
+                draw.ellipse([
+                    bar_x - bar_radius, y + cell_size//2 - bar_radius,
+                    bar_x + bar_radius, y + cell_size//2 + bar_radius
+                ], fill=door_color)
+
+
+# Stairs (tapering for down stairs)
+def draw_stairs(draw, x, y, cell_size, stair_type, orientation):
+    step_count = 4
+    spacing = cell_size / (step_count + 1)
+    max_length = cell_size * 0.8
+    min_length = cell_size * 0.2
+    center_x = x + cell_size // 2
+    center_y = y + cell_size // 2
+    
+    if orientation == 'horizontal':
+        for i in range(1, step_count + 1):
+            length = max_length
+            if stair_type == 'down':
+                length = max_length - (max_length - min_length) * (i-1) / (step_count-1)
+            x_pos = x + i * spacing
+            draw.line([
+                x_pos, center_y - length//2,
+                x_pos, center_y + length//2
+            ], fill=STAIR_COLOR, width=1)
+    else:
+        for i in range(1, step_count + 1):
+            length = max_length
+            if stair_type == 'down':
+                length = max_length - (max_length - min_length) * (i-1) / (step_count-1)
+            y_pos = y + i * spacing
+            draw.line([
+                center_x - length//2, y_pos,
+                center_x + length//2, y_pos
+            ], fill=STAIR_COLOR, width=1)
+
+
 class DungeonGenerator:
     def __init__(self, options=None):
         if options is None:
@@ -23,8 +461,19 @@ class DungeonGenerator:
             'map_style': 'Standard',
             'cell_size': 18,
             'grid': 'Square',
+            'grid_backend': 'list',  # 'list' or 'numpy' (uint32 ndarray)
+            'prng': 'legacy-sin',  # any key of PRNG_ENGINES
+            'log_profile': False,  # log phase timings and counters as one JSON line
+            'connectivity': None,  # None, 'validate' (report in stats) or 'repair' (also join components)
+            'region': None,  # [row0, col0, n_rows, n_cols] of the whole map when generating one sector of it
+            'up_stair': None,  # [row, col] (odd) the first up stair must take, e.g. under the level above's down stair
         }
         self.opts.update(options)
+        self.use_numpy = self.opts['grid_backend'] == 'numpy'
+        if self.use_numpy and np is None:
+            raise ImportError("grid_backend='numpy' requires numpy to be installed")
+        if self.opts['prng'] not in PRNG_ENGINES:
+            raise ValueError(f"Unknown prng: {self.opts['prng']}")
         
         # Bit flags
         self.NOTHING = 0x00000000
@@ -33,7 +482,8 @@ class DungeonGenerator:
         self.CORRIDOR = 0x00000004
         self.PERIMETER = 0x00000010
         self.ENTRANCE = 0x00000020
-        self.ROOM_ID = 0x0000FFC0
+        self.ROOM_ID = 0x0000FFC0  # legacy copy of room ids up to ROOM_ID_MAX; room_cell holds them all
+        self.ROOM_ID_MAX = self.ROOM_ID >> 6
         self.ARCH = 0x00010000
         self.DOOR = 0x00020000
         self.LOCKED = 0x00040000
@@ -49,6 +499,10 @@ class DungeonGenerator:
         self.PORTC_OPEN = 0x04000000
         self.PORTC_BROKEN = 0x08000000
         
+        # All 32 flag bits; clear flags with CELL_MASK ^ FLAG so the result
+        # stays a valid uint32 for the numpy backend
+        self.CELL_MASK = 0xFFFFFFFF
+        
         self.OPENSPACE = self.ROOM | self.CORRIDOR | self.ENTRANCE
         self.DOORSPACE = (self.ARCH | self.DOOR | self.LOCKED | self.TRAPPED | 
                           self.SECRET | self.PORTC | self.DOOR_OPEN | 
@@ -131,6 +585,7 @@ class DungeonGenerator:
         self._prng_seed = self.opts['seed']
         self.rand = self.seeded_random(self._prng_seed)
         self.cell = None
+        self.room_cell = None  # room id per cell (0 outside rooms), same shape as cell
         self.room = []
         self.stairs = []
         self.doorList = []
@@ -143,17 +598,73 @@ class DungeonGenerator:
         self.max_col = 0
         self.room_base = 0
         self.room_radix = 0
+        self.carved = None  # corridor segments recorded by delve_tunnel while streaming
+        self._graph = None  # see graph
+        
+        # Profiling: wall time per phase and call counts of the hot helpers
+        self.phase_ms = {}
+        self.counters = dict.fromkeys(PROFILE_COUNTERS, 0)
+    
+    @property
+    def graph(self):
+        """
+        room_graph() of the finished dungeon, built on first use (timed as
+        phase 'room_graph') so generation alone does not pay for it
+        """
+        if self._graph is None and self.cell is not None:
+            with self.timed('room_graph'):
+                self._graph = self.room_graph()
+        return self._graph
+    
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+    
+    @staticmethod
+    def generate_many(options_list, workers=None, chunk_size=8, ordered=True):
+        """
+        Generate one dungeon per options dict across a process pool.
+        
+        Yields compact results (see to_result) tagged with their 'index' in
+        options_list. Work is submitted in chunks of chunk_size with at most
+        two chunks per worker in flight, so options_list can be a long lazy
+        iterable. ordered=False yields results as soon as their chunk
+        finishes. workers=1 runs inline without a pool.
+        """
+        chunks = _chunked(enumerate(options_list), chunk_size)
+        if workers == 1:
+            for chunk in chunks:
+                yield from _generate_chunk(chunk)
+            return
+        
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if ordered:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_generate_chunk, chunk))
+                    if len(pending) >= max_pending:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+            else:
+                pending = set()
+                for chunk in chunks:
+                    pending.add(pool.submit(_generate_chunk, chunk))
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield from future.result()
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
     
     def seeded_random(self, seed):
-        def prng():
-            nonlocal seed
-            current = seed
-            seed += 1
-            value = math.sin(current) * 10000
-            return value - math.floor(value)
-        return prng
+        return PRNG_ENGINES[self.opts['prng']](seed)
     
     def rand_int(self, max_val):
+        self.counters['rand'] += 1
         return int(self.rand() * max_val)
     
     def shuffle(self, array):
@@ -162,24 +673,451 @@ class DungeonGenerator:
             array[i], array[j] = array[j], array[i]
         return array
     
+    @contextlib.contextmanager
+    def timed(self, phase):
+        """Add the wall time of the with-block to phase_ms[phase]"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.phase_ms[phase] = self.phase_ms.get(phase, 0.0) + elapsed
+    
+    @contextlib.contextmanager
+    def list_cells(self, phase=None):
+        """
+        Run the with-block on a nested-list copy of a numpy grid, stored back
+        as uint32 afterwards (a no-op for the list backend or inside another
+        list_cells block). The per-cell walks (sills, tunnels, stairs,
+        collapse) index cell[r][c] tens of thousands of times, and each of
+        those is two slow scalar lookups on an ndarray. Blocks spanning
+        several phases time the two copies as phase.
+        """
+        if not self.use_numpy or isinstance(self.cell, list):
+            yield
+            return
+        with self.timed(phase) if phase else contextlib.nullcontext():
+            self.cell = self.cell.tolist()
+        try:
+            yield
+        finally:
+            with self.timed(phase) if phase else contextlib.nullcontext():
+                self.cell = np.array(self.cell, dtype=np.uint32)
+    
+    def profile(self):
+        """Phase timings (ms) and counters of the last generation"""
+        return {
+            'phases_ms': {phase: round(ms, 3) for phase, ms in self.phase_ms.items()},
+            'total_ms': round(sum(self.phase_ms.values()), 3),
+            'counters': dict(self.counters),
+        }
+    
+    def log_profile(self):
+        if self.opts['log_profile']:
+            logger.info(json.dumps({
+                'event': 'dungeon_profile',
+                'seed': self.opts['seed'],
+                'size': f"{self.opts['n_rows']}x{self.opts['n_cols']}",
+                'dungeon_layout': self.opts['dungeon_layout'],
+                'room_layout': self.opts['room_layout'],
+                'grid_backend': self.opts['grid_backend'],
+                'prng': self.opts['prng'],
+                **self.profile(),
+            }))
+    
     def create_dungeon(self):
-        self.init_dungeon_size()
-        self.init_cells()
-        self.emplace_rooms()
-        self.open_rooms()
-        self.label_rooms()
-        self.corridors()
-        if self.opts['add_stairs']:
-            self.emplace_stairs()
-        self.clean_dungeon()
+        for _ in self.generate_phases():
+            pass
+        self.log_profile()
         
         # Debug output
         print(f"Generated dungeon with {self.n_rooms} rooms")
         print(f"Doors placed: {len(self.doorList)}")
-        print(f"Corridor cells: {sum(1 for row in self.cell for cell in row if cell & self.CORRIDOR)}")
+        print(f"Corridor cells: {self.count_cells(self.CORRIDOR)}")
         
         return self
     
+    def generate_phases(self):
+        """
+        The phases of create_dungeon, yielding each one's name (as in
+        phase_ms) once it has run, so a caller such as dGenSearch can stop
+        as soon as a phase rules the dungeon out.
+        """
+        with self.timed('init'):
+            self.init_dungeon_size()
+            self.init_cells()
+        yield 'init'
+        with self.timed('emplace_rooms'):
+            self.emplace_rooms()
+        yield 'emplace_rooms'
+        # cell is a list from here up to clean_dungeon (numpy backend)
+        with self.list_cells('list_cells'):
+            with self.timed('open_rooms'):
+                self.open_rooms()
+            yield 'open_rooms'
+            with self.timed('label_rooms'):
+                self.label_rooms()
+            yield 'label_rooms'
+            with self.timed('corridors'):
+                self.corridors()
+            yield 'corridors'
+            if self.opts['add_stairs']:
+                with self.timed('emplace_stairs'):
+                    self.emplace_stairs()
+                yield 'emplace_stairs'
+        with self.timed('clean_dungeon'):
+            self.clean_dungeon()
+        yield 'clean_dungeon'
+    
+    def create_dungeon_iter(self):
+        """
+        Same generation as create_dungeon, yielding a compact event per phase:
+        'start' (size), 'rooms', 'doors' (as opened), 'corridors' events with
+        the [r1, c1, r2, c2] segments carved (at most STREAM_BATCH each), 'stairs',
+        'cleanup' ([r, c, value] for every cell changed by dead-end removal
+        and door cleanup, plus the final door list) and 'done' (stats with
+        the profile).
+        """
+        with self.timed('init'):
+            self.init_dungeon_size()
+            self.init_cells()
+        yield {'phase': 'start', 'n_rows': self.opts['n_rows'], 'n_cols': self.opts['n_cols']}
+        
+        with self.timed('emplace_rooms'):
+            self.emplace_rooms()
+        yield {'phase': 'rooms', 'rooms': [
+            {key: room[key] for key in ('id', 'north', 'south', 'west', 'east')}
+            for room in self.room[1:self.n_rooms + 1]
+        ]}
+        
+        with self.list_cells('list_cells'):
+            with self.timed('open_rooms'):
+                self.open_rooms()
+            yield {'phase': 'doors', 'doors': [dict(door) for door in self.doorList]}
+            
+            with self.timed('label_rooms'):
+                self.label_rooms()
+            self.carved = []
+            walks = self.corridor_walks()
+            try:
+                while True:
+                    # Only time the walking, not the consumer between events
+                    with self.timed('corridors'):
+                        more = next(walks, StopIteration) is not StopIteration
+                    if not more:
+                        break
+                    if self.carved:
+                        yield {'phase': 'corridors', 'segments': self.carved}
+                        self.carved = []
+            finally:
+                self.carved = None
+            
+            if self.opts['add_stairs']:
+                with self.timed('emplace_stairs'):
+                    self.emplace_stairs()
+            yield {'phase': 'stairs', 'stairs': self.stairs}
+        
+        with self.timed('clean_dungeon'):
+            if self.use_numpy:
+                before = self.cell.copy()
+                self.clean_dungeon()
+                changed = [[int(r), int(c), int(self.cell[r, c])] for r, c in np.argwhere(before != self.cell)]
+            else:
+                before = [row[:] for row in self.cell]
+                self.clean_dungeon()
+                changed = [
+                    [r, c, value]
+                    for r, (old_row, row) in enumerate(zip(before, self.cell))
+                    for c, value in enumerate(row) if value != old_row[c]
+                ]
+        self.log_profile()
+        yield {'phase': 'cleanup', 'cells': changed, 'doors': self.doorList}
+        yield {'phase': 'done', 'stats': self.get_stats(profile=True)}
+    
+    def create_mega_dungeon(self, sector_size=MEGA_SECTOR_SIZE, workers=None):
+        """
+        Generate a large map as a grid of sectors of about sector_size cells
+        a side, built in parallel (workers processes; 1 runs inline).
+        
+        Each sector gets its rooms, corridors, stairs and dead-end removal
+        from its own derived seed (sector_seed), with the global layout mask
+        and door rules applied through opts['region']. Before that, this
+        generator picks the seam crossings: at least one cell per
+        SEAM_SPACING of every border between neighbouring sectors, which
+        both sectors open and tunnel to their own corridors, so the map stays
+        connected across sectors. It also decides which sector places each
+        stair. The sectors are then stitched with global room ids, labelled,
+        and their graphs joined through the crossings. Sectors depend only on
+        the seed and map size, so the result does not depend on workers.
+        """
+        with self.timed('init'):
+            self.init_dungeon_size()
+            self.init_cells()
+            row_cuts = self.sector_cuts(self.opts['n_rows'], sector_size)
+            col_cuts = self.sector_cuts(self.opts['n_cols'], sector_size)
+            sectors = [
+                (r0, r1, c0, c1)
+                for r0, r1 in zip(row_cuts, row_cuts[1:]) for c0, c1 in zip(col_cuts, col_cuts[1:])
+            ]
+            jobs = [{'seams': [], 'stairs': []} for _ in sectors]
+            self.plan_seams(sectors, len(col_cuts) - 1, jobs)
+            for i in range(self.opts['add_stairs']):
+                key = ('down', 'up')[i] if i < 2 else ('down', 'up')[self.rand_int(2)]
+                jobs[self.rand_int(len(jobs))]['stairs'].append(key)
+            for index, ((r0, r1, c0, c1), job) in enumerate(zip(sectors, jobs)):
+                job['options'] = dict(
+                    self.opts, seed=sector_seed(self.opts['seed'], index), n_rows=r1 - r0, n_cols=c1 - c0,
+                    region=[r0, c0, self.opts['n_rows'], self.opts['n_cols']],
+                    add_stairs=len(job['stairs']), connectivity=None, log_profile=False,
+                )
+        
+        with self.timed('sectors'):
+            if workers == 1 or len(jobs) == 1:
+                results = [_generate_sector(job) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_generate_sector, jobs))
+        with self.timed('stitch'):
+            graphs = self.stitch_sectors(sectors, results)
+        with self.timed('label_rooms'):
+            self.label_rooms()
+        links = 0
+        with self.timed('clean_dungeon'):
+            if self.opts['connectivity'] == 'repair':
+                links = self.repair_connectivity()
+                if links:
+                    self.fix_doors()
+            self.empty_blocks()
+        with self.timed('room_graph'):
+            # Repair links are not in the sector graphs
+            self.graph = self.room_graph() if links else self.merge_sector_graphs(graphs)
+        self.log_profile()
+        
+        # Debug output
+        print(f"Generated dungeon with {self.n_rooms} rooms in {len(sectors)} sectors")
+        print(f"Doors placed: {len(self.doorList)}")
+        print(f"Corridor cells: {self.count_cells(self.CORRIDOR)}")
+        
+        return self
+    
+    @staticmethod
+    def sector_cuts(n, size):
+        """Even sector boundaries 0..n about size apart; a short last sector joins the previous one"""
+        size = max(2, size // 2 * 2)
+        cuts = list(range(0, n, size)) + [n]
+        if len(cuts) > 2 and cuts[-1] - cuts[-2] < size // 2:
+            del cuts[-2]
+        return cuts
+    
+    def plan_seams(self, sectors, n_sector_cols, jobs):
+        """Choose the crossings of every border between neighbouring sectors and hand them to both sides"""
+        seam_id = 0
+        for index, (r0, r1, c0, c1) in enumerate(sectors):
+            borders = []
+            if c1 < self.opts['n_cols']:
+                borders.append((index + 1, [(r, c1) for r in range(r0 + 1, r1, 2)]))
+            if r1 < self.opts['n_rows']:
+                borders.append((index + n_sector_cols, [(r1, c) for c in range(c0 + 1, c1, 2)]))
+            for other, cells in borders:
+                for r, c in self.seam_crossings(cells):
+                    for k in (index, other):
+                        jobs[k]['seams'].append([r - sectors[k][0], c - sectors[k][2], seam_id])
+                    seam_id += 1
+    
+    def seam_crossings(self, cells):
+        """A random crossing from each SEAM_SPACING stretch of a border, skipping masked cells"""
+        n = max(1, len(cells) * 2 // SEAM_SPACING)
+        crossings = []
+        for k in range(n):
+            stretch = [
+                (r, c) for r, c in cells[k * len(cells) // n:(k + 1) * len(cells) // n]
+                if not self.seam_blocked(r, c)
+            ]
+            if stretch:
+                crossings.append(stretch[self.rand_int(len(stretch))])
+        return crossings
+    
+    def seam_blocked(self, r, c):
+        # Border cells sit on an even row (horizontal border) or column
+        dr, dc = (1, 0) if r % 2 == 0 else (0, 1)
+        return any(self.cell[r + k * dr][c + k * dc] & self.BLOCKED for k in (-1, 0, 1))
+    
+    def create_sector(self, seams, stair_keys):
+        """
+        One sector of create_mega_dungeon: create_dungeon without labels,
+        with the given stairs, and with each seam [r, c, id] (a cell on the
+        grid's edge) opened and tunnelled to the sector's open space once
+        dead ends are gone. The graph gets a 'seam:id' node per crossing.
+        """
+        with self.timed('init'):
+            self.init_dungeon_size()
+            self.init_cells()
+        with self.timed('emplace_rooms'):
+            self.emplace_rooms()
+        with self.list_cells('list_cells'):
+            with self.timed('open_rooms'):
+                self.open_rooms()
+            with self.timed('corridors'):
+                self.corridors()
+            if stair_keys:
+                with self.timed('emplace_stairs'):
+                    self.emplace_stairs(stair_keys)
+        with self.timed('clean_dungeon'):
+            if self.opts['remove_deadends']:
+                self.remove_deadends()
+            self.clean_disconnected_doors()
+            for r, c, _ in seams:
+                self.open_seam(r, c)
+            self.fix_doors()
+            self.empty_blocks()
+        with self.timed('room_graph'):
+            self.graph = self.room_graph([
+                {'id': f'seam:{seam_id}', 'kind': 'seam', 'row': r, 'col': c} for r, c, seam_id in seams
+            ])
+        return self
+    
+    def open_seam(self, r, c):
+        """Open edge cell [r][c] and tunnel from the odd cell inside it to the nearest open cell"""
+        inner_r = 1 if r == 0 else r - 1 if r == self.opts['n_rows'] else r
+        inner_c = 1 if c == 0 else c - 1 if c == self.opts['n_cols'] else c
+        self.cell[r][c] |= self.CORRIDOR
+        if self.cell[inner_r][inner_c] & self.OPENSPACE:
+            return
+        self.cell[inner_r][inner_c] |= self.CORRIDOR
+        path = self.shortest_walk([(inner_r, inner_c)], lambda r, c: self.cell[r][c] & self.OPENSPACE)
+        if path:
+            self.carve_link(path)
+    
+    def stitch_sectors(self, sectors, results):
+        """
+        Copy the sector results into this generator's grid and lists, moving
+        them to map coordinates and numbering rooms and stairs on from the
+        sectors before. Returns the sector graphs with the same renumbering.
+        """
+        self.room = [None]
+        self.doorList = []
+        self.stairs = []
+        self.n_rooms = 0
+        graphs = []
+        for (r0, _, c0, _), result in zip(sectors, results):
+            grid = self.cells_from_bytes(result['grid'], result['n_cols'] + 1)
+            if self.use_numpy:
+                self.cell[r0:r0 + len(grid), c0:c0 + grid.shape[1]] |= grid
+            else:
+                for r, row in enumerate(grid):
+                    target = self.cell[r0 + r]
+                    target[c0:c0 + len(row)] = [a | b for a, b in zip(target[c0:c0 + len(row)], row)]
+            
+            room_offset = self.n_rooms
+            stair_offset = len(self.stairs)
+            doors = {id(door): door for door in result['doors']}
+            for room in result['rooms']:
+                for door_list in room['door'].values():
+                    doors.update((id(door), door) for door in door_list)
+            for door in doors.values():
+                door['row'] += r0
+                door['col'] += c0
+                if 'out_id' in door:
+                    door['out_id'] += room_offset
+            for room in result['rooms']:
+                room['id'] += room_offset
+                for key in ('row', 'north', 'south'):
+                    room[key] += r0
+                for key in ('col', 'west', 'east'):
+                    room[key] += c0
+                self.room.append(room)
+                self.mark_room(room)
+            for stair in result['stairs']:
+                stair['row'] += r0
+                stair['next_row'] += r0
+                stair['col'] += c0
+                stair['next_col'] += c0
+            self.doorList.extend(result['doors'])
+            self.stairs.extend(result['stairs'])
+            self.n_rooms += len(result['rooms'])
+            graphs.append(self.shift_graph(result['graph'], r0, c0, room_offset, stair_offset))
+        self.last_room_id = self.n_rooms
+        return graphs
+    
+    def mark_room(self, room):
+        """Write room's id into room_cell and the legacy ROOM_ID bits of its cells"""
+        flags = room['id'] << 6 if room['id'] <= self.ROOM_ID_MAX else 0
+        keep = self.CELL_MASK ^ self.ROOM_ID
+        if self.use_numpy:
+            block = self.cell[room['north']:room['south'] + 1, room['west']:room['east'] + 1]
+            block &= keep
+            block |= flags
+            self.room_cell[room['north']:room['south'] + 1, room['west']:room['east'] + 1] = room['id']
+            return
+        ids = [room['id']] * room['width']
+        for r in range(room['north'], room['south'] + 1):
+            row = self.cell[r]
+            row[room['west']:room['east'] + 1] = [value & keep | flags for value in row[room['west']:room['east'] + 1]]
+            self.room_cell[r][room['west']:room['east'] + 1] = ids
+    
+    @staticmethod
+    def shift_graph(graph, r0, c0, room_offset, stair_offset):
+        """A sector's room_graph() in map coordinates and numbering (seam nodes are only kept in edges)"""
+        def rename(node_id):
+            kind, number = node_id.split(':')
+            if kind == 'room':
+                return f'room:{int(number) + room_offset}'
+            if kind == 'stair':
+                return f'stair:{int(number) + stair_offset}'
+            return node_id
+        
+        def shift(door):
+            return door and {**door, 'row': door['row'] + r0, 'col': door['col'] + c0}
+        
+        nodes = []
+        for node in graph['nodes']:
+            if node['kind'] == 'room':
+                nodes.append({**node, 'id': rename(node['id']), 'room': node['room'] + room_offset})
+            elif node['kind'] == 'stair':
+                nodes.append({**node, 'id': rename(node['id']), 'row': node['row'] + r0, 'col': node['col'] + c0})
+        edges = [
+            {'from': rename(edge['from']), 'to': rename(edge['to']), 'length': edge['length'],
+             'doors': [shift(door) for door in edge['doors']]}
+            for edge in graph['edges']
+        ]
+        return {'nodes': nodes, 'edges': edges}
+    
+    @staticmethod
+    def merge_sector_graphs(graphs):
+        """
+        One room_graph() of shifted sector graphs: each seam node is removed
+        and its neighbours (on both sides of the border) linked pairwise
+        through it, which keeps every shortest walk between the other nodes.
+        """
+        adjacency = defaultdict(dict)
+        
+        def link(a, b, length, door_a, door_b):
+            if a == b:
+                return
+            if a > b:
+                a, b, door_a, door_b = b, a, door_b, door_a
+            if b not in adjacency[a] or length < adjacency[a][b]['length']:
+                adjacency[a][b] = adjacency[b][a] = {'from': a, 'to': b, 'length': length, 'doors': [door_a, door_b]}
+        
+        for graph in graphs:
+            for edge in graph['edges']:
+                link(edge['from'], edge['to'], edge['length'], *edge['doors'])
+        
+        seams = sorted((node_id for node_id in adjacency if node_id.startswith('seam:')), key=lambda s: int(s[5:]))
+        for seam in seams:
+            ends = []
+            for other, edge in sorted(adjacency.pop(seam).items()):
+                del adjacency[other][seam]
+                ends.append((other, edge['length'], edge['doors'][0] if edge['from'] == other else edge['doors'][1]))
+            for x, (a, length_a, door_a) in enumerate(ends):
+                for b, length_b, door_b in ends[x + 1:]:
+                    link(a, b, length_a + length_b, door_a, door_b)
+        
+        nodes = [node for graph in graphs for node in graph['nodes'] if node['kind'] == 'room']
+        nodes += [node for graph in graphs for node in graph['nodes'] if node['kind'] == 'stair']
+        edges = [adjacency[a][b] for a in sorted(adjacency) for b in sorted(adjacency[a]) if a < b]
+        return {'nodes': nodes, 'edges': edges}
+    
     def init_dungeon_size(self):
         self.n_i = self.opts['n_rows'] // 2
         self.n_j = self.opts['n_cols'] // 2
@@ -195,36 +1133,97 @@ class DungeonGenerator:
         self.room_radix = ((max_val - min_val) // 2) + 1
     
     def init_cells(self):
-        self.cell = [
-            [self.NOTHING] * (self.opts['n_cols'] + 1) 
-            for _ in range(self.opts['n_rows'] + 1)
-        ]
+        if self.use_numpy:
+            self.cell = np.zeros(
+                (self.opts['n_rows'] + 1, self.opts['n_cols'] + 1), dtype=np.uint32
+            )
+        else:
+            self.cell = [
+                [self.NOTHING] * (self.opts['n_cols'] + 1) 
+                for _ in range(self.opts['n_rows'] + 1)
+            ]
+        
+        self.room_cell = self.empty_room_cell()
         
         layout = self.opts['dungeon_layout']
         if layout in self.dungeon_layout:
             self.mask_cells(self.dungeon_layout[layout])
         elif layout == 'Round':
             self.round_mask()
+        self.index_occupancy()
+        if self.opts['up_stair']:
+            # Keep rooms off the pinned stair; corridors then reach it like any odd cell
+            r, c = self.opts['up_stair']
+            self.blocked_rows[r] |= 1 << c
+    
+    def empty_room_cell(self):
+        # uint32 so room ids are not capped by the flag word
+        if self.use_numpy:
+            return np.zeros((self.opts['n_rows'] + 1, self.opts['n_cols'] + 1), dtype=np.uint32)
+        return [[0] * (self.opts['n_cols'] + 1) for _ in range(self.opts['n_rows'] + 1)]
+    
+    def room_at(self, r, c):
+        """Id of the room covering cell [r][c], 0 if none"""
+        return int(self.room_cell[r][c])
+    
+    def index_occupancy(self):
+        """
+        Row bitsets for sound_room: bit c of blocked_rows[r] / room_rows[r] is
+        set when cell [r][c] is BLOCKED / ROOM. BLOCKED is fixed once the
+        layout mask is applied; emplace_room ORs each new room into room_rows.
+        """
+        if self.use_numpy:
+            self.blocked_rows = [
+                int.from_bytes(np.packbits(row, bitorder='little').tobytes(), 'little')
+                for row in (self.cell & self.BLOCKED) != 0
+            ]
+        else:
+            self.blocked_rows = [
+                sum(1 << c for c, cell in enumerate(row) if cell & self.BLOCKED)
+                for row in self.cell
+            ]
+        self.room_rows = [0] * len(self.blocked_rows)
+    
+    def map_frame(self):
+        """(row0, col0, n_rows, n_cols) of the whole map this grid is part of"""
+        if self.opts['region']:
+            return tuple(self.opts['region'])
+        return 0, 0, self.opts['n_rows'], self.opts['n_cols']
     
     def mask_cells(self, mask):
-        r_x = len(mask) / (self.opts['n_rows'] + 1)
-        c_x = len(mask[0]) / (self.opts['n_cols'] + 1)
+        row0, col0, n_rows, n_cols = self.map_frame()
+        r_x = len(mask) / (n_rows + 1)
+        c_x = len(mask[0]) / (n_cols + 1)
+        
+        if self.use_numpy:
+            rows = np.minimum(((row0 + np.arange(self.opts['n_rows'] + 1)) * r_x).astype(np.intp), len(mask) - 1)
+            cols = np.minimum(((col0 + np.arange(self.opts['n_cols'] + 1)) * c_x).astype(np.intp), len(mask[0]) - 1)
+            blocked = ~np.asarray(mask, dtype=bool)[np.ix_(rows, cols)]
+            self.cell[blocked] = self.BLOCKED
+            return
         
         for r in range(self.opts['n_rows'] + 1):
-            mask_row = min(int(r * r_x), len(mask) - 1)  # Ensure within bounds
+            mask_row = min(int((row0 + r) * r_x), len(mask) - 1)  # Ensure within bounds
             for c in range(self.opts['n_cols'] + 1):
-                mask_col = min(int(c * c_x), len(mask[0]) - 1)  # Ensure within bounds
+                mask_col = min(int((col0 + c) * c_x), len(mask[0]) - 1)  # Ensure within bounds
                 if not mask[mask_row][mask_col]:
                     self.cell[r][c] = self.BLOCKED
     
     def round_mask(self):
-        center_r = self.opts['n_rows'] // 2
-        center_c = self.opts['n_cols'] // 2
+        row0, col0, n_rows, n_cols = self.map_frame()
+        center_r = n_rows // 2
+        center_c = n_cols // 2
         radius = min(center_r, center_c) - 2
         
+        if self.use_numpy:
+            rr, cc = np.ogrid[row0:row0 + self.opts['n_rows'] + 1, col0:col0 + self.opts['n_cols'] + 1]
+            d = np.sqrt((rr - center_r) ** 2 + (cc - center_c) ** 2)
+            self.cell[d > radius] = self.BLOCKED
+            return
+        
         for r in range(self.opts['n_rows'] + 1):
             for c in range(self.opts['n_cols'] + 1):
-                d = math.sqrt((r - center_r) ** 2 + (c - center_c) ** 2)
+                d = math.sqrt((row0 + r - center_r) ** 2 + (col0 + c - center_c) ** 2)
                 if d > radius:
                     self.cell[r][c] = self.BLOCKED
     
@@ -240,7 +1239,7 @@ class DungeonGenerator:
             for j in range(self.n_j):
                 c = (j * 2) + 1
                 
-                if self.cell[r][c] & self.ROOM:
+                if self.room_rows[r] >> c & 1:  # cell[r][c] & ROOM
                     continue
                 if (i == 0 or j == 0) and self.rand_int(2):
                     continue
@@ -261,8 +1260,6 @@ class DungeonGenerator:
     def emplace_room(self, proto=None):
         if proto is None:
             proto = {}
-        if self.n_rooms >= 999:
-            return
         
         proto = self.set_room(proto)
         r1 = (proto['i'] * 2) + 1
@@ -276,10 +1273,7 @@ class DungeonGenerator:
             return
         
         # Check for collisions with existing rooms (including perimeter)
-        hit = self.sound_room(r1, c1, r2, c2)
-        if hit.get('blocked'):
-            return
-        if hit:
+        if self.room_collision(r1, c1, r2, c2):
             return
         
         room_id = self.n_rooms + 1
@@ -301,25 +1295,37 @@ class DungeonGenerator:
             'door': {}
         }
         
-        # Mark room cells
+        # Mark room cells; ids past ROOM_ID_MAX only go to room_cell
+        flags = self.ROOM | (room_id << 6 if room_id <= self.ROOM_ID_MAX else 0)
+        span = ((1 << width) - 1) << c1
         for r in range(r1, r2 + 1):
-            for c in range(c1, c2 + 1):
-                self.cell[r][c] |= self.ROOM | (room_id << 6)
-        
-        # Mark perimeter as soft blocks only (FIXED)
-        for r in range(r1 - 1, r2 + 2):
-            if r < 0 or r > self.opts['n_rows']:
-                continue
-            for c in [c1 - 1, c2 + 1]:
-                if 0 <= c <= self.opts['n_cols']:
-                    self.cell[r][c] |= self.PERIMETER  # Soft block only
-        
-        for c in range(c1 - 1, c2 + 2):
-            if c < 0 or c > self.opts['n_cols']:
-                continue
-            for r in [r1 - 1, r2 + 1]:
-                if 0 <= r <= self.opts['n_rows']:
-                    self.cell[r][c] |= self.PERIMETER  # Soft block only
+            self.room_rows[r] |= span
+        if self.use_numpy:
+            self.cell[r1:r2 + 1, c1:c2 + 1] |= flags
+            self.room_cell[r1:r2 + 1, c1:c2 + 1] = room_id
+        else:
+            ids = [room_id] * width
+            for r in range(r1, r2 + 1):
+                row = self.cell[r]
+                row[c1:c2 + 1] = [cell | flags for cell in row[c1:c2 + 1]]
+                self.room_cell[r][c1:c2 + 1] = ids
+        
+        # Mark perimeter as soft blocks only (FIXED); the bounds check above
+        # keeps the whole perimeter inside the grid
+        if self.use_numpy:
+            # Basic slices; fancy indexing costs several times more per room
+            self.cell[r1 - 1:r2 + 2, c1 - 1] |= self.PERIMETER
+            self.cell[r1 - 1:r2 + 2, c2 + 1] |= self.PERIMETER
+            self.cell[r1 - 1, c1 - 1:c2 + 2] |= self.PERIMETER
+            self.cell[r2 + 1, c1 - 1:c2 + 2] |= self.PERIMETER
+        else:
+            for r in range(r1, r2 + 1):
+                row = self.cell[r]
+                row[c1 - 1] |= self.PERIMETER
+                row[c2 + 1] |= self.PERIMETER
+            for r in (r1 - 1, r2 + 1):
+                row = self.cell[r]
+                row[c1 - 1:c2 + 2] = [cell | self.PERIMETER for cell in row[c1 - 1:c2 + 2]]
     
     def set_room(self, proto):
         if 'height' not in proto:
@@ -348,21 +1354,45 @@ class DungeonGenerator:
         
         return proto
     
+    def room_collision(self, r1, c1, r2, c2):
+        """'blocked', 'room' or None for the rectangle, in O(height) from the row bitsets"""
+        self.counters['sound_room'] += 1
+        span = ((1 << (c2 - c1 + 1)) - 1) << c1
+        blocked_rows = self.blocked_rows
+        room_rows = self.room_rows
+        for r in range(r1, r2 + 1):
+            if blocked_rows[r] & span:
+                return 'blocked'
+        for r in range(r1, r2 + 1):
+            if room_rows[r] & span:
+                return 'room'
+        return None
+    
     def sound_room(self, r1, c1, r2, c2):
+        collision = self.room_collision(r1, c1, r2, c2)
+        if collision == 'blocked':
+            return {'blocked': True}
+        if collision is None:
+            return {}
+        
+        # Count the hit room ids, visiting only the set bits of each row
+        span = ((1 << (c2 - c1 + 1)) - 1) << c1
         hit = {}
         for r in range(r1, r2 + 1):
-            for c in range(c1, c2 + 1):
-                if self.cell[r][c] & self.BLOCKED:
-                    return {'blocked': True}
-                if self.cell[r][c] & self.ROOM:
-                    room_id = (self.cell[r][c] & self.ROOM_ID) >> 6
-                    hit[room_id] = hit.get(room_id, 0) + 1
+            bits = self.room_rows[r] & span
+            while bits:
+                low = bits & -bits
+                c = low.bit_length() - 1
+                room_id = self.room_at(r, c)
+                hit[room_id] = hit.get(room_id, 0) + 1
+                bits ^= low
         return hit
     
     def open_rooms(self):
         self.connect = {}
-        for room_id in range(1, self.n_rooms + 1):
-            self.open_room(self.room[room_id])
+        with self.list_cells():
+            for room_id in range(1, self.n_rooms + 1):
+                self.open_room(self.room[room_id])
         self.connect = None
     
     def open_room(self, room):
@@ -392,7 +1422,7 @@ class DungeonGenerator:
             for x in range(3):
                 r = sill['sill_r'] + (self.di[open_dir] * x)
                 c = sill['sill_c'] + (self.dj[open_dir] * x)
-                self.cell[r][c] &= ~self.PERIMETER
+                self.cell[r][c] &= self.CELL_MASK ^ self.PERIMETER
                 self.cell[r][c] |= self.ENTRANCE
             
             # Create door (FIXED: full door creation preserved)
@@ -496,10 +1526,11 @@ class DungeonGenerator:
             return None
 
         # NEW: Check if door is at the edge of round layout
-        center_r = self.opts['n_rows'] // 2
-        center_c = self.opts['n_cols'] // 2
+        row0, col0, n_rows, n_cols = self.map_frame()
+        center_r = n_rows // 2
+        center_c = n_cols // 2
         radius = min(center_r, center_c) - 2
-        door_dist = math.sqrt((door_r - center_r) ** 2 + (door_c - center_c) ** 2)
+        door_dist = math.sqrt((row0 + door_r - center_r) ** 2 + (col0 + door_c - center_c) ** 2)
         
         # Reject doors too close to edge
         if door_dist > radius * 0.95:
@@ -517,7 +1548,7 @@ class DungeonGenerator:
             
         out_id = None
         if self.cell[out_r][out_c] & self.ROOM:
-            out_id = (self.cell[out_r][out_c] & self.ROOM_ID) >> 6
+            out_id = self.room_at(out_r, out_c)
             if out_id == room['id']:
                 return None
         
@@ -551,6 +1582,8 @@ class DungeonGenerator:
             label = str(room_id)
             length = len(label)
             label_r = (room['north'] + room['south']) // 2
+            if length > room['width']:
+                continue  # would spill into the walls; render_map labels rooms from self.room
             label_c = (room['west'] + room['east'] - length) // 2 + 1
             
             for i, char in enumerate(label):
@@ -558,24 +1591,57 @@ class DungeonGenerator:
                 self.cell[label_r][label_c + i] |= (char_code << 24)
     
     def corridors(self):
+        with self.list_cells():
+            for _ in self.corridor_walks():
+                pass
+    
+    def corridor_walks(self):
+        """Start a tunnel from every uncarved cell, yielding after each walk"""
         for i in range(1, self.n_i):
             r = (i * 2) + 1
             for j in range(1, self.n_j):
                 c = (j * 2) + 1
                 if self.cell[r][c] & self.CORRIDOR:
                     continue
-                self.tunnel(i, j)
+                yield from self.tunnel_walk(i, j)
+                yield
     
-    def tunnel(self, i, j, last_dir=None, depth=0):
-        if depth > 1000:  # Prevent infinite recursion
-            return
-        
-        dirs = self.tunnel_dirs(last_dir)
-        for dir in dirs:
-            if self.open_tunnel(i, j, dir):
+    def tunnel(self, i, j, last_dir=None):
+        for _ in self.tunnel_walk(i, j, last_dir):
+            pass
+    
+    def tunnel_walk(self, i, j, last_dir=None):
+        # Growing-tree walk on an explicit stack: each frame keeps its own
+        # direction iterator, so cells are visited (and random numbers drawn)
+        # in the same order as the old recursive version, without its depth cap.
+        #
+        # Label bits overlap DOORSPACE, so delve_tunnel never marks a labelled
+        # cell as corridor. Along a 3+ digit label the walk could bounce between
+        # two labelled cells forever (the old depth cap hid this), so a walk
+        # standing on such a cell may not step back into a cell on the stack.
+        stack = [(i, j, iter(self.tunnel_dirs(last_dir)))]
+        on_stack = {(i, j): 1}
+        while stack:
+            i, j, dirs = stack[-1]
+            carved = self.cell[(i * 2) + 1][(j * 2) + 1] & self.CORRIDOR
+            for dir in dirs:
                 next_i = i + self.di[dir]
                 next_j = j + self.dj[dir]
-                self.tunnel(next_i, next_j, dir, depth+1)
+                if not carved and (next_i, next_j) in on_stack:
+                    continue
+                if self.open_tunnel(i, j, dir):
+                    on_stack[(next_i, next_j)] = on_stack.get((next_i, next_j), 0) + 1
+                    stack.append((next_i, next_j, iter(self.tunnel_dirs(dir))))
+                    # While streaming, hand back every STREAM_BATCH segments
+                    if self.carved is not None and len(self.carved) >= STREAM_BATCH:
+                        yield
+                    break
+            else:
+                stack.pop()
+                if on_stack[(i, j)] == 1:
+                    del on_stack[(i, j)]
+                else:
+                    on_stack[(i, j)] -= 1
     
     def tunnel_dirs(self, last_dir):
         dirs = self.dj_dirs.copy()
@@ -601,6 +1667,7 @@ class DungeonGenerator:
         return False
     
     def sound_tunnel(self, mid_r, mid_c, next_r, next_c):
+        self.counters['sound_tunnel'] += 1
         if (next_r < 0 or next_r > self.opts['n_rows'] or 
             next_c < 0 or next_c > self.opts['n_cols']):
             return False
@@ -627,14 +1694,34 @@ class DungeonGenerator:
             for c in range(int(min_c), int(max_c) + 1):
                 # FIXED: Preserve existing doors
                 if not (self.cell[r][c] & self.DOORSPACE):
-                    self.cell[r][c] &= ~self.ENTRANCE
+                    self.cell[r][c] &= self.CELL_MASK ^ self.ENTRANCE
                     self.cell[r][c] |= self.CORRIDOR
+        if self.carved is not None:
+            self.carved.append([min_r, min_c, max_r, max_c])
         return True
     
-    def emplace_stairs(self):
-        n = self.opts['add_stairs']
+    def emplace_stairs(self, keys=None):
+        """Stairs on corridor dead ends: down, up, then random; keys ('down'/'up' each) fixes them"""
+        n = self.opts['add_stairs'] if keys is None else len(keys)
         if not n:
             return
+        with self.list_cells():
+            self._emplace_stairs(n, keys)
+    
+    def _emplace_stairs(self, n, keys):
+        first = (0, 1)
+        if self.opts['up_stair']:
+            r, c = self.opts['up_stair']
+            self.pin_stair(r, c, self.STAIR_UP)
+            stair = {'row': r, 'col': c, 'next_row': r + 1, 'next_col': c, 'key': 'up'}
+            for dir in self.dj_dirs:
+                if self.cell[r + self.di[dir]][c + self.dj[dir]] & self.OPENSPACE:
+                    stair['next_row'] = r + self.di[dir]
+                    stair['next_col'] = c + self.dj[dir]
+                    break
+            self.stairs.append(stair)
+            first = (0,)
+            n -= 1
         
         ends = self.stair_ends()
         if not ends:
@@ -650,8 +1737,10 @@ class DungeonGenerator:
             c = end['col']
             stair = {**end}
             
-            if i < 2:
-                stair_type = i
+            if keys is not None:
+                stair_type = 0 if keys[i] == 'down' else 1
+            elif i < len(first):
+                stair_type = first[i]
             else:
                 stair_type = self.rand_int(2)
             
@@ -664,6 +1753,15 @@ class DungeonGenerator:
             
             self.stairs.append(stair)
     
+    def pin_stair(self, r, c, flag):
+        """Make odd cell [r][c] a stair (flag), opening and tunnelling it to the nearest open cell if needed"""
+        if not self.cell[r][c] & self.OPENSPACE:
+            self.cell[r][c] = self.CORRIDOR
+            path = self.shortest_walk([(r, c)], lambda r, c: self.cell[r][c] & self.OPENSPACE)
+            if path:
+                self.carve_link(path)
+        self.cell[r][c] |= flag
+    
     def stair_ends(self):
         ends = []
         for i in range(self.n_i):
@@ -690,7 +1788,14 @@ class DungeonGenerator:
     def clean_dungeon(self):
         if self.opts['remove_deadends']:
             self.remove_deadends()
+            if self.opts['up_stair'] and self.opts['add_stairs']:
+                # Dead-end removal can close a pinned stair in mid-corridor
+                self.pin_stair(*self.opts['up_stair'], self.STAIR_UP)
         self.clean_disconnected_doors()
+        if self.opts['connectivity'] == 'repair':
+            # Before fix_doors, which registers the archways it opens, and
+            # before empty_blocks, which forgets the layout mask
+            self.repair_connectivity()
         self.fix_doors()
         self.empty_blocks()
     
@@ -698,29 +1803,118 @@ class DungeonGenerator:
         p = self.opts['remove_deadends']
         if not p:
             return
-        all = p == 100
+        if p == 100:
+            self._remove_all_deadends()
+            return
         
-        for i in range(self.n_i):
-            r = (i * 2) + 1
-            for j in range(self.n_j):
-                c = (j * 2) + 1
+        # Every open cell still draws from the PRNG in scan order, so only
+        # the dead-end test is skipped for cells the draw rules out
+        cells = self.open_cells()
+        with self.list_cells():
+            for r, c in cells:
                 if not (self.cell[r][c] & self.OPENSPACE):
                     continue
-                if self.cell[r][c] & self.STAIRS:
-                    continue
-                if not all and self.rand_int(100) >= p:
-                    continue
-                if self.is_adjacent_to_door(r, c):
+                if self.rand_int(100) >= p:
                     continue
-                if self.corridor_leads_to_door(r, c):
+                if self.is_adjacent_to_door(r, c) or not self.is_dead_end(r, c):
                     continue
-                
                 self.collapse(r, c, self.close_end)
     
-    def corridor_leads_to_door(self, r, c):
-        if not (self.cell[r][c] & self.CORRIDOR):
+    def _remove_all_deadends(self):
+        # Worklist version of the row-major scan: collapse is a no-op unless
+        # the cell is a dead end when the scan reaches it, and closing a cell
+        # can only turn its 3x3 neighbours into dead ends, so visiting the
+        # initial dead ends plus the odd cells around every closed cell, in
+        # row-major order and only ahead of the scan, collapses the same cells
+        work = self.dead_end_cells()
+        with self.list_cells():
+            self._collapse_worklist(work)
+    
+    def _collapse_worklist(self, work):
+        last = None
+        while work:
+            r, c = heapq.heappop(work)
+            if (r, c) == last:
+                continue
+            last = (r, c)
+            if (not (self.cell[r][c] & self.OPENSPACE) or self.cell[r][c] & self.STAIRS
+                    or self.is_adjacent_to_door(r, c) or not self.is_dead_end(r, c)):
+                continue
+            
+            closed = []
+            self.collapse(r, c, self.close_end, closed)
+            for cr, cc in closed:
+                for nr in range(cr - 1 | 1, cr + 2, 2):
+                    for nc in range(cc - 1 | 1, cc + 2, 2):
+                        if (nr, nc) > last and 0 < nr < self.opts['n_rows'] and 0 < nc < self.opts['n_cols']:
+                            heapq.heappush(work, (nr, nc))
+    
+    def open_cells(self):
+        """Open, stair-free cells of the odd lattice in row-major order"""
+        if self.use_numpy:
+            odd = self.cell[1:self.n_i * 2:2, 1:self.n_j * 2:2]
+            cells = np.argwhere((odd & self.OPENSPACE != 0) & (odd & self.STAIRS == 0)) * 2 + 1
+            return list(map(tuple, cells.tolist()))
+        return [
+            (r, c)
+            for r in range(1, self.n_i * 2, 2)
+            for c in range(1, self.n_j * 2, 2)
+            if self.cell[r][c] & self.OPENSPACE and not self.cell[r][c] & self.STAIRS
+        ]
+    
+    def dead_end_cells(self):
+        """open_cells() that currently pass a close_end check and are not next to a door"""
+        if not self.use_numpy:
+            return [
+                (r, c) for r, c in self.open_cells()
+                if self.is_dead_end(r, c) and not self.is_adjacent_to_door(r, c)
+            ]
+        
+        cell = self.cell
+        shape = cell.shape
+        open_pad = np.pad((cell & self.OPENSPACE) != 0, 1)
+        door_pad = np.pad((cell & self.DOORSPACE) != 0, 1)
+        
+        def shifted(padded, dr, dc):
+            return padded[1 + dr:shape[0] + 1 + dr, 1 + dc:shape[1] + 1 + dc]
+        
+        dead = np.zeros(shape, dtype=bool)
+        for check in self.close_end.values():
+            walled = np.ones(shape, dtype=bool)
+            for dr, dc in check['walled']:
+                walled &= ~shifted(open_pad, dr, dc)
+            dead |= walled
+        near_door = np.zeros(shape, dtype=bool)
+        for dr, dc in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            near_door |= shifted(door_pad, dr, dc)
+        
+        odd = np.zeros(shape, dtype=bool)
+        odd[1:self.n_i * 2:2, 1:self.n_j * 2:2] = True
+        cells = np.argwhere(odd & dead & ~near_door & shifted(open_pad, 0, 0) & ((cell & self.STAIRS) == 0))
+        return list(map(tuple, cells.tolist()))
+    
+    def is_dead_end(self, r, c):
+        cell = self.cell
+        # Every close_end check walls three of the four sides
+        if ((cell[r - 1][c] & self.OPENSPACE != 0) + (cell[r + 1][c] & self.OPENSPACE != 0)
+                + (cell[r][c - 1] & self.OPENSPACE != 0) + (cell[r][c + 1] & self.OPENSPACE != 0)) > 1:
             return False
-        
+        return any(self.check_tunnel(cell, r, c, check) for check in self.close_end.values())
+    
+    def clean_disconnected_doors(self):
+        if self.use_numpy:
+            self._clean_disconnected_doors_np()
+            return
+        doors = [
+            (r, c)
+            for r, row in enumerate(self.cell)
+            for c, value in enumerate(row) if value & self.DOORSPACE
+        ]
+        for r, c in doors:
+            self._clean_disconnected_door(r, c)
+    
+    def _clean_disconnected_door(self, r, c):
+        connected_spaces = 0
         neighbors = [
             (0, -1), (0, 1), (-1, 0), (1, 0)  # west, east, north, south
         ]
@@ -730,45 +1924,64 @@ class DungeonGenerator:
             nc = c + dc
             if (0 <= nr <= self.opts['n_rows'] and 
                 0 <= nc <= self.opts['n_cols'] and
-                self.cell[nr][nc] & self.DOORSPACE):
-                return True
-        return False
-    
-    def clean_disconnected_doors(self):
-        for r in range(self.opts['n_rows'] + 1):
-            for c in range(self.opts['n_cols'] + 1):
-                if self.cell[r][c] & self.DOORSPACE:
-                    connected_spaces = 0
-                    neighbors = [
-                        (0, -1), (0, 1), (-1, 0), (1, 0)  # west, east, north, south
-                    ]
-                    
-                    for dr, dc in neighbors:
-                        nr = r + dr
-                        nc = c + dc
-                        if (0 <= nr <= self.opts['n_rows'] and 
-                            0 <= nc <= self.opts['n_cols'] and
-                            self.cell[nr][nc] & (self.OPENSPACE | self.DOORSPACE)):
-                            connected_spaces += 1
-                    
-                    if connected_spaces < 2:
-                        self.cell[r][c] &= ~self.DOORSPACE
-                        self.cell[r][c] |= self.PERIMETER
+                self.cell[nr][nc] & (self.OPENSPACE | self.DOORSPACE)):
+                connected_spaces += 1
+        
+        if connected_spaces < 2:
+            self.cell[r][c] &= self.CELL_MASK ^ self.DOORSPACE
+            self.cell[r][c] |= self.PERIMETER
     
-    def collapse(self, r, c, xc):
-        if not (self.cell[r][c] & self.OPENSPACE):
+    def _clean_disconnected_doors_np(self):
+        # Doors with no neighbouring door don't depend on scan order, so they
+        # are settled in one vectorized step. Doors next to another door are
+        # re-checked one by one in row-major order, exactly like the scalar scan.
+        cell = self.cell
+        door = (cell & self.DOORSPACE) != 0
+        if not door.any():
             return
-        
-        for dir, check in xc.items():
+        connects = np.pad((cell & (self.OPENSPACE | self.DOORSPACE)) != 0, 1)
+        door_pad = np.pad(door, 1)
+        count = np.zeros(cell.shape, dtype=np.int8)
+        door_neighbor = np.zeros(cell.shape, dtype=bool)
+        for dr, dc in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            sl = (slice(1 + dr, cell.shape[0] + 1 + dr), slice(1 + dc, cell.shape[1] + 1 + dc))
+            count += connects[sl]
+            door_neighbor |= door_pad[sl]
+        
+        isolated = door & ~door_neighbor & (count < 2)
+        cell[isolated] &= self.CELL_MASK ^ self.DOORSPACE
+        cell[isolated] |= self.PERIMETER
+        
+        for r, c in np.argwhere(door & door_neighbor).tolist():
+            self._clean_disconnected_door(r, c)
+    
+    def collapse(self, r, c, xc, closed=None):
+        # Explicit-stack version of the recursive collapse; frames are
+        # [row, col, next check index] and run the checks in the same order.
+        # Cells set to NOTHING are appended to closed when it is given
+        checks = list(xc.values())
+        stack = [[r, c, 0]]
+        while stack:
+            frame = stack[-1]
+            r, c, k = frame
+            if k == len(checks) or (k == 0 and not (self.cell[r][c] & self.OPENSPACE)):
+                stack.pop()
+                continue
+            frame[2] = k + 1
+            
+            check = checks[k]
             if not self.check_tunnel(self.cell, r, c, check):
                 continue
             
             for p in check['close']:
                 self.cell[r + p[0]][c + p[1]] = self.NOTHING
+                if closed is not None:
+                    closed.append((r + p[0], c + p[1]))
             
             if 'recurse' in check:
                 recurse = check['recurse']
-                self.collapse(r + recurse[0], c + recurse[1], xc)
+                stack.append([r + recurse[0], c + recurse[1], 0])
+                self.counters['collapse'] += 1
     
     def check_tunnel(self, cell, r, c, check):
         if 'corridor' in check:
@@ -823,11 +2036,326 @@ class DungeonGenerator:
                     del room['door'][dir]
     
     def empty_blocks(self):
+        if self.use_numpy:
+            self.cell[(self.cell & self.BLOCKED) != 0] = self.NOTHING
+            return
         for r in range(self.opts['n_rows'] + 1):
             for c in range(self.opts['n_cols'] + 1):
                 if self.cell[r][c] & self.BLOCKED:
                     self.cell[r][c] = self.NOTHING
     
+    def label_components(self):
+        """
+        Label 4-connected open space: (labels, n) where labels[r][c] is the
+        component number (1..n, in row-major order of first cell) or 0.
+        """
+        # Flood fill over a flat 0/1 bytearray with a one-cell border, so
+        # neighbours need no bounds checks and find() skips solid cells
+        n_rows = self.opts['n_rows'] + 1
+        n_cols = self.opts['n_cols'] + 1
+        width = n_cols + 2
+        if self.use_numpy:
+            open_space = bytearray(np.pad((self.cell & self.OPENSPACE) != 0, 1).tobytes())
+        else:
+            open_space = bytearray(width * (n_rows + 2))
+            for r, row in enumerate(self.cell):
+                k = (r + 1) * width + 1
+                open_space[k:k + n_cols] = bytes(value & self.OPENSPACE != 0 for value in row)
+        
+        labels = [0] * len(open_space)
+        n = 0
+        start = open_space.find(1)
+        while start != -1:
+            n += 1
+            labels[start] = n
+            open_space[start] = 0
+            stack = [start]
+            while stack:
+                k = stack.pop()
+                for nk in (k - width, k + width, k - 1, k + 1):
+                    if open_space[nk]:
+                        open_space[nk] = 0
+                        labels[nk] = n
+                        stack.append(nk)
+            start = open_space.find(1, start)
+        return [labels[(r + 1) * width + 1:(r + 1) * width + 1 + n_cols] for r in range(n_rows)], n
+    
+    def connectivity_anchor(self, labels):
+        """Component everything must reach: the first intact stair's, else room 1's (0 if neither)"""
+        for stair in self.stairs:
+            if labels[stair['row']][stair['col']]:
+                return labels[stair['row']][stair['col']]
+        if self.n_rooms:
+            return labels[self.room[1]['north']][self.room[1]['west']]
+        return 0
+    
+    def validate_connectivity(self):
+        """Report the rooms, doors and stairs not reachable from the stairs (or room 1)"""
+        labels, n = self.label_components()
+        main = self.connectivity_anchor(labels)
+        rooms = [
+            room['id'] for room in self.room[1:self.n_rooms + 1]
+            if labels[room['north']][room['west']] != main
+        ]
+        doors = [
+            {'row': door['row'], 'col': door['col']} for door in self.doorList
+            if labels[door['row']][door['col']] != main
+        ]
+        stairs = [
+            {'row': stair['row'], 'col': stair['col'], 'key': stair['key']} for stair in self.stairs
+            if labels[stair['row']][stair['col']] != main
+        ]
+        return {
+            'components': n,
+            'connected': not (rooms or doors or stairs),
+            'unreachable_rooms': rooms,
+            'unreachable_doors': doors,
+            'unreachable_stairs': stairs,
+        }
+    
+    def repair_connectivity(self):
+        """
+        Join every component holding a room or stair to the anchor component
+        by tunnelling the shortest corridor between them, one link at a time.
+        Returns the number of links carved.
+        """
+        links = 0
+        while True:
+            labels, _ = self.label_components()
+            main = self.connectivity_anchor(labels)
+            if not main:
+                return links
+            targets = {labels[room['north']][room['west']] for room in self.room[1:self.n_rooms + 1]}
+            targets.update(labels[stair['row']][stair['col']] for stair in self.stairs)
+            targets -= {0, main}
+            if not targets:
+                return links
+            path = self.link_path(labels, main, targets)
+            if path is None:
+                return links
+            self.carve_link(path)
+            links += 1
+    
+    def link_path(self, labels, main, targets):
+        """Shortest walk (see shortest_walk) from component main to any component of targets"""
+        sources = [
+            (r, c) for r in range(1, self.n_i * 2, 2) for c in range(1, self.n_j * 2, 2)
+            if labels[r][c] == main
+        ]
+        return self.shortest_walk(sources, lambda r, c: labels[r][c] in targets)
+    
+    def shortest_walk(self, sources, is_target):
+        """
+        Shortest odd-lattice walk (breadth first, two cells a step like
+        tunnel) from any of the odd cells sources to an odd cell where
+        is_target(r, c), avoiding BLOCKED cells, as a list of odd cells;
+        None if there is none.
+        """
+        back = dict.fromkeys(sources)
+        frontier = deque(sources)
+        while frontier:
+            r, c = frontier.popleft()
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                nr = r + 2 * dr
+                nc = c + 2 * dc
+                if not (0 < nr < self.opts['n_rows'] and 0 < nc < self.opts['n_cols']) or (nr, nc) in back:
+                    continue
+                if (self.cell[r + dr][c + dc] | self.cell[nr][nc]) & self.BLOCKED:
+                    continue
+                back[(nr, nc)] = (r, c)
+                if is_target(nr, nc):
+                    path = [(nr, nc)]
+                    while back[path[-1]] is not None:
+                        path.append(back[path[-1]])
+                    return path[::-1]
+                frontier.append((nr, nc))
+        return None
+    
+    def carve_link(self, path):
+        """Open the cells between consecutive odd cells of path; room walls become archways"""
+        for (r1, c1), (r2, c2) in zip(path, path[1:]):
+            for r, c in (((r1 + r2) // 2, (c1 + c2) // 2), (r2, c2)):
+                if self.cell[r][c] & self.OPENSPACE:
+                    continue
+                if self.cell[r][c] & self.PERIMETER:
+                    self.open_archway(r, c, (r1, c1), (r2, c2))
+                else:
+                    self.cell[r][c] |= self.CORRIDOR
+    
+    def open_archway(self, r, c, side_a, side_b):
+        """Turn perimeter cell [r][c] between two odd cells into an archway of the room on either side"""
+        room_ids = [
+            self.room_at(sr, sc) for sr, sc in (side_a, side_b) if self.cell[sr][sc] & self.ROOM
+        ]
+        self.cell[r][c] &= self.CELL_MASK ^ self.PERIMETER
+        self.cell[r][c] |= self.ENTRANCE | self.ARCH
+        if not room_ids:
+            return
+        
+        room = self.room[room_ids[0]]
+        if r < room['north']:
+            dir = 'north'
+        elif r > room['south']:
+            dir = 'south'
+        elif c < room['west']:
+            dir = 'west'
+        else:
+            dir = 'east'
+        door = {'row': r, 'col': c, 'key': 'arch', 'type': 'Archway'}
+        if len(room_ids) > 1:
+            door['out_id'] = room_ids[1]
+        room['door'].setdefault(dir, []).append(door)
+        self.doorList.append(door)
+    
+    def padded_flat(self, grid):
+        """grid (cell or room_cell) as one row-major list with a border of zeros"""
+        if self.use_numpy:
+            return np.pad(grid, 1).ravel().tolist()
+        width = self.opts['n_cols'] + 3
+        flat = [0] * width
+        for row in grid:
+            flat.append(0)
+            flat.extend(row)
+            flat.append(0)
+        flat.extend([0] * width)
+        return flat
+    
+    def room_graph(self, anchors=()):
+        """
+        Connectivity graph of the finished dungeon (query it with
+        dGenGraph.DungeonGraph):
+        
+        {'nodes': [{'id': 'room:5', 'kind': 'room', 'room': 5}, {'id': 'stair:0',
+                    'kind': 'stair', 'key': 'down', 'row': r, 'col': c}, ...],
+         'edges': [{'from': id, 'to': id, 'length': steps, 'doors': [door, door]}, ...]}
+        
+        Rooms are entered through openings: open cells next to a room cell
+        outside it (doors, or corridors cut through a wall). One breadth-first
+        pass from every opening and stair over the open cells outside rooms
+        gives each cell its nearest opening; where two regions touch, their
+        owners get an edge whose length is the walk between the openings.
+        Each edge keeps the shortest such walk and the door ({'row', 'col',
+        'key'}, or None for plain openings and stairs) at either end.
+        anchors are extra nodes ({'id', 'kind', 'row', 'col'}) seeded at
+        their cell like stairs.
+        """
+        width = self.opts['n_cols'] + 3
+        flat = self.padded_flat(self.cell)
+        walk = bytearray(value & self.OPENSPACE != 0 and not value & self.ROOM for value in flat)
+        door_at = {(door['row'], door['col']): door for door in self.doorList}
+        
+        nodes = [{'id': f"room:{room['id']}", 'kind': 'room', 'room': room['id']} for room in self.room[1:self.n_rooms + 1]]
+        seeds = []  # (cell index, owner node ids, door)
+        owner = [-1] * len(flat)
+        stairs = [
+            {'id': f'stair:{i}', 'kind': 'stair', 'key': stair['key'], 'row': stair['row'], 'col': stair['col']}
+            for i, stair in enumerate(self.stairs)
+        ]
+        for node in chain(stairs, anchors):
+            k = (node['row'] + 1) * width + node['col'] + 1
+            nodes.append(node)
+            if walk[k] and owner[k] < 0:
+                owner[k] = len(seeds)
+                seeds.append((k, [node['id']], None))
+        
+        room = self.padded_flat(self.room_cell)
+        k = walk.find(1)
+        while k != -1:
+            if (room[k - width] or room[k + width] or room[k - 1] or room[k + 1]) and owner[k] < 0:
+                rooms = sorted({room[nk] for nk in (k - width, k + width, k - 1, k + 1) if room[nk]})
+                r, c = divmod(k, width)
+                door = door_at.get((r - 1, c - 1))
+                owner[k] = len(seeds)
+                seeds.append((k, [f'room:{room_id}' for room_id in rooms],
+                              door and {'row': door['row'], 'col': door['col'], 'key': door['key']}))
+            k = walk.find(1, k + 1)
+        
+        dist = [0] * len(flat)
+        reached = [seed[0] for seed in seeds]  # doubles as the BFS queue
+        for k in reached:
+            for nk in (k - width, k + width, k - 1, k + 1):
+                if walk[nk] and owner[nk] < 0:
+                    owner[nk] = owner[k]
+                    dist[nk] = dist[k] + 1
+                    reached.append(nk)
+        
+        # Shortest walk between every pair of touching regions
+        links = {}
+        for seed, (_, owners, _) in enumerate(seeds):
+            if len(owners) > 1:
+                links[(seed, seed)] = 0
+        for k in reached:
+            for nk in (k + 1, k + width):
+                if owner[nk] >= 0 and owner[nk] != owner[k]:
+                    pair = (owner[k], owner[nk]) if owner[k] < owner[nk] else (owner[nk], owner[k])
+                    length = dist[k] + dist[nk] + 1
+                    if length < links.get(pair, length + 1):
+                        links[pair] = length
+        
+        edges = {}
+        for (s, t), length in links.items():
+            for a in seeds[s][1]:
+                for b in seeds[t][1]:
+                    if a == b:
+                        continue
+                    doors = [seeds[s][2], seeds[t][2]]
+                    if (a, b) > (b, a):
+                        a, b = b, a
+                        doors.reverse()
+                    if (a, b) not in edges or length < edges[(a, b)]['length']:
+                        edges[(a, b)] = {'from': a, 'to': b, 'length': length, 'doors': doors}
+        return {'nodes': nodes, 'edges': [edges[pair] for pair in sorted(edges)]}
+    
+    def stair_distance(self):
+        """Steps over open cells from the first down stair to the first up stair; None if either is missing or cut off"""
+        down = next((stair for stair in self.stairs if stair['key'] == 'down'), None)
+        up = next((stair for stair in self.stairs if stair['key'] == 'up'), None)
+        if down is None or up is None:
+            return None
+        
+        width = self.opts['n_cols'] + 3
+        walk = bytearray(value & self.OPENSPACE != 0 for value in self.padded_flat(self.cell))
+        start = (down['row'] + 1) * width + down['col'] + 1
+        goal = (up['row'] + 1) * width + up['col'] + 1
+        dist = {start: 0}
+        frontier = [start]  # grows while it is walked, like room_graph's queue
+        for k in frontier:
+            if k == goal:
+                return dist[k]
+            for nk in (k - width, k + width, k - 1, k + 1):
+                if walk[nk] and nk not in dist:
+                    dist[nk] = dist[k] + 1
+                    frontier.append(nk)
+        return None
+    
+    def longest_deadend(self):
+        """
+        Cells in the longest corridor run from a dead end back to the first
+        junction, door or room (0 if there are no dead ends). Runs ending
+        in a stair are not dead ends.
+        """
+        width = self.opts['n_cols'] + 3
+        flat = self.padded_flat(self.cell)
+        walk = bytearray(value & self.OPENSPACE != 0 for value in flat)
+        plain_mask = self.OPENSPACE | self.DOORSPACE | self.STAIRS
+        plain = bytearray(value & plain_mask == self.CORRIDOR for value in flat)
+        
+        longest = 0
+        k = plain.find(1)
+        while k != -1:
+            if walk[k - width] + walk[k + width] + walk[k - 1] + walk[k + 1] == 1:
+                length = 1
+                prev = k
+                cur = next(nk for nk in (k - width, k + width, k - 1, k + 1) if walk[nk])
+                while plain[cur] and walk[cur - width] + walk[cur + width] + walk[cur - 1] + walk[cur + 1] == 2:
+                    prev, cur = cur, next(
+                        nk for nk in (cur - width, cur + width, cur - 1, cur + 1) if walk[nk] and nk != prev
+                    )
+                    length += 1
+                longest = max(longest, length)
+            k = plain.find(1, k + 1)
+        return longest
+    
     def is_adjacent_to_door(self, r, c):
         neighbors = [
             (0, -1), (0, 1), (-1, 0), (1, 0)  # west, east, north, south
@@ -880,53 +2408,136 @@ class DungeonGenerator:
             return 'portc'
         return 'open'
 
-    def get_stats(self):
-        rooms = 0
-        doors = 0
-        corridors = 0
-        
-        for r in range(self.opts['n_rows'] + 1):
-            for c in range(self.opts['n_cols'] + 1):
-                cell = self.cell[r][c]
-                if cell & self.ROOM: rooms += 1
-                if cell & self.DOORSPACE: doors += 1
-                if cell & self.CORRIDOR: corridors += 1
-        
+    def grid_bytes(self):
+        """Cell grid as row-major little-endian uint32 bytes"""
+        if self.use_numpy:
+            return self.cell.astype('<u4', copy=False).tobytes()
+        grid = array('I', chain.from_iterable(self.cell))
+        if sys.byteorder == 'big':
+            grid.byteswap()
+        return grid.tobytes()
+    
+    def cells_from_bytes(self, data, n_cols):
+        """Cell grid of grid_bytes() output with rows of n_cols cells, in this generator's backend"""
+        if self.use_numpy:
+            return np.frombuffer(data, dtype='<u4').astype(np.uint32).reshape(-1, n_cols)
+        grid = array('I')
+        grid.frombytes(data)
+        if sys.byteorder == 'big':
+            grid.byteswap()
+        return [grid[k:k + n_cols].tolist() for k in range(0, len(grid), n_cols)]
+    
+    def to_result(self):
+        """Compact, picklable summary of a generated dungeon ('graph' is None unless it was built)"""
         return {
+            'opts': dict(self.opts),
+            'n_rows': self.opts['n_rows'],
+            'n_cols': self.opts['n_cols'],
+            'grid': self.grid_bytes(),
+            'rooms': self.room[1:self.n_rooms + 1],
+            'doors': self.doorList,
+            'stairs': self.stairs,
+            'graph': self._graph,
+            'stats': self.get_stats(),
+        }
+    
+    @classmethod
+    def from_result(cls, result):
+        """Rebuild a generator from to_result() output, ready for generate_png/get_stats"""
+        generator = cls(result['opts'])
+        generator.init_dungeon_size()
+        generator.cell = generator.cells_from_bytes(result['grid'], generator.opts['n_cols'] + 1)
+        generator.room = [None] + list(result['rooms'])
+        generator.n_rooms = generator.last_room_id = len(result['rooms'])
+        generator.room_cell = generator.empty_room_cell()
+        for room in result['rooms']:
+            if generator.use_numpy:
+                generator.room_cell[room['north']:room['south'] + 1, room['west']:room['east'] + 1] = room['id']
+            else:
+                ids = [room['id']] * room['width']
+                for r in range(room['north'], room['south'] + 1):
+                    generator.room_cell[r][room['west']:room['east'] + 1] = ids
+        generator.doorList = list(result['doors'])
+        generator.stairs = list(result['stairs'])
+        generator.graph = result.get('graph')
+        return generator
+    
+    def count_cells(self, flags):
+        """Number of cells with any of the given flag bits set"""
+        if self.use_numpy:
+            return int(np.count_nonzero(self.cell & flags))
+        return sum(1 for row in self.cell for cell in row if cell & flags)
+    
+    def get_stats(self, profile=False):
+        """Layout stats; profile=True adds the (non-deterministic) phase timings and counters"""
+        stats = {
             'rooms': self.n_rooms,
-            'doors': doors,
-            'corridors': corridors,
+            'doors': self.count_cells(self.DOORSPACE),
+            'corridors': self.count_cells(self.CORRIDOR),
             'size': f"{self.opts['n_rows']}x{self.opts['n_cols']}"
         }
+        if self.opts['connectivity']:
+            stats['connectivity'] = self.validate_connectivity()
+        if profile:
+            stats['profile'] = self.profile()
+        return stats
 
-    def generate_png(self):
-        cell_size = self.opts['cell_size']
+    def base_layer(self):
+        """Palette image at 1 px per cell: background, corridor/entrance and room"""
+        size = (self.opts['n_cols'] + 1, self.opts['n_rows'] + 1)
+        if self.use_numpy:
+            index = np.zeros(self.cell.shape, dtype=np.uint8)
+            index[(self.cell & (self.CORRIDOR | self.ENTRANCE)) != 0] = 1
+            for room in self.room[1:self.n_rooms + 1]:
+                if room:
+                    index[room['north']:room['south'] + 1, room['west']:room['east'] + 1] = 2
+            data = index.tobytes()
+        else:
+            open_flags = self.CORRIDOR | self.ENTRANCE
+            index = bytearray(1 if cell & open_flags else 0 for row in self.cell for cell in row)
+            for room in self.room[1:self.n_rooms + 1]:
+                if room:
+                    fill = b'\x02' * (room['east'] - room['west'] + 1)
+                    for r in range(room['north'], room['south'] + 1):
+                        k = r * size[0]
+                        index[k + room['west']:k + room['east'] + 1] = fill
+            data = bytes(index)
+        
+        layer = Image.frombytes('P', size, data)
+        layer.putpalette(palette_bytes(MAP_COLORS))
+        return layer
+
+    def render_map(self, cell_size, box=None, base=None):
+        """
+        Palette image of the map (no legend) at cell_size, cropped to box =
+        (left, top, right, bottom) in map pixels. Only cells, glyphs and grid
+        lines inside box are drawn. base is a cached base_layer(), if any.
+        """
         width = (self.opts['n_cols'] + 1) * cell_size + 1
         height = (self.opts['n_rows'] + 1) * cell_size + 1
-
-        ROOM_COLOR = '#ffffff'  # Eggshell
-        CORRIDOR_COLOR = '#d3d3d3'  # Light gray
-        DOOR_COLOR = '#8B4513'
-        ARCH_COLOR = '#A07828'
-        STAIR_COLOR = '#111111'
-        
-        # Create image with dark background
-        img = Image.new('RGB', (width, height), color='#5f5e67')
-        draw = ImageDraw.Draw(img)
-        
-        # Draw corridors
-        for r in range(self.opts['n_rows'] + 1):
-            for c in range(self.opts['n_cols'] + 1):
-                if self.cell[r][c] & self.CORRIDOR:
-                    x = c * cell_size
-                    y = r * cell_size
-                    draw.rectangle([x, y, x+cell_size, y+cell_size], fill=CORRIDOR_COLOR)
-                elif self.cell[r][c] & self.ENTRANCE:
-                    x = c * cell_size
-                    y = r * cell_size
-                    draw.rectangle([x, y, x+cell_size, y+cell_size], fill=CORRIDOR_COLOR)
-        
-        # Draw rooms
+        left, top, right, bottom = box or (0, 0, width, height)
+        image = Image.new('P', (right - left, bottom - top), color=MAP_COLORS.index(BACKGROUND_COLOR))
+        image.putpalette(palette_bytes(MAP_COLORS))
+        
+        # Base layer scaled up in one NEAREST resize; the last pixel row and
+        # column of the map are background
+        base_w = min(right, width - 1) - left
+        base_h = min(bottom, height - 1) - top
+        if base_w > 0 and base_h > 0:
+            base = base or self.base_layer()
+            scaled = base.resize((base_w, base_h), Image.NEAREST, box=(
+                left / cell_size, top / cell_size,
+                (left + base_w) / cell_size, (top + base_h) / cell_size
+            ))
+            image.paste(scaled, (0, 0))
+        draw = ImageDraw.Draw(image)
+        
+        def in_box(x1, y1, x2, y2):
+            return x1 < right and x2 >= left and y1 < bottom and y2 >= top
+        
+        # Room labels
+        font = label_font(int(cell_size * 0.8))
+        label_ink = MAP_COLORS.index(LABEL_COLOR)
         for room_id in range(1, self.n_rooms + 1):
             room = self.room[room_id]
             if room:
@@ -934,302 +2545,100 @@ class DungeonGenerator:
                 y1 = room['north'] * cell_size
                 x2 = (room['east'] + 1) * cell_size
                 y2 = (room['south'] + 1) * cell_size
-                
-                draw.rectangle([x1, y1, x2, y2], fill=ROOM_COLOR)
-                
-                # Room label
-                try:
-                    font = ImageFont.truetype("arial.ttf", int(cell_size * 0.8))
-                except:
-                    font = ImageFont.load_default()
+                if not in_box(x1, y1, x2, y2):
+                    continue
                 text = str(room_id)
-
+                
                 bbox = font.getbbox(text)
                 text_width = bbox[2] - bbox[0]
                 text_height = bbox[3] - bbox[1]
-
+                
                 tx = x1 + (x2 - x1 - text_width) // 2
                 ty = y1 + (y2 - y1 - text_height) // 2
-                draw.text((tx, ty), text, fill='#2c3e50', font=font)
-
-        # Unified door drawing function
-        def draw_door(draw, x, y, cell_size, door_type, orientation, is_legend=False):
-            door_color = '#8B4513'
-            arch_color = '#A07828'
-            door_width = cell_size // 3
-            arch_height = cell_size // 6
-            
-            if is_legend:
-                bg_color = CORRIDOR_COLOR
-                draw.rectangle([x, y, x+cell_size, y+cell_size], fill=bg_color)
-            
-            if door_type != 'arch':
-                if orientation == 'horizontal':
-                    draw.rectangle([
-                        x + (cell_size - door_width)//2, y,
-                        x + (cell_size + door_width)//2, y + arch_height
-                    ], fill=arch_color)
-                    draw.rectangle([
-                        x + (cell_size - door_width)//2, y + cell_size - arch_height,
-                        x + (cell_size + door_width)//2, y + cell_size
-                    ], fill=arch_color)
-                else:
-                    draw.rectangle([
-                        x, y + (cell_size - door_width)//2,
-                        x + arch_height, y + (cell_size + door_width)//2
-                    ], fill=arch_color)
-                    draw.rectangle([
-                        x + cell_size - arch_height, y + (cell_size - door_width)//2,
-                        x + cell_size, y + (cell_size + door_width)//2
-                    ], fill=arch_color)
-            
-            if door_type in ['door', 'lock', 'trap']:
-                if orientation == 'horizontal':
-                    draw.rectangle([
-                        x + (cell_size - door_width)//2, y + arch_height,
-                        x + (cell_size + door_width)//2, y + cell_size - arch_height
-                    ], fill=door_color)
-                else:
-                    draw.rectangle([
-                        x + arch_height, y + (cell_size - door_width)//2,
-                        x + cell_size - arch_height, y + (cell_size + door_width)//2
-                    ], fill=door_color)
-                
-                if door_type == 'lock':
-                    lock_size = cell_size // 6
-                    center_x = x + cell_size // 2
-                    center_y = y + cell_size // 2
-                    diamond = [
-                        (center_x, center_y - lock_size//2),
-                        (center_x + lock_size//2, center_y),
-                        (center_x, center_y + lock_size//2),
-                        (center_x - lock_size//2, center_y)
-                    ]
-                    draw.polygon(diamond, fill='#ffffff')
-            
-            elif door_type == 'arch':
-                pass
-            
-            elif door_type == 'secret':
-                pass
-
-            elif door_type == 'door_open':
-                door_width = cell_size // 3
-                door_length = cell_size * 2 // 3
-                sin60 = 0.866
-                cos60 = 0.5
-                
-                if orientation == 'horizontal':
-                    hinge_x = x + cell_size // 2
-                    hinge_y = y + arch_height
-                    unrotated = [
-                        (hinge_x - door_width//2, hinge_y),
-                        (hinge_x + door_width//2, hinge_y),
-                        (hinge_x + door_width//2, hinge_y + door_length),
-                        (hinge_x - door_width//2, hinge_y + door_length)
-                    ]
-                    rotated = []
-                    for px, py in unrotated:
-                        tx = px - hinge_x
-                        ty = py - hinge_y
-                        rx = tx * cos60 + ty * sin60
-                        ry = -tx * sin60 + ty * cos60
-                        rotated.append((int(hinge_x + rx), int(hinge_y + ry)))
-                    draw.polygon(rotated, fill=door_color)
-                else:
-                    hinge_x = x + arch_height
-                    hinge_y = y + cell_size // 2
-                    unrotated = [
-                        (hinge_x, hinge_y - door_width//2),
-                        (hinge_x, hinge_y + door_width//2),
-                        (hinge_x + door_length, hinge_y + door_width//2),
-                        (hinge_x + door_length, hinge_y - door_width//2)
-                    ]
-                    rotated = []
-                    for px, py in unrotated:
-                        tx = px - hinge_x
-                        ty = py - hinge_y
-                        rx = tx * cos60 + ty * sin60
-                        ry = -tx * sin60 + ty * cos60
-                        rotated.append((int(hinge_x + rx), int(hinge_y + ry)))
-                    draw.polygon(rotated, fill=door_color)
-            
-            elif door_type == 'door_broken':
-                plank_width = max(1, cell_size // 6)
-                offset = cell_size // 4
-                offset2 = cell_size // 6
-                draw.line([
-                    (x + offset, y + offset2),
-                    (x + cell_size//2 - offset2, y + cell_size - offset2)
-                ], fill=door_color, width=plank_width)
-                draw.line([
-                    (x + cell_size - offset2, y + offset),
-                    (x + offset2, y + cell_size - offset)
-                ], fill=door_color, width=plank_width)
-                    
-            elif door_type == 'portc':
-                bar_count = 5
-                bar_radius = max(1, cell_size // 20)
-                bar_spacing = cell_size / (bar_count + 1)
-                if orientation == 'horizontal':
-                    for i in range(1, bar_count + 1):
-                        bar_y = y + i * bar_spacing
-                        draw.ellipse([
-                            x + cell_size//2 - bar_radius, bar_y - bar_radius,
-                            x + cell_size//2 + bar_radius, bar_y + bar_radius
-                        ], fill=door_color)
-                else:
-                    for i in range(1, bar_count + 1):
-                        bar_x = x + i * bar_spacing
-                        draw.ellipse([
-                            bar_x - bar_radius, y + cell_size//2 - bar_radius,
-                            bar_x + bar_radius, y + cell_size//2 + bar_radius
-                        ], fill=door_color)
-
-            elif door_type == 'portc_open':
-                bar_radius = max(1, cell_size // 20)
-                if orientation == 'horizontal':
-                    for i in range(1, 4):
-                        bar_x = x + i * cell_size // 4
-                        draw.ellipse([
-                            bar_x - bar_radius, y + bar_radius,
-                            bar_x + bar_radius, y + 3 * bar_radius
-                        ], fill=door_color)
-                        draw.ellipse([
-                            bar_x - bar_radius, y + cell_size - 3 * bar_radius,
-                            bar_x + bar_radius, y + cell_size - bar_radius
-                        ], fill=door_color)
-                else:
-                    for i in range(1, 4):
-                        bar_y = y + i * cell_size // 4
-                        draw.ellipse([
-                            x + bar_radius, bar_y - bar_radius,
-                            x + 3 * bar_radius, bar_y + bar_radius
-                        ], fill=door_color)
-                        draw.ellipse([
-                            x + cell_size - 3 * bar_radius, bar_y - bar_radius,
-                            x + cell_size - bar_radius, bar_y + bar_radius
-                        ], fill=door_color)
-
-            elif door_type == 'portc_broken':
-                bar_count = 3
-                bar_radius = max(1, cell_size // 20)
-                bar_spacing = cell_size / (bar_count + 1)
-                if orientation == 'horizontal':
-                    for i in range(1, bar_count + 1):
-                        bar_y = y + i * bar_spacing
-                        draw.ellipse([
-                            x + cell_size//2 - bar_radius, bar_y - bar_radius,
-                            x + cell_size//2 + bar_radius, bar_y + bar_radius
-                        ], fill=door_color)
-                else:
-                    for i in range(1, bar_count + 1):
-                        bar_x = x + i * bar_spacing
-                        draw.ellipse([
-                            bar_x - bar_radius, y + cell_size//2 - bar_radius,
-                            bar_x + bar_radius, y + cell_size//2 + bar_radius
-                        ], fill=door_color)
-
-        # Draw doors AFTER rooms (FIXED rendering order)
+                draw.text((tx - left, ty - top), text, fill=label_ink, font=font)
+        
+        # Doors AFTER rooms (FIXED rendering order)
         for door in self.doorList:
             r, c = door['row'], door['col']
-            x = c * cell_size
-            y = r * cell_size
+            x, y = c * cell_size, r * cell_size
+            if not in_box(x, y, x + cell_size, y + cell_size):
+                continue
             orientation = 'horizontal' if self._is_horizontal_door(r, c) else 'vertical'
-            draw_door(draw, x, y, cell_size, door['key'], orientation)
-
-        # Draw stairs (improved with tapering for down stairs)
-        def draw_stairs(draw, x, y, cell_size, stair_type, orientation):
-            step_count = 4
-            spacing = cell_size / (step_count + 1)
-            max_length = cell_size * 0.8
-            min_length = cell_size * 0.2
-            center_x = x + cell_size // 2
-            center_y = y + cell_size // 2
-            
-            if orientation == 'horizontal':
-                for i in range(1, step_count + 1):
-                    length = max_length
-                    if stair_type == 'down':
-                        length = max_length - (max_length - min_length) * (i-1) / (step_count-1)
-                    x_pos = x + i * spacing
-                    draw.line([
-                        x_pos, center_y - length//2,
-                        x_pos, center_y + length//2
-                    ], fill=STAIR_COLOR, width=1)
-            else:
-                for i in range(1, step_count + 1):
-                    length = max_length
-                    if stair_type == 'down':
-                        length = max_length - (max_length - min_length) * (i-1) / (step_count-1)
-                    y_pos = y + i * spacing
-                    draw.line([
-                        center_x - length//2, y_pos,
-                        center_x + length//2, y_pos
-                    ], fill=STAIR_COLOR, width=1)
-        
-        # Draw stairs in dungeon
+            sprite, mask = glyph_sprite('door', door['key'], orientation, cell_size)
+            image.paste(sprite, (x - left, y - top), mask)
+        
         for stair in self.stairs:
             r, c = stair['row'], stair['col']
-            x = c * cell_size
-            y = r * cell_size
+            x, y = c * cell_size, r * cell_size
+            if not in_box(x, y, x + cell_size, y + cell_size):
+                continue
             dr = stair['next_row'] - r
             orientation = 'vertical' if dr != 0 else 'horizontal'
-            draw_stairs(draw, x, y, cell_size, stair['key'], orientation)
+            sprite, mask = glyph_sprite('stair', stair['key'], orientation, cell_size)
+            image.paste(sprite, (x - left, y - top), mask)
+        
+        # Grid, clipped to the map area
+        grid_ink = MAP_COLORS.index(GRID_COLOR)
+        line_right = min(right, width) - 1 - left
+        line_bottom = min(bottom, height) - 1 - top
+        for r in range(-(-top // cell_size), min(self.opts['n_rows'], (bottom - 1) // cell_size) + 1):
+            y = r * cell_size - top
+            draw.line([(0, y), (line_right, y)], fill=grid_ink, width=1)
+        for c in range(-(-left // cell_size), min(self.opts['n_cols'], (right - 1) // cell_size) + 1):
+            x = c * cell_size - left
+            draw.line([(x, 0), (x, line_bottom)], fill=grid_ink, width=1)
+        return image
 
-        # Draw grid
-        GRID_COLOR = '#000000'
-        for r in range(0, self.opts['n_rows'] + 1):
-            y = r * cell_size
-            if y <= height:
-                draw.line([(0, y), (width, y)], fill=GRID_COLOR, width=1)
-        for c in range(0, self.opts['n_cols'] + 1):
-            x = c * cell_size
-            if x <= width:
-                draw.line([(x, 0), (x, height)], fill=GRID_COLOR, width=1)
-        
-        # Generate legend
-        legend_width = 200
-        total_width = width + legend_width
-        total_height = max(height, 600)
-        composite = Image.new('RGB', (total_width, total_height), color='#3a3a3a')
-        composite.paste(img, (0, 0))
-        legend_draw = ImageDraw.Draw(composite)
-        legend_x = width + 10
-        legend_y = 10
-        icon_size = 20
-        spacing = 10
-        font = ImageFont.load_default()
-        legend_draw.text((legend_x, legend_y), "Dungeon Features Legend", fill='white', font=font)
-        legend_y += 25
-        
-        items = [
-            {'name': 'Room', 'draw': lambda d, x, y: d.rectangle([x, y, x+icon_size, y+icon_size], fill=ROOM_COLOR)},
-            {'name': 'Corridor', 'draw': lambda d, x, y: d.rectangle([x, y, x+icon_size, y+icon_size], fill=CORRIDOR_COLOR)},
-            {'name': 'Closed Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'door', 'horizontal', True)},
-            {'name': 'Open Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'door_open', 'horizontal', True)},
-            {'name': 'Broken Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'door_broken', 'horizontal', True)},
-            {'name': 'Locked Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'lock', 'horizontal', True)},
-            {'name': 'Trapped Door', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'trap', 'horizontal', True)},
-            {'name': 'Portcullis', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'portc', 'horizontal', True)},
-            {'name': 'Open Portcullis', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'portc_open', 'horizontal', True)},
-            {'name': 'Broken Portcullis', 'draw': lambda d, x, y: draw_door(d, x, y, icon_size, 'portc_broken', 'horizontal', True)},
-            {'name': 'Stairs Up', 'draw': lambda d, x, y: 
-                (d.rectangle([x, y, x+icon_size, y+icon_size], fill=CORRIDOR_COLOR),
-                 draw_stairs(d, x, y, icon_size, 'up', 'vertical'))},
-            {'name': 'Stairs Down', 'draw': lambda d, x, y: 
-                (d.rectangle([x, y, x+icon_size, y+icon_size], fill=CORRIDOR_COLOR),
-                 draw_stairs(d, x, y, icon_size, 'down', 'vertical'))}
-        ]
+    def generate_png(self):
+        cell_size = self.opts['cell_size']
+        width = (self.opts['n_cols'] + 1) * cell_size + 1
+        height = (self.opts['n_rows'] + 1) * cell_size + 1
+        
+        # The whole map is a palette image: the base layer is scaled up in one
+        # NEAREST resize, glyphs are pasted from the sprite cache and the legend
+        # is pasted pre-rendered, so nothing is drawn per cell
+        legend = legend_panel()
+        composite = Image.new('P', (width + legend.width, max(height, legend.height)),
+                              color=MAP_COLORS.index(LEGEND_COLOR))
+        composite.putpalette(legend.getpalette())
+        composite.paste(self.render_map(cell_size), (0, 0))
+        composite.paste(legend, (width, 0))
+        return png_bytes(composite)
+    
+    def tile_zoom(self, cell_size):
+        """Highest tile zoom level; at that level a tile is TILE_SIZE map pixels at cell_size"""
+        size = (max(self.opts['n_rows'], self.opts['n_cols']) + 1) * cell_size + 1
+        return max(0, math.ceil(math.log2(size / TILE_SIZE)))
+    
+    def render_tile(self, cell_size, z, x, y, base=None):
+        """
+        TILE_SIZE square palette image for slippy-map tile (z, x, y), or None
+        outside the map. Each zoom below tile_zoom halves the scale. Zooms
+        with a whole cell size of at least TILE_DETAIL_MIN px are drawn in
+        full; smaller ones are downsampled from the base layer alone.
+        """
+        max_zoom = self.tile_zoom(cell_size)
+        if not 0 <= z <= max_zoom:
+            return None
+        scale = 2 ** (max_zoom - z)
+        n_tiles_x = -(-((self.opts['n_cols'] + 1) * cell_size + 1) // (TILE_SIZE * scale))
+        n_tiles_y = -(-((self.opts['n_rows'] + 1) * cell_size + 1) // (TILE_SIZE * scale))
+        if not (0 <= x < n_tiles_x and 0 <= y < n_tiles_y):
+            return None
         
-        for i, item in enumerate(items):
-            y_pos = legend_y + i * (icon_size + spacing)
-            item['draw'](legend_draw, legend_x, y_pos)
-            legend_draw.text((legend_x + icon_size + 10, y_pos + icon_size//2), 
-                           item['name'], fill='white', anchor='lm', font=font)
-        
-        # Save to BytesIO
-        img_io = io.BytesIO()
-        composite.save(img_io, 'PNG')
-        img_io.seek(0)
-        return img_io.getvalue()
+        left, top = x * TILE_SIZE, y * TILE_SIZE
+        if cell_size % scale == 0 and cell_size // scale >= TILE_DETAIL_MIN:
+            return self.render_map(cell_size // scale, (left, top, left + TILE_SIZE, top + TILE_SIZE), base)
+        
+        base = base or self.base_layer()
+        cell_px = cell_size / scale
+        tile = Image.new('P', (TILE_SIZE, TILE_SIZE), color=MAP_COLORS.index(BACKGROUND_COLOR))
+        tile.putpalette(palette_bytes(MAP_COLORS))
+        tile_w = min(TILE_SIZE, math.ceil(base.width * cell_px) - left)
+        tile_h = min(TILE_SIZE, math.ceil(base.height * cell_px) - top)
+        if tile_w > 0 and tile_h > 0:
+            tile.paste(base.resize((tile_w, tile_h), Image.NEAREST, box=(
+                left / cell_px, top / cell_px,
+                min(base.width, (left + tile_w) / cell_px), min(base.height, (top + tile_h) / cell_px)
+            )), (0, 0))
+        return tile
@@ -1,10 +1,24 @@
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, render_template, jsonify, request, send_file, Response, stream_with_context
 from io import BytesIO
-from dGen import DungeonGenerator
+from dGen import DungeonGenerator, TILE_SIZE
+from dGenCache import DungeonCache, canonical_options, dungeon_handle
+from dGenGraph import DungeonGraph
+from dGenSearch import search_seeds
+import dGenFormat
+import base64
+import json
+import logging
+import os
 import time
 
 app = Flask(__name__)
 
+# Generated dungeons keyed by handle; set DGEN_CACHE_DIR to keep them across restarts
+cache = DungeonCache(
+    max_bytes=int(os.environ.get('DGEN_CACHE_BYTES', 64 * 1024 * 1024)),
+    disk_dir=os.environ.get('DGEN_CACHE_DIR')
+)
+
 @app.route('/')
 def index():
     return render_template('dGen.html')
@@ -12,22 +26,195 @@ def index():
 @app.route('/generate', methods=['POST'])
 def generate_dungeon():
     params = request.json
-    generator = DungeonGenerator(params)
-    dungeon = generator.create_dungeon()
+    handle, result = cache.result(params)
+    
+    return jsonify({
+        'handle': handle,
+        'rooms': result['stats']['rooms'],
+        'opts': result['opts'],
+        'stats': result['stats'],
+        'profile': cache.profile(handle),
+        'door_list': result['doors']
+    })
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Generate many dungeons across a process pool. Body:
+    {"options": [{...}, ...], "workers": 4, "ordered": true, "chunk_size": 8,
+     "connected_only": false}
+    Streams one JSON line per dungeon; 'grid' is base64 of little-endian uint32 cells.
+    connected_only validates every dungeon (unless its options already ask for
+    'connectivity') and drops those with rooms, doors or stairs out of reach.
+    """
+    params = request.json or {}
+    options_list = params.get('options', [])
+    if not isinstance(options_list, list):
+        return jsonify({'error': 'options must be a list'}), 400
+    connected_only = bool(params.get('connected_only', False))
+    if connected_only:
+        options_list = [dict(options, connectivity=options.get('connectivity') or 'validate') for options in options_list]
+    
+    results = DungeonGenerator.generate_many(
+        options_list,
+        workers=params.get('workers'),
+        chunk_size=int(params.get('chunk_size', 8)),
+        ordered=bool(params.get('ordered', True))
+    )
+    
+    def stream():
+        for result in results:
+            if connected_only and not result['stats']['connectivity']['connected']:
+                continue
+            result['grid'] = base64.b64encode(result['grid']).decode('ascii')
+            yield json.dumps(result) + '\n'
     
-    # Generate PNG image
-    #png_data = generator.generate_png() no clue why this one would be called here
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+@app.route('/generate/search', methods=['POST'])
+def generate_search():
+    """
+    Find seeds whose dungeons meet constraints. Body:
+    {"options": {...}, "constraints": {"min_rooms": 25, "min_stair_distance": 40,
+     "max_deadend_length": 5, "connected": true}, "count": 3, "start_seed": 0,
+     "max_tries": 1000, "workers": 4}
+    Returns the first count matching seeds with their stats; generate one with
+    /generate and its seed.
+    """
+    params = request.json or {}
+    options = params.get('options', {})
+    constraints = params.get('constraints', {})
+    if not isinstance(options, dict) or not isinstance(constraints, dict):
+        return jsonify({'error': 'options and constraints must be objects'}), 400
+    try:
+        found = search_seeds(
+            options,
+            constraints,
+            count=int(params.get('count', 1)),
+            start_seed=int(params.get('start_seed', 0)),
+            max_tries=int(params.get('max_tries', 1000)),
+            workers=params.get('workers'),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(found)
+
+@app.route('/dungeon/<handle>.png')
+def dungeon_handle_png(handle):
+    png_data = cache.png(handle, int(request.args.get('cellSize', 18)))
+    if png_data is None:
+        return jsonify({'error': 'unknown dungeon handle'}), 404
     
+    return send_file(
+        BytesIO(png_data),
+        mimetype='image/png',
+        as_attachment=False
+    )
+
+@app.route('/dungeon/<handle>/tiles.json')
+def dungeon_tiles_info(handle):
+    renderer = cache.renderer(handle)
+    if renderer is None:
+        return jsonify({'error': 'unknown dungeon handle'}), 404
+    generator = renderer[0]
+    cell_size = int(request.args.get('cellSize', 18))
     return jsonify({
-        'rooms': generator.n_rooms,
-        'opts': generator.opts,
-        'stats': generator.get_stats(),
-        'door_list': generator.doorList
+        'tile_size': TILE_SIZE,
+        'max_zoom': generator.tile_zoom(cell_size),
+        'width': (generator.opts['n_cols'] + 1) * cell_size + 1,
+        'height': (generator.opts['n_rows'] + 1) * cell_size + 1
     })
 
+@app.route('/dungeon/<handle>/tiles/<int:z>/<int:x>/<int:y>.png')
+def dungeon_tile(handle, z, x, y):
+    png_data = cache.tile(handle, int(request.args.get('cellSize', 18)), z, x, y)
+    if png_data is None:
+        return jsonify({'error': 'no such tile'}), 404
+    
+    return send_file(
+        BytesIO(png_data),
+        mimetype='image/png',
+        as_attachment=False
+    )
+
+@app.route('/dungeon/<handle>.dgn')
+def dungeon_binary(handle):
+    """Cached dungeon in the dGenFormat binary container"""
+    result = cache.get(handle)
+    if result is None:
+        return jsonify({'error': 'unknown dungeon handle'}), 404
+    
+    return send_file(
+        BytesIO(dGenFormat.pack(result)),
+        mimetype='application/octet-stream',
+        as_attachment=True,
+        download_name=f'{handle}.dgn'
+    )
+
+@app.route('/dungeon/<handle>/stats')
+def dungeon_stats(handle):
+    result = cache.get(handle)
+    if result is None:
+        return jsonify({'error': 'unknown dungeon handle'}), 404
+    return jsonify(result['stats'])
+
+@app.route('/dungeon/<handle>/graph')
+def dungeon_graph(handle):
+    """Room/stair connectivity graph (built on the first request); ?node=room:5 returns just that node's edges"""
+    graph = cache.graph(handle)
+    if graph is None:
+        return jsonify({'error': 'unknown dungeon handle'}), 404
+    node_id = request.args.get('node')
+    if node_id is None:
+        return jsonify(graph)
+    
+    graph = DungeonGraph(graph)
+    if node_id not in graph.nodes:
+        return jsonify({'error': f'unknown node {node_id}'}), 404
+    return jsonify({'node': graph.nodes[node_id], 'edges': list(graph.neighbors(node_id).values())})
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route('/generate/stream')
+def generate_stream():
+    """
+    Server-Sent Events of DungeonGenerator.create_dungeon_iter, one event per
+    phase delta. The dungeon is cached when done and the 'done' event carries
+    its handle. Takes the same query parameters as /dungeon.png.
+    """
+    opts = canonical_options(options_from_args())
+    handle = dungeon_handle(opts)
+    
+    def stream():
+        generator = DungeonGenerator(opts)
+        for event in generator.create_dungeon_iter():
+            if event['phase'] == 'done':
+                cache.put_generated(handle, generator)
+                event['handle'] = handle
+            yield f"event: {event['phase']}\ndata: {json.dumps(event)}\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/dungeon.png')
 def dungeon_png():
-    params = {
+    params = options_from_args()
+    handle, result = cache.result(params)
+    png_data = cache.png(handle, params['cell_size'], result)
+    if png_data is None:
+        return jsonify({'error': 'dungeon could not be rendered'}), 500
+    
+    return send_file(
+        BytesIO(png_data),
+        mimetype='image/png',
+        as_attachment=False
+    )
+
+def options_from_args():
+    """Generator options from the query string parameter names the page uses"""
+    return {
         'seed': int(request.args.get('seed', time.time() * 1000)),
         'n_rows': int(request.args.get('rows', 39)),
         'n_cols': int(request.args.get('cols', 39)),
@@ -40,16 +227,7 @@ def dungeon_png():
         'dungeon_layout': request.args.get('dungeonLayout', 'None'),
         'add_stairs': int(request.args.get('stairs', 2))
     }
-    
-    generator = DungeonGenerator(params)
-    generator.create_dungeon()
-    png_data = generator.generate_png()
-    
-    return send_file(
-        BytesIO(png_data),
-        mimetype='image/png',
-        as_attachment=False
-    )
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)  # shows 'log_profile' lines from dGen
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,176 @@
+# dGenBench.py
+import io
+import time
+import argparse
+import contextlib
+from statistics import mean, median
+from dGen import DungeonGenerator, PRNG_ENGINES
+
+
+def time_dungeon(options):
+    """Wall time in ms for one create_dungeon() call"""
+    generator = DungeonGenerator(options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        generator.create_dungeon()
+        elapsed = time.perf_counter() - start
+    return elapsed * 1000, generator
+
+
+def bench_prng(sizes, seeds, engines, base_options=None):
+    """Mean per-dungeon time for every (size, prng) pair"""
+    results = []
+    for size in sizes:
+        baseline = None
+        for engine in engines:
+            times = []
+            for seed in seeds:
+                options = dict(base_options or {}, seed=seed, n_rows=size, n_cols=size, prng=engine)
+                ms, _ = time_dungeon(options)
+                times.append(ms)
+            avg = mean(times)
+            if baseline is None:
+                baseline = avg
+            results.append({
+                'size': size,
+                'prng': engine,
+                'mean_ms': avg,
+                'speedup': baseline / avg if avg else 0.0,
+            })
+    return results
+
+
+def bench_backends(sizes, seeds, base_options=None):
+    """
+    Median ms per dungeon of the list and numpy grid backends, run alternately,
+    for create_dungeon() plus to_result() (what a /generate cache miss does)
+    """
+    results = []
+    for size in sizes:
+        times = {'list': [], 'numpy': []}
+        for seed in seeds:
+            for backend in times:
+                options = dict(base_options or {}, seed=seed, n_rows=size, n_cols=size, grid_backend=backend)
+                ms, generator = time_dungeon(options)
+                start = time.perf_counter()
+                generator.to_result()
+                times[backend].append(ms + (time.perf_counter() - start) * 1000)
+        list_ms = median(times['list'])
+        numpy_ms = median(times['numpy'])
+        results.append({
+            'size': size,
+            'list_ms': list_ms,
+            'numpy_ms': numpy_ms,
+            'speedup': list_ms / numpy_ms if numpy_ms else 0.0,
+        })
+    return results
+
+
+def bench_draws(engines, n_draws=200000, seed=1):
+    """Raw cost of one rand() draw per engine, in ns"""
+    results = {}
+    for engine in engines:
+        rand = PRNG_ENGINES[engine](seed)
+        start = time.perf_counter()
+        for _ in range(n_draws):
+            rand()
+        results[engine] = (time.perf_counter() - start) * 1e9 / n_draws
+    return results
+
+
+def bench_png(sizes, seeds, base_options=None):
+    """Mean generate_png() time in ms per size (first render warms the glyph caches)"""
+    results = []
+    for size in sizes:
+        times = []
+        for seed in seeds:
+            options = dict(base_options or {}, seed=seed, n_rows=size, n_cols=size)
+            _, generator = time_dungeon(options)
+            generator.generate_png()
+            start = time.perf_counter()
+            generator.generate_png()
+            times.append((time.perf_counter() - start) * 1000)
+        results.append({'size': size, 'mean_ms': mean(times)})
+    return results
+
+
+def bench_phases(sizes, room_layouts, seeds, base_options=None):
+    """Mean per-phase ms and counters for every (size, room layout) pair"""
+    results = []
+    for size in sizes:
+        for room_layout in room_layouts:
+            profiles = []
+            for seed in seeds:
+                options = dict(base_options or {}, seed=seed, n_rows=size, n_cols=size, room_layout=room_layout)
+                _, generator = time_dungeon(options)
+                profiles.append(generator.profile())
+            results.append({
+                'size': size,
+                'room_layout': room_layout,
+                'phases_ms': {phase: mean(p['phases_ms'].get(phase, 0.0) for p in profiles)
+                              for phase in profiles[0]['phases_ms']},
+                'counters': {name: mean(p['counters'][name] for p in profiles)
+                             for name in profiles[0]['counters']},
+            })
+    return results
+
+
+def print_phases(results):
+    phases = list(results[0]['phases_ms'])
+    counters = list(results[0]['counters'])
+    print(f"{'size':>6} {'layout':>10} " + ' '.join(f"{phase:>14}" for phase in phases + counters))
+    for row in results:
+        values = [f"{row['phases_ms'][phase]:>12.2f}ms" for phase in phases]
+        values += [f"{row['counters'][name]:>14.0f}" for name in counters]
+        print(f"{row['size']:>6} {row['room_layout']:>10} " + ' '.join(values))
+
+
+def print_results(results):
+    print(f"{'size':>6} {'prng':>12} {'mean ms':>10} {'speedup':>8}")
+    for row in results:
+        print(f"{row['size']:>6} {row['prng']:>12} {row['mean_ms']:>10.2f} {row['speedup']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark DungeonGenerator per-dungeon generation time')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[39, 79, 159],
+                        help='Square map sizes (n_rows = n_cols) to generate')
+    parser.add_argument('--seeds', type=int, default=10,
+                        help='Number of seeds averaged per size')
+    parser.add_argument('--prng', nargs='+', default=list(PRNG_ENGINES),
+                        help='PRNG engines to compare; the first one is the speedup baseline')
+    parser.add_argument('--grid-backend', default='list', choices=['list', 'numpy'])
+    parser.add_argument('--png', action='store_true',
+                        help='Benchmark generate_png() render time instead of generation')
+    parser.add_argument('--phases', action='store_true',
+                        help='Report mean time per generation phase and call counters')
+    parser.add_argument('--backends', action='store_true',
+                        help='Compare median generation time of the list and numpy grid backends')
+    args = parser.parse_args()
+
+    if args.backends:
+        print(f"{'size':>6} {'list ms':>10} {'numpy ms':>10} {'speedup':>8}")
+        for row in bench_backends(args.sizes, range(1, args.seeds + 1), {'prng': args.prng[0]}):
+            print(f"{row['size']:>6} {row['list_ms']:>10.2f} {row['numpy_ms']:>10.2f} {row['speedup']:>7.2f}x")
+        raise SystemExit
+
+    if args.phases:
+        print_phases(bench_phases(args.sizes, ['Scattered', 'Packed'], range(1, args.seeds + 1),
+                                  {'grid_backend': args.grid_backend, 'prng': args.prng[0]}))
+        raise SystemExit
+
+    if args.png:
+        print(f"{'size':>6} {'png ms':>10}")
+        for row in bench_png(args.sizes, range(1, args.seeds + 1), {'grid_backend': args.grid_backend}):
+            print(f"{row['size']:>6} {row['mean_ms']:>10.2f}")
+        raise SystemExit
+
+    draws = bench_draws(args.prng)
+    print(f"{'prng':>12} {'ns/draw':>10}")
+    for engine, ns in draws.items():
+        print(f"{engine:>12} {ns:>10.1f}")
+    print()
+    
+    results = bench_prng(args.sizes, range(1, args.seeds + 1), args.prng,
+                         {'grid_backend': args.grid_backend, 'remove_deadends': 100})
+    print_results(results)
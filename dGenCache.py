@@ -0,0 +1,244 @@
+# dGenCache.py
+import io
+import os
+import json
+import pickle
+import struct
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from dGen import DungeonGenerator, png_bytes
+import dGenFormat
+
+# Dungeons kept rebuilt in memory (with their base layer) for tile rendering
+RENDERER_SLOTS = 4
+
+# Options that only change how a dungeon is drawn, stored or reported, not its layout
+RENDER_OPTIONS = ('cell_size', 'map_style', 'grid', 'grid_backend', 'log_profile')
+
+# Disk tier file extensions, tried in this order on a read: generation
+# results as dGenFormat containers, other dicts (profiles) as JSON, bytes
+# (PNGs) as they are. Never pickles, so whoever else can write to the
+# cache directory cannot make a load run code.
+DISK_FORMATS = ('.dgen', '.json', '.bin')
+
+
+def canonical_options(options):
+    """Full generation options (defaults filled in, sizes rounded like init_dungeon_size)"""
+    opts = dict(DungeonGenerator(options).opts)
+    for key in RENDER_OPTIONS:
+        opts.pop(key, None)
+    opts['n_rows'] = (opts['n_rows'] // 2) * 2
+    opts['n_cols'] = (opts['n_cols'] // 2) * 2
+    return opts
+
+
+def dungeon_handle(opts):
+    """Content address of the dungeon canonical options produce"""
+    canonical = json.dumps(opts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+class DungeonCache:
+    """
+    LRU of generated dungeons keyed by handle, bounded by max_bytes.
+
+    Values are kept in memory as pickles, so their size is exact. The
+    optional disk tier (disk_dir) stores them in DISK_FORMATS, and memory
+    evictions stay on disk and are promoted back on the next hit. Map
+    tiles share the memory LRU but are never written to disk.
+
+    The newest dungeon handed out by result() or put_generated() (and its
+    profile) stays in memory even past max_bytes, so the handle a client
+    was just given can be looked up without a disk tier.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.pinned = ()  # keys of the newest dungeon, never evicted
+        self.renderers = OrderedDict()
+        self.lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(data)
+
+        value = self._read_disk(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    def put(self, key, value, persist=True):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._remember(key, data)
+        if persist:
+            self._write_disk(key, value)
+
+    def result(self, options):
+        """(handle, result) for options, generating only on a cache miss"""
+        # Generate from the canonical options so a defaulted seed is fixed once
+        opts = canonical_options(options)
+        handle = dungeon_handle(opts)
+        result = self.get(handle)
+        if result is None:
+            generator = DungeonGenerator(dict(opts, log_profile=(options or {}).get('log_profile', False)))
+            with contextlib.redirect_stdout(io.StringIO()):  # create_dungeon prints its counts
+                generator.create_dungeon()
+            result = self.put_generated(handle, generator)
+        else:
+            self._pin(handle)
+        return handle, result
+
+    def put_generated(self, handle, generator):
+        """Cache a generated dungeon's result and the profile of its run; returns the result"""
+        result = generator.to_result()
+        self._pin(handle)
+        self.put(handle, result)
+        self.put(f"{handle}.profile", generator.profile())
+        return result
+
+    def profile(self, handle):
+        """Timings and counters of the run that generated handle (kept with it on disk)"""
+        return self.get(f"{handle}.profile")
+
+    def graph(self, handle):
+        """Room graph of a cached dungeon, built and stored with it on first request; None if the handle is unknown"""
+        result = self.get(handle)
+        if result is None:
+            return None
+        if result['graph'] is None:
+            result['graph'] = DungeonGenerator.from_result(result).graph
+            self.put(handle, result)
+        return result['graph']
+
+    def png(self, handle, cell_size, result=None):
+        """Rendered PNG for a cached dungeon (or its result, if the caller has it), or None if the handle is unknown"""
+        key = f"{handle}.{cell_size}.png"
+        png_data = self.get(key)
+        if png_data is None:
+            if result is None:
+                result = self.get(handle)
+            if result is None:
+                return None
+            generator = DungeonGenerator.from_result(result)
+            generator.opts['cell_size'] = cell_size
+            png_data = generator.generate_png()
+            self.put(key, png_data)
+        return png_data
+
+    def tile(self, handle, cell_size, z, x, y):
+        """PNG of slippy-map tile (z, x, y), or None for an unknown handle or a tile off the map"""
+        key = f"{handle}.{cell_size}.{z}.{x}.{y}.tile.png"
+        png_data = self.get(key)
+        if png_data is None:
+            renderer = self.renderer(handle)
+            if renderer is None:
+                return None
+            generator, base = renderer
+            tile = generator.render_tile(cell_size, z, x, y, base)
+            if tile is None:
+                return None
+            png_data = png_bytes(tile)
+            self.put(key, png_data, persist=False)
+        return png_data
+
+    def renderer(self, handle):
+        """(generator, base layer) rebuilt from a cached result, kept for the last few handles"""
+        with self.lock:
+            renderer = self.renderers.get(handle)
+            if renderer is not None:
+                self.renderers.move_to_end(handle)
+                return renderer
+        result = self.get(handle)
+        if result is None:
+            return None
+        generator = DungeonGenerator.from_result(result)
+        renderer = (generator, generator.base_layer())
+        with self.lock:
+            self.renderers[handle] = renderer
+            while len(self.renderers) > RENDERER_SLOTS:
+                self.renderers.popitem(last=False)
+        return renderer
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.n_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _pin(self, handle):
+        """Keep handle's result and profile in memory until the next dungeon is pinned"""
+        with self.lock:
+            self.pinned = (handle, f"{handle}.profile")
+
+    def _remember(self, key, data):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.n_bytes -= len(old)
+        if len(data) > self.max_bytes and key not in self.pinned:
+            return
+        self.entries[key] = data
+        self.n_bytes += len(data)
+        for candidate in list(self.entries):  # least recent first
+            if self.n_bytes <= self.max_bytes:
+                break
+            if candidate not in self.pinned:
+                self.n_bytes -= len(self.entries.pop(candidate))
+
+    def _disk_path(self, key, extension):
+        return os.path.join(self.disk_dir, key + extension)
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        for extension in DISK_FORMATS:
+            try:
+                with open(self._disk_path(key, extension), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            try:
+                if extension == '.dgen':
+                    return dGenFormat.DungeonFile(data).to_result()
+                if extension == '.json':
+                    return json.loads(data.decode('utf-8'))
+            except (ValueError, struct.error):  # damaged or foreign file: a miss
+                return None
+            return data
+        return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        if isinstance(value, bytes):
+            extension, data = '.bin', value
+        elif isinstance(value, dict) and 'grid' in value:
+            extension, data = '.dgen', dGenFormat.pack(value)
+        else:
+            extension, data = '.json', json.dumps(value).encode('utf-8')
+        path = self._disk_path(key, extension)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
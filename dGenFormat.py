@@ -0,0 +1,188 @@
+# dGenFormat.py
+import sys
+import json
+import mmap
+import struct
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for DungeonFile.cell_array
+    np = None
+
+# Binary dungeon container, all little-endian and 4-byte aligned:
+#   header       HEADER
+#   meta         JSON {'opts': ..., 'stats': ..., 'graph': ...}, zero-padded to 4 bytes
+#   cells        (n_rows + 1) * (n_cols + 1) uint32, row-major
+#   rooms        ROOM per room
+#   doors        DOOR per entry of the door list
+#   room doors   ROOM_DOOR per (room, direction, door) link
+#   stairs       STAIR per stair
+MAGIC = b'DGEN'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIIII')  # magic, version, flags, n_rows, n_cols, n_rooms, n_doors, n_room_doors, n_stairs, meta_len
+ROOM = struct.Struct('<10I')  # id, row, col, north, south, west, east, height, width, area
+DOOR = struct.Struct('<4I')  # row, col, key index, out_id (0 = none)
+ROOM_DOOR = struct.Struct('<3I')  # room id, direction index, door index
+STAIR = struct.Struct('<5I')  # row, col, next_row, next_col, key index
+
+DOOR_TYPES = [
+    ('arch', 'Archway'), ('open', 'Unlocked Door'), ('lock', 'Locked Door'),
+    ('trap', 'Trapped Door'), ('secret', 'Secret Door'), ('portc', 'Portcullis'),
+    ('door_open', 'Open Door'), ('door_broken', 'Broken Door'),
+    ('portc_open', 'Open Portcullis'), ('portc_broken', 'Broken Portcullis'),
+]
+DOOR_KEYS = [key for key, _ in DOOR_TYPES]
+DIRECTIONS = ['north', 'south', 'west', 'east']
+STAIR_KEYS = ['down', 'up']
+ROOM_FIELDS = ['id', 'row', 'col', 'north', 'south', 'west', 'east', 'height', 'width', 'area']
+
+
+def _pad(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def pack(result):
+    """Encode a DungeonGenerator.to_result() dict as container bytes"""
+    doors = result['doors']
+    door_index = {(door['row'], door['col']): k for k, door in enumerate(doors)}
+    room_doors = []
+    for room in result['rooms']:
+        for dir, room_door_list in room['door'].items():
+            for door in room_door_list:
+                position = (door['row'], door['col'])
+                if position not in door_index:
+                    raise ValueError(f"Room {room['id']} door at {position} is not in the door list")
+                room_doors.append((room['id'], DIRECTIONS.index(dir), door_index[position]))
+
+    meta = _pad(json.dumps({'opts': result['opts'], 'stats': result['stats'], 'graph': result.get('graph')}).encode('utf-8'))
+    parts = [
+        HEADER.pack(MAGIC, VERSION, 0, result['n_rows'], result['n_cols'], len(result['rooms']),
+                    len(doors), len(room_doors), len(result['stairs']), len(meta)),
+        meta,
+        result['grid'],
+    ]
+    parts.extend(ROOM.pack(*(room[field] for field in ROOM_FIELDS)) for room in result['rooms'])
+    parts.extend(
+        DOOR.pack(door['row'], door['col'], DOOR_KEYS.index(door['key']), door.get('out_id') or 0)
+        for door in doors
+    )
+    parts.extend(ROOM_DOOR.pack(*link) for link in room_doors)
+    parts.extend(
+        STAIR.pack(stair['row'], stair['col'], stair['next_row'], stair['next_col'], STAIR_KEYS.index(stair['key']))
+        for stair in result['stairs']
+    )
+    return b''.join(parts)
+
+
+def save(result, path):
+    with open(path, 'wb') as f:
+        f.write(pack(result))
+
+
+def load(path, use_mmap=True):
+    """Open a saved dungeon; with use_mmap the file is mapped, not read"""
+    with open(path, 'rb') as f:
+        if use_mmap:
+            return DungeonFile(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return DungeonFile(f.read())
+
+
+class DungeonFile:
+    """
+    Read-only view over container bytes (bytes, bytearray, mmap, ...).
+
+    Nothing is decoded up front: cells is a memoryview straight into the
+    buffer and the tables are unpacked only when asked for, so opening an
+    archived dungeon costs one header parse.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        (magic, version, _, self.n_rows, self.n_cols, self.n_rooms, self.n_doors,
+         self.n_room_doors, self.n_stairs, meta_len) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a dungeon file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported dungeon file version: {version}")
+
+        self.meta_offset = HEADER.size
+        self.cells_offset = self.meta_offset + meta_len
+        self.n_cells = (self.n_rows + 1) * (self.n_cols + 1)
+        self.rooms_offset = self.cells_offset + 4 * self.n_cells
+        self.doors_offset = self.rooms_offset + ROOM.size * self.n_rooms
+        self.room_doors_offset = self.doors_offset + DOOR.size * self.n_doors
+        self.stairs_offset = self.room_doors_offset + ROOM_DOOR.size * self.n_room_doors
+        end = self.stairs_offset + STAIR.size * self.n_stairs
+        if end > len(self.buffer):
+            raise ValueError("Truncated dungeon file")
+
+    def meta(self):
+        raw = bytes(self.buffer[self.meta_offset:self.cells_offset]).rstrip(b'\0')
+        return json.loads(raw.decode('utf-8'))
+
+    @property
+    def grid(self):
+        """Raw little-endian uint32 cell plane (zero-copy)"""
+        return self.buffer[self.cells_offset:self.rooms_offset]
+
+    @property
+    def cells(self):
+        """Cells as a 2-D uint32 memoryview, indexable as cells[r, c] (zero-copy on little-endian hosts)"""
+        grid = self.grid
+        if sys.byteorder == 'big':
+            swapped = array('I', grid)
+            swapped.byteswap()
+            grid = memoryview(swapped).cast('B')
+        return grid.cast('I', [self.n_rows + 1, self.n_cols + 1])
+
+    def cell_array(self):
+        """Cells as a read-only numpy uint32 array sharing the buffer"""
+        if np is None:
+            raise ImportError("cell_array requires numpy to be installed")
+        return np.frombuffer(self.buffer, dtype='<u4', count=self.n_cells,
+                             offset=self.cells_offset).reshape(self.n_rows + 1, self.n_cols + 1)
+
+    def doors(self):
+        doors = []
+        for row, col, key, out_id in DOOR.iter_unpack(self.buffer[self.doors_offset:self.room_doors_offset]):
+            door = {'row': row, 'col': col, 'key': DOOR_TYPES[key][0], 'type': DOOR_TYPES[key][1]}
+            if out_id:
+                door['out_id'] = out_id
+            doors.append(door)
+        return doors
+
+    def rooms(self, doors=None):
+        """Room dicts; their 'door' lists share door dicts with doors when given"""
+        doors = self.doors() if doors is None else doors
+        rooms = []
+        for values in ROOM.iter_unpack(self.buffer[self.rooms_offset:self.doors_offset]):
+            room = dict(zip(ROOM_FIELDS, values))
+            room['door'] = {}
+            rooms.append(room)
+        for room_id, dir, door in ROOM_DOOR.iter_unpack(self.buffer[self.room_doors_offset:self.stairs_offset]):
+            rooms[room_id - 1]['door'].setdefault(DIRECTIONS[dir], []).append(doors[door])
+        return rooms
+
+    def stairs(self):
+        end = self.stairs_offset + STAIR.size * self.n_stairs
+        return [
+            {'row': row, 'col': col, 'next_row': next_row, 'next_col': next_col, 'key': STAIR_KEYS[key]}
+            for row, col, next_row, next_col, key in STAIR.iter_unpack(self.buffer[self.stairs_offset:end])
+        ]
+
+    def to_result(self):
+        """Decode into a DungeonGenerator.to_result() dict (copies the grid)"""
+        meta = self.meta()
+        doors = self.doors()
+        return {
+            'opts': meta['opts'],
+            'n_rows': self.n_rows,
+            'n_cols': self.n_cols,
+            'grid': bytes(self.grid),
+            'rooms': self.rooms(doors),
+            'doors': doors,
+            'stairs': self.stairs(),
+            'graph': meta.get('graph'),
+            'stats': meta['stats'],
+        }
@@ -0,0 +1,93 @@
+# dGenGraph.py
+import heapq
+
+
+def room_node(room_id):
+    return f'room:{room_id}'
+
+
+def stair_node(index):
+    return f'stair:{index}'
+
+
+class DungeonGraph:
+    """
+    Query view over DungeonGenerator.room_graph() output (result['graph']).
+
+    Node and edge lookups are dict hits and neighbors() is O(degree), so
+    the DM tools, movement and AI prompts can ask "what connects to room 5"
+    without walking cells. Edge lengths are steps between the openings at
+    either end; distance() and path() add them up along the shortest chain.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = {node['id']: node for node in graph['nodes']}
+        self.adjacency = {node_id: {} for node_id in self.nodes}
+        for edge in graph['edges']:
+            self.adjacency[edge['from']][edge['to']] = edge
+            self.adjacency[edge['to']][edge['from']] = edge
+
+    @classmethod
+    def from_result(cls, result):
+        """Graph of a to_result() dict, or None if it was stored without one"""
+        graph = result.get('graph')
+        return None if graph is None else cls(graph)
+
+    def neighbors(self, node_id):
+        """{neighbor id: edge} for node_id"""
+        return self.adjacency.get(node_id, {})
+
+    def edge(self, a, b):
+        return self.adjacency.get(a, {}).get(b)
+
+    def connected_rooms(self, room_id):
+        """Ids of the rooms one corridor (or shared door) away from room_id"""
+        return sorted(
+            self.nodes[other]['room'] for other in self.neighbors(room_node(room_id))
+            if self.nodes[other]['kind'] == 'room'
+        )
+
+    def exits(self, room_id):
+        """[{'to', 'length', 'door'}] for room_id, door being the one on this room's side"""
+        node_id = room_node(room_id)
+        exits = []
+        for other, edge in sorted(self.neighbors(node_id).items()):
+            door = edge['doors'][0] if edge['from'] == node_id else edge['doors'][1]
+            exits.append({'to': other, 'length': edge['length'], 'door': door})
+        return exits
+
+    def stairs(self, key=None):
+        """Stair node ids, optionally only 'down' or 'up' ones"""
+        return [
+            node_id for node_id, node in self.nodes.items()
+            if node['kind'] == 'stair' and (key is None or node['key'] == key)
+        ]
+
+    def path(self, a, b):
+        """(length, [node ids from a to b]) of the shortest chain of edges, or None"""
+        if a not in self.nodes or b not in self.nodes:
+            return None
+        best = {a: 0}
+        back = {a: None}
+        heap = [(0, a)]
+        while heap:
+            length, node_id = heapq.heappop(heap)
+            if node_id == b:
+                chain = [b]
+                while back[chain[-1]] is not None:
+                    chain.append(back[chain[-1]])
+                return length, chain[::-1]
+            if length > best[node_id]:
+                continue
+            for other, edge in self.adjacency[node_id].items():
+                other_length = length + edge['length']
+                if other_length < best.get(other, other_length + 1):
+                    best[other] = other_length
+                    back[other] = node_id
+                    heapq.heappush(heap, (other_length, other))
+        return None
+
+    def distance(self, a, b):
+        found = self.path(a, b)
+        return None if found is None else found[0]
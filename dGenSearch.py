@@ -0,0 +1,155 @@
+# dGenSearch.py
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dGen import DungeonGenerator
+
+# Metrics a constraint can bound (as min_<metric> / max_<metric>); all are
+# final once clean_dungeon has run
+METRICS = ('rooms', 'doors', 'corridors', 'stair_distance', 'deadend_length')
+
+
+class SeedConstraints:
+    """
+    Bounds a dungeon has to meet, e.g. {'min_rooms': 25, 'min_stair_distance': 40,
+    'max_deadend_length': 5, 'connected': True}.
+
+    prune() rules a candidate out after the phase that settles or bounds a
+    metric: the room count is final after emplace_rooms, and once stairs
+    are placed a missing stair, or stairs further apart (Manhattan) than
+    max_stair_distance, cannot be fixed by later phases. Everything else
+    is checked once clean_dungeon has run, so the room graph is never
+    built for a candidate.
+    """
+
+    def __init__(self, constraints):
+        self.bounds = {}  # metric: [min, max], None for an open end
+        self.connected = False
+        for key, value in constraints.items():
+            if key == 'connected':
+                self.connected = bool(value)
+                continue
+            side, _, metric = key.partition('_')
+            if side not in ('min', 'max') or metric not in METRICS:
+                raise ValueError(f"Unknown constraint: {key}")
+            self.bounds.setdefault(metric, [None, None])[side == 'max'] = value
+
+    def options(self, options):
+        """options with connectivity validation switched on when 'connected' is asked for"""
+        if self.connected and not options.get('connectivity'):
+            return dict(options, connectivity='validate')
+        return options
+
+    def within(self, metric, value):
+        if metric not in self.bounds:
+            return True
+        low, high = self.bounds[metric]
+        if value is None:
+            return low is None and high is None
+        return (low is None or value >= low) and (high is None or value <= high)
+
+    def prune(self, generator, phase):
+        """True if the dungeon generated up to phase can no longer meet the constraints"""
+        if phase == 'emplace_rooms':
+            return not self.within('rooms', generator.n_rooms)
+        if phase == 'corridors' and 'stair_distance' in self.bounds and not generator.opts['add_stairs']:
+            return True
+        if phase == 'emplace_stairs' and 'stair_distance' in self.bounds:
+            down = next((stair for stair in generator.stairs if stair['key'] == 'down'), None)
+            up = next((stair for stair in generator.stairs if stair['key'] == 'up'), None)
+            if down is None or up is None:
+                return True
+            high = self.bounds['stair_distance'][1]
+            return high is not None and abs(down['row'] - up['row']) + abs(down['col'] - up['col']) > high
+        return False
+
+    def measure(self, generator):
+        """get_stats() plus the stair_distance and deadend_length metrics"""
+        stats = generator.get_stats()
+        stats['stair_distance'] = generator.stair_distance()
+        stats['deadend_length'] = generator.longest_deadend()
+        return stats
+
+    def accepts(self, stats):
+        if self.connected and not stats['connectivity']['connected']:
+            return False
+        return all(self.within(metric, stats[metric]) for metric in self.bounds)
+
+    def evaluate(self, generator):
+        """
+        Generate up to clean_dungeon: (stats, None) for a match, else
+        (None, phase that ruled it out).
+        """
+        for phase in generator.generate_phases():
+            if self.prune(generator, phase):
+                return None, phase
+            if phase == 'clean_dungeon':
+                break
+        stats = self.measure(generator)
+        if self.accepts(stats):
+            return stats, None
+        return None, 'clean_dungeon'
+
+
+def _search_chunk(job):
+    """Process-pool worker: [(seed, stats or None, ruling-out phase or None)] for a chunk of seeds"""
+    options, constraints, seeds = job
+    constraints = SeedConstraints(constraints)
+    options = constraints.options(options)
+    outcomes = []
+    for seed in seeds:
+        stats, phase = constraints.evaluate(DungeonGenerator(dict(options, seed=seed)))
+        outcomes.append((seed, stats, phase))
+    return outcomes
+
+
+def search_seeds(options, constraints, count=1, start_seed=0, max_tries=1000, workers=None, chunk_size=8):
+    """
+    Try seeds start_seed, start_seed + 1, ... of options until count of them
+    meet constraints (see SeedConstraints) or max_tries seeds were tried.
+
+    Returns {'matches': [{'seed', 'stats'}], 'tried': n, 'ruled_out':
+    {phase: n}}. Seeds go to a process pool in chunks of chunk_size (at most
+    two chunks per worker in flight; workers=1 runs inline) and are taken
+    back in seed order, so matches are always the lowest matching seeds
+    whatever the worker count. Raises ValueError for unknown constraints.
+    """
+    SeedConstraints(constraints)  # fail before starting workers
+    seeds = range(start_seed, start_seed + max_tries)
+    jobs = ((options, constraints, seeds[k:k + chunk_size]) for k in range(0, max_tries, chunk_size))
+    matches = []
+    ruled_out = Counter()
+    tried = 0
+
+    def take(outcomes):
+        nonlocal tried
+        for seed, stats, phase in outcomes:
+            if len(matches) >= count:
+                return
+            tried += 1
+            if stats is None:
+                ruled_out[phase] += 1
+            else:
+                matches.append({'seed': seed, 'stats': stats})
+
+    if workers == 1:
+        for job in jobs:
+            take(_search_chunk(job))
+            if len(matches) >= count:
+                break
+    else:
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for job in jobs:
+                pending.append(pool.submit(_search_chunk, job))
+                if len(pending) >= max_pending:
+                    take(pending.popleft().result())
+                    if len(matches) >= count:
+                        break
+            while pending and len(matches) < count:
+                take(pending.popleft().result())
+            for future in pending:
+                future.cancel()
+
+    return {'matches': matches, 'tried': tried, 'ruled_out': dict(ruled_out)}
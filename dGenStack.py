@@ -0,0 +1,128 @@
+# dGenStack.py
+import io
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dGen import DungeonGenerator
+
+# Materialized levels kept per stack
+LEVEL_SLOTS = 4
+
+# Steps (Manhattan) from a down stair at which the level below is prefetched
+PREFETCH_RADIUS = 12
+
+
+def level_seed(location_id, level, world_seed=0):
+    """Seed of one level of a location's stack; stable across runs and processes, unlike hash()"""
+    digest = hashlib.sha256(f'{world_seed}:{location_id}:{level}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:6], 'little')
+
+
+def _build_level(options):
+    """Process-pool worker: one level as a compact result"""
+    with contextlib.redirect_stdout(io.StringIO()):  # create_dungeon prints its counts
+        return DungeonGenerator(options).create_dungeon().to_result()
+
+
+class DungeonStack:
+    """
+    Levels 1, 2, ... of the dungeon under one location, generated on demand.
+
+    Level n is generated from level_seed(location_id, n) with its up stair
+    pinned (opts['up_stair']) under the first down stair of level n - 1, so
+    taking the stairs keeps the party's map position. The deepest level
+    (depth, if given) gets no down stair.
+
+    level(n) builds a level the first time it is needed; moved() starts
+    building the level below in a background process once the party comes
+    within PREFETCH_RADIUS of a down stair. At most max_levels generators
+    are kept (LRU). Evicted levels are rebuilt from their seed, and the
+    down-stair position of every level built so far is remembered, so a
+    rebuild never has to regenerate the levels above it.
+    """
+
+    def __init__(self, location_id, options=None, world_seed=0, depth=None, max_levels=LEVEL_SLOTS, prefetch=True):
+        self.location_id = location_id
+        self.options = dict(options or {})
+        self.world_seed = world_seed
+        self.depth = depth
+        self.max_levels = max_levels
+        self.prefetch_enabled = prefetch
+        self.levels = OrderedDict()  # level: DungeonGenerator
+        self.down_stairs = {}  # level: [row, col] of its first down stair, None if it has none
+        self.pending = {}  # level: future of _build_level
+        self.pool = None
+        self.lock = threading.RLock()
+
+    def level_options(self, level):
+        """Generation options of level (the level above must have been built)"""
+        options = dict(self.options, seed=level_seed(self.location_id, level, self.world_seed))
+        if level > 1:
+            options['up_stair'] = self.down_stairs[level - 1]
+            if level == self.depth:
+                options['add_stairs'] = 1  # just the pinned up stair
+        return options
+
+    def level(self, level):
+        """Generator of level, built (or waited for) if needed; None past the bottom of the stack"""
+        with self.lock:
+            if level < 1 or (self.depth is not None and level > self.depth):
+                return None
+            generator = self.levels.get(level)
+            if generator is not None:
+                self.levels.move_to_end(level)
+                return generator
+            if level > 1 and level - 1 not in self.down_stairs:
+                self.level(level - 1)
+            if level > 1 and self.down_stairs[level - 1] is None:
+                return None
+
+            future = self.pending.pop(level, None)
+            if future is not None:
+                generator = DungeonGenerator.from_result(future.result())
+            else:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    generator = DungeonGenerator(self.level_options(level)).create_dungeon()
+            self._remember(level, generator)
+            return generator
+
+    def prefetch(self, level):
+        """Start building level in the background if it is not built or on its way"""
+        with self.lock:
+            if (not self.prefetch_enabled or level in self.levels or level in self.pending
+                    or level - 1 not in self.down_stairs or self.down_stairs[level - 1] is None
+                    or (self.depth is not None and level > self.depth)):
+                return
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=1)
+            self.pending[level] = self.pool.submit(_build_level, self.level_options(level))
+
+    def moved(self, level, row, col):
+        """Tell the stack where the party is; prefetches the level below near a down stair"""
+        down = self.down_stairs.get(level)
+        if down is not None and abs(down[0] - row) + abs(down[1] - col) <= PREFETCH_RADIUS:
+            self.prefetch(level + 1)
+
+    def arrival(self, level):
+        """[row, col] where the party arrives on level coming down (its up stair)"""
+        generator = self.level(level)
+        if generator is None:
+            return None
+        up = next((stair for stair in generator.stairs if stair['key'] == 'up'), None)
+        return up and [up['row'], up['col']]
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+            self.pending.clear()
+
+    def _remember(self, level, generator):
+        down = next((stair for stair in generator.stairs if stair['key'] == 'down'), None)
+        self.down_stairs[level] = down and [down['row'], down['col']]
+        self.levels[level] = generator
+        while len(self.levels) > self.max_levels:
+            self.levels.popitem(last=False)
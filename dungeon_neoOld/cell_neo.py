@@ -1,5 +1,52 @@
+from types import MappingProxyType
 from dungeon_neo.constants import CELL_FLAGS
+
+# Per-cell attributes a DungeonStateNeo keeps in sparse side tables, with
+# the factory of their empty value (None: immutable, read as the default)
+SIDE_TABLES = {
+    'features': list,
+    'objects': list,
+    'npcs': list,
+    'items': list,
+    'modifications': list,
+    'temporary_effects': list,
+    'entities': list,
+    'overlays': list,
+    'properties': dict,
+    'description': None,
+}
+
+# What a cell view reads for a missing side table entry; read-only, so
+# writes have to go through DungeonStateNeo.side_value(..., create=True)
+EMPTY_SIDE_VALUES = {list: (), dict: MappingProxyType({})}
+
+def to_flags(value):
+    """Convert any value to a valid integer flag"""
+    try:
+        # Handle string representations of integers
+        if isinstance(value, str):
+            # Try to parse hex string (e.g., '0x1000')
+            if value.startswith('0x'):
+                return int(value, 16)
+            # Parse decimal string
+            return int(value)
+        # Handle float values
+        if isinstance(value, float):
+            return int(value)
+        # Handle None and other types
+        if value is None:
+            return CELL_FLAGS['NOTHING']
+        # Return integer as-is
+        return int(value)
+    except (TypeError, ValueError):
+        return CELL_FLAGS['NOTHING']
+
 class DungeonCellNeo:
+    __slots__ = (
+        'base_type', 'x', 'y', 'features', 'objects', 'npcs', 'items', 'modifications',
+        'temporary_effects', 'entities', 'overlays', 'description', 'properties', 'discovered', '_state'
+    )
+
     NOTHING = CELL_FLAGS['NOTHING']
     BLOCKED = CELL_FLAGS['BLOCKED']
     ROOM = CELL_FLAGS['ROOM']
@@ -56,24 +103,7 @@ class DungeonCellNeo:
 
     def _ensure_int(self, value):
         """Convert any value to a valid integer flag"""
-        try:
-            # Handle string representations of integers
-            if isinstance(value, str):
-                # Try to parse hex string (e.g., '0x1000')
-                if value.startswith('0x'):
-                    return int(value, 16)
-                # Parse decimal string
-                return int(value)
-            # Handle float values
-            if isinstance(value, float):
-                return int(value)
-            # Handle None and other types
-            if value is None:
-                return self.NOTHING
-            # Return integer as-is
-            return int(value)
-        except (TypeError, ValueError):
-            return self.NOTHING
+        return to_flags(value)
 
     def is_passable(self, secret_revealed=False):
         if self.is_blocked: 
@@ -164,4 +194,65 @@ class DungeonCellNeo:
     
     @property
     def has_label(self):
-        return self._safe_property_check(self.LABEL)
\ No newline at end of file
+        return self._safe_property_check(self.LABEL)
+
+
+class _SideTable:
+    """DungeonCellViewNeo attribute stored in the state's side table of the same name"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, cell, owner=None):
+        if cell is None:
+            return self
+        value = cell._state.side_value(self.name, cell.x, cell.y)
+        if value is None:
+            return EMPTY_SIDE_VALUES[SIDE_TABLES[self.name]]
+        return value
+
+    def __set__(self, cell, value):
+        cell._state.set_side_value(self.name, cell.x, cell.y, value)
+
+
+class DungeonCellViewNeo(DungeonCellNeo):
+    """
+    Cell (x, y) of a DungeonStateNeo, made on demand by get_cell(). It has
+    the DungeonCellNeo API, but base_type lives in the state's flag plane
+    and the lists, description and properties in its sparse side tables,
+    so views are cheap to make and throw away. Reading a missing list or
+    dict gives an empty read-only one and stores nothing.
+    """
+    __slots__ = ()  # _state, x and y are DungeonCellNeo slots
+
+    features = _SideTable()
+    objects = _SideTable()
+    npcs = _SideTable()
+    items = _SideTable()
+    modifications = _SideTable()
+    temporary_effects = _SideTable()
+    entities = _SideTable()
+    overlays = _SideTable()
+    properties = _SideTable()
+    description = _SideTable()
+
+    def __init__(self, state, x, y):
+        self._state = state
+        self.x = x
+        self.y = y
+
+    @property
+    def base_type(self):
+        return self._state.flags[self.y * self._state.width + self.x]
+
+    @base_type.setter
+    def base_type(self, value):
+        self._state.flags[self.y * self._state.width + self.x] = to_flags(value)
+
+    def _safe_property_check(self, flag):
+        return bool(self._state.flags[self.y * self._state.width + self.x] & flag)
+
+    def reveal_secret(self):
+        if self.base_type == self.SECRET:
+            return self._state.reveal_secret(self.x, self.y)
+        return False
@@ -105,4 +105,9 @@ OPPOSITE_DIRECTIONS = {
     'south': 'north',
     'east': 'west',
     'west': 'east'
-}
\ No newline at end of file
+}
+# Door/stair orientation codes for compact planes (0 = not a door or stair)
+ORIENTATION_CODES = {
+    'horizontal': 1,
+    'vertical': 2
+}
@@ -1,6 +1,6 @@
 #from dungeon_neo.constants import CELL_FLAGS
 from world.entity import Entity
-from world.overlay import Overlay
+from dungeon_neo.overlay import Overlay
 from world.tool_system import tool
 import random
 import json
@@ -367,7 +367,8 @@ class DMTools:
             
         # Create entity with type
         entity = Entity(entity_type)
-        cell.entities.append(entity)
+        self.state.side_value('entities', x, y, create=True).append(entity)
+        self.state.mark_dirty(x, y)
         return {"success": True, "message": f"Added {entity_type} at ({x}, {y})"}
         
     @tool(
@@ -384,6 +385,7 @@ class DMTools:
             return {"success": False, "message": "Invalid coordinates"}
         
         cell.description = text
+        self.state.mark_dirty(x, y)
         return {"success": True, "message": f"Added description to ({x}, {y})"}
 
     @tool(
@@ -415,7 +417,9 @@ class DMTools:
         
         # Create overlay with all parameters
         overlay_params = {"color": color, **params}
-        cell.overlays.append(Overlay(primitive, **overlay_params))
+        overlay = Overlay(primitive, **overlay_params)
+        self.state.side_value('overlays', x, y, create=True).append(overlay)
+        self.state.mark_changed(x, y, overlay.reach())
         
         return {"success": True, "message": f"Added {primitive} overlay to ({x}, {y})"}
     
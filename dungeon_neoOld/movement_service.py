@@ -121,8 +121,9 @@ class MovementService:
             return {"success": False, "message": "Invalid starting position"}
         
         # Update visibility along the path BEFORE moving
+        revealed = []
         if dungeon_state.visibility_system:
-            dungeon_state.visibility_system.update_visibility_directional(direction, steps)
+            revealed += dungeon_state.visibility_system.update_visibility_directional(direction, steps)
         
         # Calculate movement
         result = self.calculate_movement(x0, y0, direction, steps)
@@ -140,12 +141,20 @@ class MovementService:
             # Update visibility system with new position
             if dungeon_state.visibility_system:
                 dungeon_state.visibility_system.party_position = (new_x, new_y)
-                dungeon_state.visibility_system.update_visibility()
+                revealed += dungeon_state.visibility_system.update_visibility()
         
+        # Fog deltas for the client: cells seen for the first time by this move
+        if dungeon_state.visibility_system:
+            result['revealed'] = revealed
+            result['visibility_version'] = dungeon_state.visibility_system.version
         return result
 
     def is_passable(self, x: int, y: int) -> bool:
         """Check if a cell is passable for movement"""
+        # Dungeon states answer from their flag plane
+        if hasattr(self.state, 'flags'):
+            return self.state.is_passable(x, y)
+        
         if not self.grid_system.is_valid_position(x, y):  # CHANGED
             return False
             
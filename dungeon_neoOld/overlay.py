@@ -10,6 +10,28 @@ class Overlay:
         
         self.primitive = primitive
         self.params = params
+    
+    def reach(self):
+        """
+        Cells past its own one that the overlay can cover on each side, as
+        DungeonRendererNeo._draw_overlay draws it: sizes are in cells around
+        the cell's center, line and polygon points relative to its top-left
+        corner, text sizes in twelfths of a cell (the fallback font is about
+        a cell high), line widths in pixels (taken as up to half a cell).
+        """
+        params = self.params
+        if self.primitive == 'circle':
+            extent = params.get('size', 0.8) / 2
+        elif self.primitive in ('square', 'triangle'):
+            extent = params.get('size', 0.8) * math.sqrt(2) / 2  # rotated corners
+        elif self.primitive == 'line':
+            ends = (params.get('start_x', 0.1), params.get('start_y', 0.1), params.get('end_x', 0.9), params.get('end_y', 0.9))
+            extent = max(abs(end - 0.5) for end in ends) + (0.5 if 'width' in params else 0.05)
+        elif self.primitive == 'polygon':
+            extent = max((abs(coord - 0.5) for point in params.get('points', []) for coord in point), default=0)
+        else:
+            extent = len(str(params.get('content', '?'))) * max(params.get('size', 12) / 12, 1) / 2
+        return max(0, math.ceil(extent - 0.5))
         
     def render(self, draw, x, y, cell_size):
         x_pix = x * cell_size
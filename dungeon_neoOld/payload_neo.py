@@ -0,0 +1,137 @@
+# dungeon_neo/payload_neo.py
+import sys
+import base64
+from array import array
+from dungeon_neo.constants import CELL_FLAGS, ORIENTATION_CODES
+
+# Changed cells above which a delta asks the client to reload the payload
+MAX_DELTA_CELLS = 1024
+
+
+def _b64(data):
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+def cell_flags(state, x, y, debug_show_all=False):
+    """Flags of (x, y) as the map shows them: undiscovered secret doors read as BLOCKED"""
+    flags = state.get_flags(x, y)
+    if flags & CELL_FLAGS['SECRET'] and not debug_show_all and not state.secret_mask[y][x]:
+        return CELL_FLAGS['BLOCKED']
+    return flags
+
+
+def orientation_code(state, x, y, debug_show_all=False):
+    """ORIENTATION_CODES value of the door or stair at (x, y), 0 for other cells"""
+    flags = cell_flags(state, x, y, debug_show_all)
+    if flags & CELL_FLAGS['DOORSPACE']:
+        return ORIENTATION_CODES.get(state.get_door_orientation(x, y), 0)
+    if flags & CELL_FLAGS['STAIRS']:
+        return ORIENTATION_CODES.get(state.get_stair_orientation(x, y), 0)
+    return 0
+
+
+def cell_extras(state, x, y):
+    """Entities, overlays and description of (x, y); empty for a plain cell"""
+    extras = {}
+    entities = state.side_value('entities', x, y)
+    if entities:
+        extras['entities'] = [entity.type for entity in entities]
+    overlays = state.side_value('overlays', x, y)
+    if overlays:
+        extras['overlays'] = [{'primitive': overlay.primitive, 'params': overlay.params} for overlay in overlays]
+    description = state.side_value('description', x, y)
+    if description:
+        extras['description'] = description
+    return extras
+
+
+def encode_dungeon(state, debug_show_all=False):
+    """
+    Everything a client needs to draw the dungeon itself, sent once:
+
+    - flags: uint32 little-endian per cell, row-major (index y * width + x)
+    - orientation: one byte per cell, ORIENTATION_CODES
+    - explored: the visibility system's packed bitmask (bit y * width + x,
+      least significant bit first)
+    - cells: [{'x', 'y', 'entities', 'overlays', 'description'}] for the
+      cells that have any of them
+
+    all base64. revision and fog_version are the versions to ask
+    encode_delta() for changes after.
+    """
+    width, height = state.width, state.height
+    flags = array('I', state.flags)
+    orientation = bytearray(state.orientation)
+    for index, value in enumerate(flags):
+        if not value & (CELL_FLAGS['DOORSPACE'] | CELL_FLAGS['STAIRS']):
+            orientation[index] = 0
+        elif value & CELL_FLAGS['SECRET'] and not debug_show_all and not state.secret_mask[index // width][index % width]:
+            flags[index] = CELL_FLAGS['BLOCKED']
+            orientation[index] = 0
+        elif not orientation[index]:
+            orientation[index] = ORIENTATION_CODES['horizontal']  # get_*_orientation() default
+    if sys.byteorder == 'big':
+        flags.byteswap()
+    extra_cells = set()
+    for name in ('entities', 'overlays', 'description'):
+        extra_cells.update(state.cells_with(name))
+    cells = [
+        {'x': x, 'y': y, **cell_extras(state, x, y)}
+        for x, y in sorted(extra_cells, key=lambda cell: (cell[1], cell[0]))
+    ]
+
+    visibility = state.visibility_system
+    return {
+        'width': width,
+        'height': height,
+        'revision': state.revision,
+        'fog_version': visibility.version if visibility else 0,
+        'party_position': list(state.party_position),
+        'flags': _b64(flags.tobytes()),
+        'orientation': _b64(orientation),
+        'explored': _b64(visibility.explored) if visibility else None,
+        'cells': cells,
+    }
+
+
+def encode_delta(state, since, fog_since, debug_show_all=False):
+    """
+    Changes after an encode_dungeon() (or earlier delta) at revision since
+    and fog_version fog_since: the party position, newly revealed cells and
+    the full entry ('flags', 'orientation' plus cell_extras()) of every cell
+    changed since. 'full': True means the client has to reload the payload.
+    """
+    visibility = state.visibility_system
+    delta = {
+        'full': False,
+        'revision': state.revision,
+        'fog_version': visibility.version if visibility else 0,
+        'party_position': list(state.party_position),
+    }
+    changes = state.dirty_since(since)
+    revealed = visibility.revealed_since(fog_since) if visibility else []
+    if changes is None or revealed is None:
+        delta['full'] = True
+        return delta
+
+    changed = set()
+    for (x0, y0, x1, y1), _ in changes:
+        for y in range(max(y0, 0), min(y1, state.height - 1) + 1):
+            for x in range(max(x0, 0), min(x1, state.width - 1) + 1):
+                changed.add((y, x))
+        if len(changed) > MAX_DELTA_CELLS:
+            delta['full'] = True
+            return delta
+
+    delta['revealed'] = revealed
+    delta['cells'] = [
+        {
+            'x': x,
+            'y': y,
+            'flags': cell_flags(state, x, y, debug_show_all),
+            'orientation': orientation_code(state, x, y, debug_show_all),
+            **cell_extras(state, x, y)
+        }
+        for y, x in sorted(changed)
+    ]
+    return delta
@@ -1,9 +1,16 @@
+import math
+import weakref
+from collections import deque
 from PIL import Image, ImageDraw, ImageFont
 from dungeon_neo.state_neo import DungeonStateNeo
 from dungeon_neo.generator_neo import DungeonGeneratorNeo
 from dungeon_neo.constants import CELL_FLAGS, DIRECTION_VECTORS, OPPOSITE_DIRECTIONS
 from dungeon_neo.cell_neo import DungeonCellNeo
 from dungeon_neo.overlay import Overlay
+from dungeon_neo.sprites_neo import SpriteAtlasNeo
+
+# Frame versions whose redrawn regions are kept for render_patches()
+PATCH_LOG = 256
 
 class DungeonRendererNeo:
     NOTHING = CELL_FLAGS['NOTHING']
@@ -48,6 +55,9 @@ class DungeonRendererNeo:
         'legend_text': (255, 255, 255)
     }
 
+    # Margin around the dungeon in the composite image
+    PADDING = 20
+
     @property
     def cell_size(self):
         return self._cell_size
@@ -66,29 +76,165 @@ class DungeonRendererNeo:
     
     def __init__(self, cell_size=18):
         self.cell_size = cell_size
+        self._frames = {}          # debug_show_all: frame record; see _frame
+        self._legend_icons = {}    # icon_size: generate_legend_icons() result
+        self._legend_frame = None  # (key, composite background with the legend drawn)
+        self.sprites = SpriteAtlasNeo()  # doors, stairs, labels, overlays and entities
         
     def render(self, state: DungeonStateNeo, debug_show_all=False, include_legend=True, visibility_system=None):
         # Pass visibility_system to _render_dungeon
         dungeon_img = self._render_dungeon(state, debug_show_all, visibility_system)
         print(f"Render in render_neo.py")
         if include_legend:
-            icons = self.generate_legend_icons()
+            icons = self.legend_icons()
             return self.create_composite_image(dungeon_img, icons)
         return dungeon_img
 
     def _render_dungeon(self, state: DungeonStateNeo, debug_show_all=False, visibility_system=None):
+        return self._frame(state, debug_show_all, visibility_system)['image'].copy()
+    
+    def frame_version(self, debug_show_all=False):
+        """Version of the last frame rendered for debug_show_all (0 before the first)"""
+        frame = self._frames.get(debug_show_all)
+        return frame['version'] if frame else 0
+    
+    def render_patches(self, state: DungeonStateNeo, since, debug_show_all=False, include_legend=True, visibility_system=None):
+        """
+        Bring the frame up to date and return (version, patches): the regions
+        that changed after frame version since, as [{'x', 'y', 'image'}] with
+        offsets in render() pixels. patches is None if since is from another
+        frame or older than the log; the client then needs render() again.
+        """
+        frame = self._frame(state, debug_show_all, visibility_system)
+        if since > frame['version'] or since < frame['base']:
+            return frame['version'], None
+        if frame['log'] and frame['log'][0][0] > since + 1:
+            return frame['version'], None
+        rects = []
+        for version, logged in frame['log']:
+            if version > since:
+                rects.extend(rect for rect in logged if rect not in rects)
+        offset = self.PADDING if include_legend else 0
+        cs = self.cell_size
+        patches = []
+        for x0, y0, x1, y1 in rects:
+            box = (x0 * cs, y0 * cs, (x1 + 1) * cs, (y1 + 1) * cs)
+            patches.append({'x': box[0] + offset, 'y': box[1] + offset, 'image': frame['image'].crop(box)})
+        return frame['version'], patches
+    
+    def _frame(self, state, debug_show_all=False, visibility_system=None):
+        """
+        The cached frame for debug_show_all, brought up to date: a static
+        layer (map cells, overlays, grid) and the frame on top of it
+        (entities, party icon, fog). Only the cells in state.dirty_since()
+        rectangles, plus newly revealed ones, are redrawn; the redrawn
+        rectangles are logged per frame version for render_patches().
+        """
+        fog = None if debug_show_all else visibility_system
+        # Live weak references compare by their referents' identity and a dead one matches
+        # no new reference, so a state or fog system reusing a freed id() gets a new frame
+        key = (weakref.ref(state), fog and weakref.ref(fog), self.cell_size)
+        frame = self._frames.get(debug_show_all)
+        full = (0, 0, state.width - 1, state.height - 1)
+        if frame is None or frame['key'] != key:
+            version = frame['version'] + 1 if frame else 1
+            frame = {
+                'key': key, 'version': version, 'base': version, 'log': deque(maxlen=PATCH_LOG),
+                'revision': state.revision, 'fog_version': fog.version if fog else 0,
+                'static': self._static_layer(state, debug_show_all),
+                'image': Image.new('RGB', (state.width * self.cell_size, state.height * self.cell_size)),
+                'fog': self._fog_mask(state, fog) if fog else None,
+            }
+            self._frames[debug_show_all] = frame
+            self._compose(frame, state, full)
+            return frame
+        
+        changes = state.dirty_since(frame['revision'])
+        revealed = fog.revealed_since(frame['fog_version']) if fog else []
+        if changes is None or revealed is None:
+            frame['static'] = self._static_layer(state, debug_show_all)
+            if fog:
+                frame['fog'] = self._fog_mask(state, fog)
+            changes, revealed = [(full, True)], []
+        
+        rects = []
+        for rect, static in changes:
+            rect = self._clip(rect, state)
+            if rect is None:
+                continue
+            if static:
+                self._draw_static_region(frame['static'], state, rect, debug_show_all)
+            if rect not in rects:
+                rects.append(rect)
+        if revealed:
+            for x, y in revealed:
+                frame['fog'][y * state.width + x] = 0
+            xs = [x for x, _ in revealed]
+            ys = [y for _, y in revealed]
+            rects.append((min(xs), min(ys), max(xs), max(ys)))
+        for rect in rects:
+            self._compose(frame, state, rect)
+        
+        frame['revision'] = state.revision
+        frame['fog_version'] = fog.version if fog else 0
+        if rects:
+            frame['version'] += 1
+            frame['log'].append((frame['version'], rects))
+        return frame
+    
+    def _clip(self, rect, state):
+        x0, y0, x1, y1 = rect
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, state.width - 1), min(y1, state.height - 1)
+        return (x0, y0, x1, y1) if x0 <= x1 and y0 <= y1 else None
+    
+    def _compose(self, frame, state, rect):
+        """Redraw frame['image'] over cells rect: static layer, entities, party icon, then fog"""
+        x0, y0, x1, y1 = rect
+        cs = self.cell_size
+        box = (x0 * cs, y0 * cs, (x1 + 1) * cs, (y1 + 1) * cs)
+        image = frame['image']
+        image.paste(frame['static'].crop(box), box[:2])
+        draw = ImageDraw.Draw(image)
+        
+        # Draw entities
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                entities = state.side_value('entities', x, y)
+                if entities:
+                    cell = state.get_cell(x, y)
+                    for entity in entities:
+                        self._paste_entity(image, entity, cell, x * cs, y * cs, cs)
+        
+        # Draw party icon
+        party_x, party_y = state.party_position
+        if x0 <= party_x <= x1 and y0 <= party_y <= y1:
+            self._draw_party_icon(draw, party_x, party_y, cs)
+        
+        # Apply fog layer if needed: black wherever the mask is set
+        if frame['fog'] is not None:
+            fog = Image.frombytes('L', (state.width, state.height), bytes(frame['fog']))
+            fog = fog.crop((x0, y0, x1 + 1, y1 + 1)).resize((box[2] - box[0], box[3] - box[1]), Image.NEAREST)
+            image.paste((0, 0, 0), box, fog)
+    
+    def _static_layer(self, state, debug_show_all=False):
+        """Cells, doors, stairs, labels, overlays and grid lines of the whole map"""
         width = state.width * self.cell_size
         height = state.height * self.cell_size
         base_img = Image.new('RGB', (width, height), self.COLORS['blocked'])
-        base_draw = ImageDraw.Draw(base_img)
+        self._draw_static_region(base_img, state, (0, 0, state.width - 1, state.height - 1), debug_show_all)
+        return base_img
+    
+    def _draw_static_region(self, base_img, state, rect, debug_show_all=False):
+        """(Re)draw the static layer over cells rect, grid lines included"""
+        x0, y0, x1, y1 = rect
         cs = self.cell_size
-        
-        # Draw grid first (will be covered by cells but provides background structure)
-        self._draw_grid(base_draw, width, height)
+        base_draw = ImageDraw.Draw(base_img)
+        base_draw.rectangle([x0 * cs, y0 * cs, (x1 + 1) * cs, (y1 + 1) * cs], fill=self.COLORS['blocked'])
         
         # Draw all cells and their features
-        for x in range(state.width):
-            for y in range(state.height):
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
                 cell = state.get_cell(x, y)
                 if not cell:
                     continue
@@ -112,25 +258,27 @@ class DungeonRendererNeo:
                     self._draw_base_cell(base_draw, cell, x_pix, y_pix, cs)
                 
                 # Draw special features
+                # Draw special features (sprites, see SpriteAtlasNeo)
                 if cell.is_door:
                     orientation = state.get_door_orientation(x, y)
-                    self._draw_door(base_draw, cell, orientation, int(x_pix), int(y_pix), int(cs))
+                    self.sprites.paste(
+                        base_img, x_pix, y_pix, 'door', (cell.is_arch, cell.is_portc, cell.is_locked), orientation, cs,
+                        lambda draw, sx, sy, size: self._draw_door(draw, cell, orientation, sx, sy, size)
+                    )
                 
                 if cell.is_stairs:
                     orientation = state.get_stair_orientation(x, y)
                     stair_type = 'up' if cell.is_stair_up else 'down'
-                    self._draw_stairs(base_draw, stair_type, orientation, x_pix, y_pix, cs)
+                    self.sprites.paste(
+                        base_img, x_pix, y_pix, 'stairs', stair_type, orientation, cs,
+                        lambda draw, sx, sy, size: self._draw_stairs(draw, stair_type, orientation, sx, sy, size)
+                    )
                 
                 if cell.has_label:
-                    self._draw_label(base_draw, cell, x_pix, y_pix, cs)
-                
-                # Draw entities
-                for entity in cell.entities:
-                    self._draw_entity(base_draw, entity, cell, x_pix, y_pix, cs)
-                
-                # Draw overlays
-                for overlay in cell.overlays:
-                    self._draw_overlay(base_draw, overlay, x_pix, y_pix, cs)
+                    self.sprites.paste(
+                        base_img, x_pix, y_pix, 'label', (cell.base_type & self.LABEL) >> 24, None, cs,
+                        lambda draw, sx, sy, size: self._draw_label(draw, cell, sx, sy, size)
+                    )
                 
                 # Debug outline for secret doors
                 if cell.is_secret and debug_show_all:
@@ -140,34 +288,46 @@ class DungeonRendererNeo:
                         width=2
                     )
         
-        # Draw grid on top of cells
-        self._draw_grid(base_draw, width, height)
-        
-        # Draw party icon
-        party_x, party_y = state.party_position
-        self._draw_party_icon(base_draw, party_x, party_y, cs)
-        
-        # Apply fog layer if needed
-        if not debug_show_all and visibility_system:
-            fog_img = Image.new('RGBA', (width, height), (0, 0, 0, 255))
-            fog_draw = ImageDraw.Draw(fog_img)
-            
-            # Cut holes for visible cells
-            for y in range(state.height):
-                for x in range(state.width):
-                    if visibility_system.is_visible(x, y):
-                        fog_draw.rectangle(
-                            [x*cs, y*cs, (x+1)*cs, (y+1)*cs],
-                            fill=(0, 0, 0, 0)  # Fully transparent
-                        )
-            
-            base_rgba = base_img.convert('RGBA')
-            composite = Image.alpha_composite(base_rgba, fog_img)
-            result_img = composite.convert('RGB')
-        else:
-            result_img = base_img
+        self._draw_overlays(base_img, state, rect)
         
-        return result_img
+        # Draw grid on top of cells
+        for y in range(y0, y1 + 2):
+            base_draw.line([(x0 * cs, y * cs), ((x1 + 1) * cs, y * cs)], fill=self.COLORS['grid'], width=1)
+        for x in range(x0, x1 + 2):
+            base_draw.line([(x * cs, y0 * cs), (x * cs, (y1 + 1) * cs)], fill=self.COLORS['grid'], width=1)
+    
+    def _draw_overlays(self, base_img, state, rect):
+        """
+        Draw, clipped to cells rect, the overlays of every cell whose reach
+        covers part of it. They go over all cells, so a region redraws the
+        same pixels as the whole map does. Each overlay's sprite has a
+        margin of its reach, so whatever it draws past that is cut off.
+        """
+        x0, y0, x1, y1 = rect
+        cs = self.cell_size
+        box = (x0 * cs, y0 * cs, (x1 + 1) * cs, (y1 + 1) * cs)
+        region = None
+        for x, y in state.cells_with('overlays'):
+            for overlay in state.side_value('overlays', x, y):
+                reach = overlay.reach()
+                if x + reach < x0 or x - reach > x1 or y + reach < y0 or y - reach > y1:
+                    continue
+                if region is None:
+                    region = base_img.crop(box)
+                self.sprites.paste(
+                    region, x * cs - box[0], y * cs - box[1], 'overlay', (overlay.primitive, overlay.params), None, cs,
+                    lambda draw, sx, sy, size: self._draw_overlay(draw, overlay, sx, sy, size),
+                    margin=reach * cs
+                )
+        if region is not None:
+            base_img.paste(region, box)
+    
+    def _fog_mask(self, state, visibility_system):
+        """One byte per cell, 255 where unexplored; kept in the frame and cleared as cells are revealed"""
+        return bytearray(
+            0 if visibility_system.is_visible(x, y) else 255
+            for y in range(state.height) for x in range(state.width)
+        )
     
     def _draw_blocked_cell(self, draw, x_pix, y_pix, cell_size):
         """Draw blocked cell (used for undiscovered secrets)"""
@@ -186,6 +346,14 @@ class DungeonRendererNeo:
             draw.rectangle([x_pix, y_pix, x_pix+cell_size, y_pix+cell_size], 
                            fill=self.COLORS['blocked'])
 
+    def _paste_entity(self, image, entity, cell, x_pix, y_pix, cell_size):
+        """_draw_entity through the sprite atlas; the symbol color only depends on the cell type"""
+        background = 'room' if cell.is_room else 'corridor' if cell.is_corridor else None
+        self.sprites.paste(
+            image, x_pix, y_pix, 'entity', (entity.type, background), None, cell_size,
+            lambda draw, sx, sy, size: self._draw_entity(draw, entity, cell, sx, sy, size)
+        )
+
     def _draw_entity(self, draw, entity, cell, x_pix, y_pix, cell_size):
         """Draw entity symbol with proper contrast"""
         # Determine background color for contrast
@@ -517,6 +685,12 @@ class DungeonRendererNeo:
             return 'portc'
         return 'door'
 
+    def legend_icons(self, icon_size=20):
+        """generate_legend_icons(icon_size), drawn once per renderer"""
+        if icon_size not in self._legend_icons:
+            self._legend_icons[icon_size] = self.generate_legend_icons(icon_size)
+        return self._legend_icons[icon_size]
+
     def generate_legend_icons(self, icon_size=20):
         elements = [
             ('room', 'Room'),
@@ -623,10 +797,18 @@ class DungeonRendererNeo:
         return icons
 
 
-    def create_composite_image(self, dungeon_img, icons, position='right', padding=20):
+    def create_composite_image(self, dungeon_img, icons, position='right', padding=PADDING):
         """Create image with dungeon on left and legend on right"""
-        # Calculate dimensions
+        # The legend side of legend_icons() only depends on the dungeon size; reuse it between frames
         icon_size = next(iter(icons.values()))[0].size[0] if icons else 30
+        cached = icons is self._legend_icons.get(icon_size)
+        key = (dungeon_img.size, icon_size, padding)
+        if cached and self._legend_frame and self._legend_frame[0] == key:
+            composite = self._legend_frame[1].copy()
+            composite.paste(dungeon_img, (padding, padding))
+            return composite
+        
+        # Calculate dimensions
         legend_width = 200
         total_width = dungeon_img.width + legend_width + padding * 3
         total_height = max(dungeon_img.height, 400)
@@ -651,6 +833,8 @@ class DungeonRendererNeo:
                      label, fill=self.COLORS['legend_text'], font=font)
             y_offset += icon_size + 10
         
+        if cached:
+            self._legend_frame = (key, composite.copy())
         return composite
 
     def _draw_room(self, draw, x, y, size=None):
@@ -0,0 +1,63 @@
+# dungeon_neo/sprites_neo.py
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+
+# Sprites kept per atlas; the least recently used are rasterized again when needed
+SPRITE_SLOTS = 512
+
+
+def freeze(value):
+    """Hashable form of sprite params (dicts and lists, e.g. overlay params parsed from JSON)"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class SpriteAtlasNeo:
+    """
+    Glyphs (doors, stairs, labels, entities, overlays) rasterized once per
+    (kind, params, orientation, cell_size) into transparent RGBA images
+    and pasted into cells with their own alpha as the mask.
+
+    The atlas is a bounded LRU of max_sprites entries, so DMs adding many
+    custom overlays cost re-rasterizing the rare ones, not memory.
+    """
+
+    def __init__(self, max_sprites=SPRITE_SLOTS):
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()  # key: (RGBA image, margin)
+        self.hits = 0
+        self.misses = 0
+
+    def sprite(self, kind, params, orientation, cell_size, draw, margin=0):
+        """
+        (image, margin) for the key; on a miss draw(ImageDraw, x_pix, y_pix,
+        cell_size) rasterizes it with the cell's top-left at (margin,
+        margin). Cell drawing reaches x_pix + cell_size inclusive, hence
+        cell_size + 1 pixels plus margin on each side for glyphs that spill.
+        """
+        key = (kind, freeze(params), orientation, cell_size)
+        entry = self.sprites.get(key)
+        if entry is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        size = cell_size + 1 + 2 * margin
+        image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+        draw(ImageDraw.Draw(image), margin, margin, cell_size)
+        entry = (image, margin)
+        self.sprites[key] = entry
+        while len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return entry
+
+    def paste(self, target, x_pix, y_pix, kind, params, orientation, cell_size, draw, margin=0):
+        """Paste the sprite with the cell's top-left at (x_pix, y_pix) of target"""
+        image, margin = self.sprite(kind, params, orientation, cell_size, draw, margin)
+        target.paste(image, (x_pix - margin, y_pix - margin), image)
+
+    def clear(self):
+        self.sprites.clear()
@@ -1,9 +1,36 @@
 from typing import List, Dict, Any, Tuple, Optional, Union
+from array import array
+from collections import deque
 from dungeon_neo.grid_system import GridSystem
-from dungeon_neo.constants import CELL_FLAGS, DIRECTION_VECTORS_8
-from dungeon_neo.cell_neo import DungeonCellNeo
+from dungeon_neo.constants import CELL_FLAGS, DIRECTION_VECTORS_8, ORIENTATION_CODES
+from dungeon_neo.cell_neo import DungeonCellViewNeo, SIDE_TABLES, to_flags
 from dungeon_neo.visibility_neo import VisibilitySystemNeo
 
+# Dirty rectangles kept for dirty_since(); older renders are redrawn in full
+CHANGE_LOG = 512
+
+ORIENTATION_NAMES = {code: name for name, code in ORIENTATION_CODES.items()}
+
+class DungeonGridNeo(GridSystem):
+    """GridSystem over a DungeonStateNeo's flag plane; get_cell() returns cell views"""
+
+    def __init__(self, state):
+        self.state = state
+        self.width = state.width
+        self.height = state.height
+        self.flags = state.flags  # for array lookups (visibility opacity)
+
+    def get_cell(self, x: int, y: int):
+        """Get cell at world coordinates (x,y)"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return DungeonCellViewNeo(self.state, x, y)
+        return None
+
+    def set_cell(self, x: int, y: int, value):
+        """Copy a cell's flags and attributes into the state at (x,y)"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.state.store_cell(x, y, value)
+
 class DungeonStateNeo:
     NOTHING = CELL_FLAGS['NOTHING']
     BLOCKED = CELL_FLAGS['BLOCKED']
@@ -26,42 +53,41 @@ class DungeonStateNeo:
         self.generator_result = generator_result
         self.n_cols = generator_result['n_cols']
         self.n_rows = generator_result['n_rows']
+        self._width = self.n_cols + 1
+        self._height = self.n_rows + 1
+        
+        # Struct of arrays: cell flags (uint32) and door/stair ORIENTATION_CODES,
+        # index y * width + x, plus sparse per-attribute side tables {(x, y): value}
+        n_cells = self._width * self._height
+        self.flags = array('I', [CELL_FLAGS['NOTHING']]) * n_cells
+        self.orientation = bytearray(n_cells)
+        self.side_tables = {name: {} for name in SIDE_TABLES}
         
-        # Create grid system with proper dimensions
-        self.grid_system = GridSystem(
-            width=self.n_cols + 1,
-            height=self.n_rows + 1
-        )
+        # Cell views over the arrays, through the GridSystem interface
+        self.grid_system = DungeonGridNeo(self)
 
         # Initialize orientation lookups before _populate_grid
-        self.door_orientations = {}
         for door in generator_result.get('doors', []):
-            #print(f"2a state door {door}")
             x, y = door['x'], door['y']
-            orientation = door.get('orientation', 'horizontal')
-            self.door_orientations[(x, y)] = orientation
-            #print(f"2b state store ({x},{y}) = {orientation}")
+            self.set_door_orientation(x, y, door.get('orientation', 'horizontal'))
 
-        # print("=== STATE DOOR ORIENTATIONS ===")
-        # for (x,y), orient in self.door_orientations.items():
-        #     print(f"({x},{y}): {orient}")
-
-        self.stair_orientations = {}
         self.stairs = generator_result.get('stairs', [])
         for stair in self.stairs:
             x, y = stair['x'], stair['y']
-            orientation = stair.get('orientation', 'horizontal')
-            self.stair_orientations[(x, y)] = orientation
-            #print(f"STORED: Stair at ({x},{y}) orientation={orientation}")
+            self.set_stair_orientation(x, y, stair.get('orientation', 'horizontal'))
 
         self._populate_grid(generator_result['grid'])
         
         # Initialize secret mask
-        self.secret_mask = [[False] * self.grid_system.width for _ in range(self.grid_system.height)]
+        self.secret_mask = [bytearray(self.width) for _ in range(self.height)]
         
         # Initialize party position
         self._party_position = (0, 0)
         
+        # Bumped by every change to how the map renders (see mark_dirty)
+        self.revision = 0
+        self.changes = deque(maxlen=CHANGE_LOG)  # (revision, (x0, y0, x1, y1), static)
+        
         # Initialize visibility system
         self.visibility_system = None # Will be set later
         self.movement = None # Will be set later
@@ -119,35 +145,22 @@ class DungeonStateNeo:
         for door in self.generator_result.get('doors', []):
             if door['key'] != 'potential':  # Only register actual doors
                 x, y = door['x'], door['y']
-                self.door_orientations[(x, y)] = door['orientation']
-        #print(f"POPULATE: door_orientations {self.door_orientations}")
-        for y in range(self.grid_system.height):
-            # Ensure row exists
-            if y >= len(generator_grid):
-                continue
-                
-            for x in range(self.grid_system.width):
-                # Ensure column exists in row
-                if x >= len(generator_grid[y]):
-                    continue  # Skip missing columns
-                    
-                value = generator_grid[y][x]
-                cell = DungeonCellNeo(value, x, y)
-                
-                if cell.is_door and (x, y) in self.door_orientations:
-                    orientation = self.door_orientations[(x, y)]
-                    cell.properties['orientation'] = orientation
-                    #print(f"CELL INIT: Door at ({x},{y}) orientation={orientation}")
-
-                self.grid_system.set_cell(x, y, cell)
+                self.set_door_orientation(x, y, door['orientation'])
+        for y in range(min(self.height, len(generator_grid))):
+            row = generator_grid[y]
+            start = y * self.width
+            # Missing columns stay NOTHING
+            for x in range(min(self.width, len(row))):
+                value = row[x]
+                self.flags[start + x] = value if type(value) is int else to_flags(value)
 
     @property
     def width(self):
-        return self.grid_system.width
+        return self._width
 
     @property
     def height(self):
-        return self.grid_system.height
+        return self._height
 
     @property
     def party_position(self):
@@ -155,31 +168,126 @@ class DungeonStateNeo:
 
     @party_position.setter
     def party_position(self, value):
+        old = self._party_position
         self._party_position = value
+        if old != value:
+            self.mark_dirty(*old)
+            self.mark_dirty(*value)
         # Only update visibility if it exists
         if hasattr(self, 'visibility_system') and self.visibility_system:
             self.visibility_system.party_position = value
 
     def get_cell(self, x: int, y: int):
-        """Get cell with bounds checking"""
+        """Get cell with bounds checking (a view over the state's arrays)"""
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.grid_system.get_cell(x, y)
+            return DungeonCellViewNeo(self, x, y)
+    
+    def get_flags(self, x: int, y: int):
+        """Flags of (x, y); NOTHING outside the map"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.flags[y * self.width + x]
+        return self.NOTHING
+    
+    def is_passable(self, x: int, y: int) -> bool:
+        """MovementService.is_passable as a flag-plane lookup"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        flags = self.flags[y * self.width + x]
+        if flags & CELL_FLAGS['STAIRS']:
+            return False
+        if flags & self.SECRET and not self.secret_mask[y][x]:
+            return False
+        if flags & CELL_FLAGS['DOORSPACE']:
+            return bool(flags & self.ARCH)
+        return not flags & (self.BLOCKED | self.PERIMETER)
+    
+    def side_value(self, name: str, x: int, y: int, create: bool = False):
+        """
+        Side table entry name ('entities', 'overlays', 'description', ... see
+        SIDE_TABLES) of (x, y). A missing description reads as "", any other
+        missing entry as None, or with create as a new empty list or dict
+        stored for the caller to fill in.
+        """
+        table = self.side_tables[name]
+        value = table.get((x, y))
+        if value is None:
+            factory = SIDE_TABLES[name]
+            if factory is None:
+                return ""
+            if create:
+                value = table[(x, y)] = factory()
+        return value
+    
+    def set_side_value(self, name: str, x: int, y: int, value):
+        if value:
+            self.side_tables[name][(x, y)] = value
+        else:
+            self.side_tables[name].pop((x, y), None)
+    
+    def cells_with(self, name: str):
+        """[(x, y)] with a non-empty side table entry name, in row order"""
+        return sorted(((x, y) for (x, y), value in self.side_tables[name].items() if value),
+                      key=lambda cell: (cell[1], cell[0]))
+    
+    def store_cell(self, x: int, y: int, cell):
+        """Copy a DungeonCellNeo (or view) into the arrays at (x, y)"""
+        self.flags[y * self.width + x] = cell.base_type if cell else self.NOTHING
+        for name in SIDE_TABLES:
+            self.set_side_value(name, x, y, getattr(cell, name, None) if cell else None)
     
     def get_door_orientation(self, x: int, y: int):
-        orientations = self.door_orientations.get((x, y), 'horizontal')
-        #print(f"orientations in state: {orientations}")
-        return orientations
+        return self._orientation_name(x, y)
     
     def get_stair_orientation(self, x: int, y: int):
-        #print(f"RENDERER request: ({x},{y})") # this goes with "GENERATOR stair" debug print if you want to see if they match but fixed
-        #print(f"Stored orientations: {list(self.stair_orientations.keys())}")
-        result = self.stair_orientations.get((x, y), 'horizontal')
-        #print(f"returns {result}")
-        return result
+        return self._orientation_name(x, y)
+    
+    def set_door_orientation(self, x: int, y: int, orientation: str):
+        self._set_orientation(x, y, orientation)
+    
+    def set_stair_orientation(self, x: int, y: int, orientation: str):
+        self._set_orientation(x, y, orientation)
+    
+    def _orientation_name(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return ORIENTATION_NAMES.get(self.orientation[y * self.width + x], 'horizontal')
+        return 'horizontal'
+    
+    def _set_orientation(self, x, y, orientation):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.orientation[y * self.width + x] = ORIENTATION_CODES.get(orientation, 0)
+    
+    def mark_dirty(self, x0: int, y0: int, x1: int = None, y1: int = None, static: bool = False):
+        """
+        Record that cells x0..x1, y0..y1 (inclusive; a single cell if x1, y1
+        are left out) render differently. static is for changes to the map
+        itself; entities and the party are drawn on top of it every frame.
+        """
+        self.revision += 1
+        rect = (x0, y0, x0 if x1 is None else x1, y0 if y1 is None else y1)
+        self.changes.append((self.revision, rect, static))
+    
+    def dirty_since(self, revision: int):
+        """[(rect, static)] recorded after revision, or None if the log no longer reaches back that far"""
+        if revision >= self.revision:
+            return []
+        if not self.changes or self.changes[0][0] > revision + 1:
+            return None
+        return [(rect, static) for logged, rect, static in self.changes if logged > revision]
+    
+    def mark_changed(self, x: int, y: int, reach: int = 0):
+        """
+        Call after changing the cell at (x, y) (door, secret, overlay, ...);
+        reach widens the redrawn area for changes drawn past the cell
+        (Overlay.reach()).
+        """
+        self.mark_dirty(x - reach, y - reach, x + reach, y + reach, static=True)
+        if self.visibility_system:
+            self.visibility_system.invalidate_opacity(x, y)
     
     def reveal_secret(self, x: int, y: int):
         if self.grid_system.is_valid_position(x, y): # need to test this function
             self.secret_mask[y][x] = True
+            self.mark_changed(x, y)
             return True
         return False
     
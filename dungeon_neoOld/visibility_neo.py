@@ -1,5 +1,14 @@
+from collections import deque
 from dungeon_neo.constants import CELL_FLAGS, DIRECTION_VECTORS_8
-import math
+
+# Reveal batches kept for revealed_since(); older clients get the full mask
+REVEAL_LOG = 256
+
+# (xx, xy, yx, yy) transforms mapping octant 0 onto each of the eight octants
+OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1),
+)
 
 class VisibilitySystemNeo:
     NOTHING = CELL_FLAGS['NOTHING']
@@ -31,94 +40,173 @@ class VisibilitySystemNeo:
         self.grid_system = grid_system
         self.party_position = party_position
         self.light_radius = light_radius
-        self.visible_cells = set()   # Persistent visibility (once seen, always shown)
+        # Packed bitmasks, bit (y * width + x) of byte >> 3, least significant bit first
+        n_bytes = (grid_system.width * grid_system.height + 7) // 8
+        self.lit = bytearray(n_bytes)       # Seen from the current position
+        self.explored = bytearray(n_bytes)  # Persistent visibility (once seen, always shown)
+        self.version = 0                    # Bumped by every update that reveals cells
+        self.reveals = deque(maxlen=REVEAL_LOG)  # (version, [(x, y)]) per reveal
+        self.opaque = None           # bytearray, 1 where a cell blocks sight; see invalidate_opacity
         self.update_visibility()
     
     def update_visibility(self):
-        """Update visibility from current position"""
+        """
+        Update visibility from current position (recursive shadowcasting
+        within light_radius). Returns the cells seen for the first time.
+        """
         if not self.party_position:
-            return
+            return []
         
         x0, y0 = self.party_position
         new_visible = set()
         new_visible.add((x0, y0))
         
-        radius = self.light_radius
+        if self.opaque is None:
+            self._build_opacity()
+        for xx, xy, yx, yy in OCTANTS:
+            self._cast_light(x0, y0, 1, 1.0, 0.0, self.light_radius, xx, xy, yx, yy, new_visible)
         
-        # Diamond-shaped visibility (Manhattan distance <= radius)
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                if abs(dx) + abs(dy) > radius:
-                    continue
-                    
-                x, y = x0 + dx, y0 + dy
-                if not self.grid_system.is_valid_position(x, y):
+        width = self.grid_system.width
+        self.lit = bytearray(len(self.lit))
+        for x, y in new_visible:
+            index = y * width + x
+            self.lit[index >> 3] |= 1 << (index & 7)
+        return self._explore(new_visible)
+    
+    def _explore(self, cells):
+        """Set the explored bits of cells; returns (and logs) the ones that were not set"""
+        width = self.grid_system.width
+        explored = self.explored
+        revealed = []
+        for x, y in cells:
+            index = y * width + x
+            bit = 1 << (index & 7)
+            if not explored[index >> 3] & bit:
+                explored[index >> 3] |= bit
+                revealed.append((x, y))
+        if revealed:
+            revealed.sort(key=lambda cell: (cell[1], cell[0]))
+            self.version += 1
+            self.reveals.append((self.version, revealed))
+        return revealed
+    
+    def revealed_since(self, version):
+        """Cells revealed after version, or None if the log no longer reaches back that far"""
+        if version >= self.version:
+            return []
+        if not self.reveals or self.reveals[0][0] > version + 1:
+            return None
+        return [cell for logged, cells in self.reveals if logged > version for cell in cells]
+    
+    def invalidate_opacity(self, x=None, y=None):
+        """
+        Call when a door or secret changes: re-reads the cell at (x, y), or
+        drops the whole opacity array (rebuilt on the next update) if no
+        position is given.
+        """
+        if self.opaque is None or x is None or y is None:
+            self.opaque = None
+        elif self.grid_system.is_valid_position(x, y):
+            self.opaque[y * self.grid_system.width + x] = self._is_blocking(x, y)
+    
+    def _build_opacity(self):
+        width, height = self.grid_system.width, self.grid_system.height
+        flags = getattr(self.grid_system, 'flags', None)
+        if flags is not None:
+            # Flag plane of a DungeonStateNeo grid: no cell objects needed
+            self.opaque = bytearray(map(self._flags_block_sight, flags))
+            return
+        self.opaque = bytearray(width * height)
+        for y in range(height):
+            for x in range(width):
+                self.opaque[y * width + x] = self._is_blocking(x, y)
+    
+    def _blocks_sight(self, x, y):
+        if not (0 <= x < self.grid_system.width and 0 <= y < self.grid_system.height):
+            return True
+        return self.opaque[y * self.grid_system.width + x]
+    
+    def _cast_light(self, cx, cy, row, start, end, radius, xx, xy, yx, yy, visible):
+        """
+        Light one octant from row outwards between slopes start and end
+        (the octant shadowcaster of old/dungeon/state.py, over self.opaque).
+        Blocking cells are lit themselves; each one starts a narrower scan
+        of the rows behind it.
+        """
+        if start < end:
+            return
+        width, height = self.grid_system.width, self.grid_system.height
+        opaque = self.opaque
+        radius_sq = radius * radius + radius  # rounder edge than r * r
+        new_start = start
+        for j in range(row, radius + 1):
+            dx, dy = -j - 1, -j
+            blocked = False
+            while dx <= 0:
+                dx += 1
+                x, y = cx + dx * xx + dy * xy, cy + dx * yx + dy * yy
+                left_slope, right_slope = (dx - 0.5) / (dy + 0.5), (dx + 0.5) / (dy - 0.5)
+                if start < right_slope:
                     continue
-                
-                # Line-of-sight check
-                visible = True
-                line = self._get_line(x0, y0, x, y)
-                for i in range(1, len(line)):
-                    cx, cy = line[i]
-                    if (cx, cy) == (x, y):
-                        break
-                    if self._is_blocking(cx, cy):
-                        visible = False
-                        break
-                
-                if visible:
-                    new_visible.add((x, y))
-        
-        # Add new visible cells to persistent set
-        self.visible_cells |= new_visible
+                if end > left_slope:
+                    break
+                inside = 0 <= x < width and 0 <= y < height
+                if inside and dx * dx + dy * dy <= radius_sq:
+                    visible.add((x, y))
+                is_opaque = not inside or opaque[y * width + x]
+                if blocked:
+                    if is_opaque:
+                        new_start = right_slope
+                        continue
+                    blocked = False
+                    start = new_start
+                elif is_opaque and j < radius:
+                    blocked = True
+                    self._cast_light(cx, cy, j + 1, start, left_slope, radius, xx, xy, yx, yy, visible)
+                    new_start = right_slope
+            if blocked:
+                break
     
     def update_visibility_directional(self, direction, steps):
-        """Update visibility along a movement path"""
+        """Update visibility along a movement path; returns the cells seen for the first time"""
         if not self.party_position:
-            return
+            return []
             
         x0, y0 = self.party_position
         dx, dy = DIRECTION_VECTORS_8[direction]
+        if self.opaque is None:
+            self._build_opacity()
         
+        seen = []
         for step in range(1, steps + 1):
             x, y = x0 + dx * step, y0 + dy * step
             if not self.grid_system.is_valid_position(x, y):
                 break
                 
-            if self._is_blocking(x, y):
+            if self._blocks_sight(x, y):
                 break
                 
             # Add cell and its neighbors to visibility
-            self.visible_cells.add((x, y))
+            seen.append((x, y))
             for adj_dx, adj_dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
                 adj_x, adj_y = x + adj_dx, y + adj_dy
                 if self.grid_system.is_valid_position(adj_x, adj_y):
-                    self.visible_cells.add((adj_x, adj_y))
+                    seen.append((adj_x, adj_y))
+        return self._explore(seen)
     
-    def _get_line(self, x0, y0, x1, y1):
-        """Bresenham's line algorithm"""
-        points = []
-        dx = abs(x1 - x0)
-        dy = abs(y1 - y0)
-        sx = 1 if x0 < x1 else -1
-        sy = 1 if y0 < y1 else -1
-        err = dx - dy
-        
-        while True:
-            points.append((x0, y0))
-            if x0 == x1 and y0 == y1:
-                break
-            e2 = 2 * err
-            if e2 > -dy:
-                err -= dy
-                x0 += sx
-            if e2 < dx:
-                err += dx
-                y0 += sy
-        
-        return points
+    @classmethod
+    def _flags_block_sight(cls, flags):
+        """_is_blocking for a cell's flags"""
+        return bool(flags & (cls.BLOCKED | cls.PERIMETER)
+                    or (flags & cls.DOORSPACE and not flags & cls.ARCH)
+                    or flags == cls.NOTHING)
     
     def _is_blocking(self, x: int, y: int) -> bool:
+        flags = getattr(self.grid_system, 'flags', None)
+        if flags is not None:
+            if not self.grid_system.is_valid_position(x, y):
+                return True
+            return self._flags_block_sight(flags[y * self.grid_system.width + x])
         cell = self.grid_system.get_cell(x, y)
         if not cell:
             return True
@@ -130,4 +218,24 @@ class VisibilitySystemNeo:
     
     def is_visible(self, x: int, y: int) -> bool:
         """Check if cell has been made visible (persistent)"""
-        return (x, y) in self.visible_cells
+        if not self.grid_system.is_valid_position(x, y):
+            return False
+        index = y * self.grid_system.width + x
+        return bool(self.explored[index >> 3] & (1 << (index & 7)))
+    
+    def is_lit(self, x: int, y: int) -> bool:
+        """Check if cell is seen from the current position"""
+        if not self.grid_system.is_valid_position(x, y):
+            return False
+        index = y * self.grid_system.width + x
+        return bool(self.lit[index >> 3] & (1 << (index & 7)))
+    
+    @property
+    def visible_cells(self):
+        """Set of explored (x, y) cells; built from the mask, for debugging"""
+        width = self.grid_system.width
+        return {
+            (index % width, index // width)
+            for index in range(self.grid_system.width * self.grid_system.height)
+            if self.explored[index >> 3] & (1 << (index & 7))
+        }
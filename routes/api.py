@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify, current_app, send_file, request
 import io
+import base64
 from dungeon_neo.constants import *
 from dungeon_neo.ai_integration import DungeonAI
 from dungeon_neo.movement_service import MovementService
+from dungeon_neo.payload_neo import encode_dungeon, encode_delta
 
 api_bp = Blueprint('api', __name__)
 
@@ -17,8 +19,15 @@ def handle_movement():
     
     try:
         game_state = current_app.game_state
+        state = game_state.dungeon.state
+        # Clients send the revision and fog version of their payload; without
+        # them the delta only covers this move
+        since = data.get('since', state.revision)
+        fog_since = data.get('fog', state.visibility_system.version if state.visibility_system else 0)
         # Access movement service directly
         result = game_state.dungeon.state.movement.move(direction, steps)
+        # Canvas clients apply this instead of fetching a new image
+        result['delta'] = encode_delta(state, since, fog_since, data.get('debug', False))
         return jsonify(result)
     
     except Exception as e:
@@ -130,17 +139,30 @@ def handle_ai_command():
 
 @api_bp.route('/debug-state')
 def debug_state():
+    """
+    Visibility for the client fog. With ?since=<version> only the cells
+    revealed after that version are sent; otherwise (or when the server no
+    longer has those deltas) the packed explored and lit bitmasks, base64,
+    bit y * width + x, least significant bit first.
+    """
     state = current_app.game_state.dungeon.state
+    visibility = state.visibility_system
+    since = request.args.get('since', type=int)
+    revealed = visibility.revealed_since(since) if since is not None else None
+    if revealed is not None:
+        fog = {"version": visibility.version, "revealed": revealed}
+    else:
+        fog = {
+            "version": visibility.version,
+            "width": state.width,
+            "height": state.height,
+            "explored": base64.b64encode(bytes(visibility.explored)).decode('ascii'),
+            "lit": base64.b64encode(bytes(visibility.lit)).decode('ascii')
+        }
+    fog["party_position"] = visibility.party_position
     return jsonify({
         "party_position": state.party_position,
-        "visibility_system": {
-            "party_position": current_app.game_state.dungeon.visibility_system.party_position,
-            "visible_cells": [
-                [current_app.game_state.dungeon.visibility_system.is_visible(x, y) 
-                 for x in range(state.width)] 
-                for y in range(state.height)
-            ]
-        }
+        "visibility_system": fog
     })
 
 @api_bp.route('/dungeon-image')
@@ -154,7 +176,54 @@ def get_dungeon_image():
     img.save(img_io, 'PNG')
     img_io.seek(0)
     
-    return send_file(img_io, mimetype='image/png')
+    response = send_file(img_io, mimetype='image/png')
+    response.headers['X-Frame-Version'] = str(current_app.game_state.get_dungeon_image_version(debug))
+    return response
+
+@api_bp.route('/dungeon-image/patch')
+def get_dungeon_image_patch():
+    """
+    Regions of /dungeon-image that changed after frame version ?since= (the
+    X-Frame-Version of the client's image) as base64 PNG patches with pixel
+    offsets. "full": true means the client has to fetch /dungeon-image again.
+    """
+    debug = request.args.get('debug', 'false').lower() == 'true'
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"error": "since is required"}), 400
+    
+    version, patches = current_app.game_state.get_dungeon_patches(since, debug)
+    if patches is None:
+        return jsonify({"version": version, "full": True, "patches": []})
+    
+    encoded = []
+    for patch in patches:
+        img_io = io.BytesIO()
+        patch['image'].save(img_io, 'PNG')
+        encoded.append({
+            "x": patch['x'],
+            "y": patch['y'],
+            "width": patch['image'].width,
+            "height": patch['image'].height,
+            "png": base64.b64encode(img_io.getvalue()).decode('ascii')
+        })
+    return jsonify({"version": version, "full": False, "patches": encoded})
+
+@api_bp.route('/dungeon-data')
+def get_dungeon_data():
+    """Compact dungeon payload for client-side rendering (see payload_neo.encode_dungeon)"""
+    debug = request.args.get('debug', 'false').lower() == 'true'
+    return jsonify(encode_dungeon(current_app.game_state.dungeon.state, debug))
+
+@api_bp.route('/dungeon-data/delta')
+def get_dungeon_data_delta():
+    """Changes after ?since=<revision>&fog=<fog_version> of an earlier payload or delta"""
+    debug = request.args.get('debug', 'false').lower() == 'true'
+    since = request.args.get('since', type=int)
+    fog_since = request.args.get('fog', type=int)
+    if since is None or fog_since is None:
+        return jsonify({"error": "since and fog are required"}), 400
+    return jsonify(encode_delta(current_app.game_state.dungeon.state, since, fog_since, debug))
 
 # Add reset endpoint
 @api_bp.route('/reset', methods=['POST'])
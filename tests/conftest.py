@@ -0,0 +1,15 @@
+# tests/conftest.py
+import os
+import sys
+import types
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# The neo package lives in dungeon_neoOld/ but its modules import each other as dungeon_neo
+if importlib.util.find_spec('dungeon_neo') is None:
+    package = types.ModuleType('dungeon_neo')
+    package.__path__ = [os.path.join(ROOT, 'dungeon_neoOld')]
+    sys.modules['dungeon_neo'] = package
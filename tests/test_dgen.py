@@ -0,0 +1,365 @@
+# tests/test_dgen.py
+import unittest
+import io
+import sys
+import contextlib
+from dGen import DungeonGenerator
+
+
+def generate(**options):
+    """Build a dungeon quietly (create_dungeon prints its counts)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return DungeonGenerator(options).create_dungeon()
+
+
+def cells_of(generator):
+    return [[int(v) for v in row] for row in generator.cell]
+
+
+class TestGridBackend(unittest.TestCase):
+    def test_numpy_backend_matches_list_backend(self):
+        for layout in ['None', 'Box', 'Cross', 'Round']:
+            for room_layout in ['Scattered', 'Packed']:
+                options = dict(seed=42, dungeon_layout=layout, room_layout=room_layout)
+                plain = generate(**options)
+                fast = generate(grid_backend='numpy', **options)
+                self.assertEqual(cells_of(plain), cells_of(fast))
+                self.assertEqual(plain.doorList, fast.doorList)
+                self.assertEqual(plain.get_stats(), fast.get_stats())
+
+    def test_numpy_backend_uses_uint32_grid(self):
+        generator = generate(seed=3, grid_backend='numpy')
+        self.assertEqual(str(generator.cell.dtype), 'uint32')
+        self.assertEqual(generator.cell.shape, (39, 39))
+
+    def test_numpy_grid_restored_when_phases_stop_early(self):
+        generator = DungeonGenerator({'seed': 3, 'grid_backend': 'numpy'})
+        phases = generator.generate_phases()
+        for phase in phases:
+            if phase == 'corridors':
+                self.assertIsInstance(generator.cell, list)  # per-cell phases run on a list copy
+                break
+        phases.close()
+        self.assertEqual(str(generator.cell.dtype), 'uint32')
+        self.assertIn('list_cells', generator.profile()['phases_ms'])
+
+
+class TestTunnel(unittest.TestCase):
+    def test_tunnel_does_not_recurse(self):
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(150)
+        try:
+            generator = generate(seed=11, n_rows=81, n_cols=81, remove_deadends=100)
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertGreater(generator.get_stats()['corridors'], 0)
+
+    def test_three_digit_labels_terminate(self):
+        generator = generate(seed=5, n_rows=161, n_cols=161, room_layout='Packed')
+        self.assertGreaterEqual(generator.n_rooms, 100)
+
+
+class TestPrng(unittest.TestCase):
+    def test_legacy_sin_is_default(self):
+        self.assertEqual(cells_of(generate(seed=9)), cells_of(generate(seed=9, prng='legacy-sin')))
+
+    def test_fast_engines_are_deterministic(self):
+        for engine in ['pcg64', 'mt19937']:
+            first = generate(seed=9, prng=engine)
+            second = generate(seed=9, prng=engine)
+            self.assertEqual(cells_of(first), cells_of(second))
+            self.assertGreater(first.n_rooms, 0)
+
+    def test_unknown_engine_rejected(self):
+        with self.assertRaises(ValueError):
+            DungeonGenerator({'prng': 'xorshift'})
+
+
+class TestGenerateMany(unittest.TestCase):
+    def test_results_match_serial_generation(self):
+        options_list = [dict(seed=seed, n_rows=25, n_cols=25) for seed in range(5)]
+        results = list(DungeonGenerator.generate_many(options_list, workers=2, chunk_size=2))
+        self.assertEqual([result['index'] for result in results], list(range(5)))
+        for options, result in zip(options_list, results):
+            generator = generate(**options)
+            self.assertEqual(result['grid'], generator.grid_bytes())
+            self.assertEqual(result['doors'], generator.doorList)
+            self.assertEqual(result['stats'], generator.get_stats())
+
+    def test_unordered_yields_every_index(self):
+        options_list = [dict(seed=seed, n_rows=25, n_cols=25) for seed in range(6)]
+        results = DungeonGenerator.generate_many(iter(options_list), workers=2, chunk_size=1, ordered=False)
+        self.assertEqual(sorted(result['index'] for result in results), list(range(6)))
+
+    def test_grid_bytes_same_for_both_backends(self):
+        plain = generate(seed=4)
+        fast = generate(seed=4, grid_backend='numpy')
+        self.assertEqual(plain.grid_bytes(), fast.grid_bytes())
+        self.assertEqual(len(plain.grid_bytes()), 4 * 39 * 39)
+
+
+class TestGeneratePng(unittest.TestCase):
+    def test_png_size_and_backends_agree(self):
+        from PIL import Image
+        plain = generate(seed=6, cell_size=12)
+        fast = generate(seed=6, cell_size=12, grid_backend='numpy')
+        png = plain.generate_png()
+        self.assertEqual(png, fast.generate_png())
+        image = Image.open(io.BytesIO(png))
+        self.assertEqual(image.size, (39 * 12 + 1 + 200, 600))
+
+    def test_base_layer_marks_rooms_and_corridors(self):
+        generator = generate(seed=6)
+        layer = generator.base_layer()
+        room = generator.room[1]
+        self.assertEqual(layer.getpixel((room['west'], room['north'])), 2)
+        self.assertEqual(layer.getpixel((0, 0)), 0)
+        r, c = next((r, c) for r, row in enumerate(generator.cell) for c, v in enumerate(row)
+                    if v & generator.CORRIDOR and not v & generator.ROOM)
+        self.assertEqual(layer.getpixel((c, r)), 1)
+
+
+class TestTiles(unittest.TestCase):
+    def test_top_zoom_tiles_stitch_to_full_map(self):
+        from PIL import Image, ImageChops
+        generator = generate(seed=6)
+        zoom = generator.tile_zoom(18)
+        full = generator.render_map(18).convert('RGB')
+        stitched = Image.new('RGB', (1024, 1024))
+        for x in range(3):
+            for y in range(3):
+                stitched.paste(generator.render_tile(18, zoom, x, y).convert('RGB'), (x * 256, y * 256))
+        self.assertIsNone(ImageChops.difference(full, stitched.crop((0, 0) + full.size)).getbbox())
+
+    def test_every_zoom_has_a_tile_and_edges_are_bounded(self):
+        generator = generate(seed=6, n_rows=161, n_cols=161)
+        zoom = generator.tile_zoom(18)
+        for z in range(zoom + 1):
+            self.assertEqual(generator.render_tile(18, z, 0, 0).size, (256, 256))
+        self.assertIsNone(generator.render_tile(18, 0, 1, 0))
+        self.assertIsNone(generator.render_tile(18, zoom + 1, 0, 0))
+
+
+class TestCreateDungeonIter(unittest.TestCase):
+    def test_iter_builds_the_same_dungeon(self):
+        for backend in ['list', 'numpy']:
+            streamed = DungeonGenerator({'seed': 8, 'room_layout': 'Packed', 'grid_backend': backend})
+            events = list(streamed.create_dungeon_iter())
+            self.assertEqual(streamed.to_result(), generate(seed=8, room_layout='Packed', grid_backend=backend).to_result())
+            phases = [event['phase'] for event in events]
+            self.assertEqual(phases[:3], ['start', 'rooms', 'doors'])
+            self.assertEqual(phases[-3:], ['stairs', 'cleanup', 'done'])
+            self.assertIsNone(streamed.carved)
+
+    def test_corridor_events_replay_to_corridor_cells(self):
+        from dGen import STREAM_BATCH
+        generator = DungeonGenerator({'seed': 2, 'n_rows': 81, 'n_cols': 81, 'remove_deadends': 0})
+        carved = set()
+        for event in generator.create_dungeon_iter():
+            if event['phase'] == 'corridors':
+                self.assertLessEqual(len(event['segments']), STREAM_BATCH)
+                for r1, c1, r2, c2 in event['segments']:
+                    carved.update((r, c) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1))
+        corridor = {(r, c) for r, row in enumerate(generator.cell) for c, v in enumerate(row) if v & generator.CORRIDOR}
+        self.assertTrue(corridor <= carved)
+
+
+class TestProfile(unittest.TestCase):
+    def test_phases_and_counters_are_recorded(self):
+        generator = generate(seed=4, room_layout='Packed')
+        profile = generator.get_stats(profile=True)['profile']
+        self.assertEqual(
+            set(profile['phases_ms']),
+            {'init', 'emplace_rooms', 'open_rooms', 'label_rooms', 'corridors', 'emplace_stairs', 'clean_dungeon'}
+        )
+        self.assertGreater(profile['counters']['rand'], 0)
+        self.assertGreater(profile['counters']['sound_room'], 0)
+        self.assertGreater(profile['counters']['sound_tunnel'], 0)
+        self.assertNotIn('profile', generator.get_stats())
+
+    def test_counters_match_between_create_and_iter(self):
+        plain = generate(seed=4)
+        streamed = DungeonGenerator({'seed': 4})
+        done = list(streamed.create_dungeon_iter())[-1]
+        self.assertEqual(plain.counters, streamed.counters)
+        self.assertEqual(done['stats']['profile']['counters'], plain.counters)
+
+    def test_log_profile_emits_one_json_line(self):
+        import json
+        with self.assertLogs('dGen', level='INFO') as logs:
+            generate(seed=4, log_profile=True)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['event'], 'dungeon_profile')
+
+
+class TestOccupancyIndex(unittest.TestCase):
+    def brute_sound_room(self, generator, r1, c1, r2, c2):
+        hit = {}
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                if generator.cell[r][c] & generator.BLOCKED:
+                    return {'blocked': True}
+                if generator.cell[r][c] & generator.ROOM:
+                    room_id = generator.room_at(r, c)
+                    hit[room_id] = hit.get(room_id, 0) + 1
+        return hit
+
+    def test_sound_room_matches_cell_scan(self):
+        for backend in ['list', 'numpy']:
+            generator = DungeonGenerator({'seed': 2, 'dungeon_layout': 'Cross', 'grid_backend': backend})
+            generator.init_dungeon_size()
+            generator.init_cells()
+            generator.emplace_rooms()
+            for r1 in range(1, 30, 3):
+                for c1 in range(1, 30, 4):
+                    for size in (1, 5, 9):
+                        expected = self.brute_sound_room(generator, r1, c1, r1 + size, c1 + size)
+                        self.assertEqual(generator.sound_room(r1, c1, r1 + size, c1 + size), expected)
+
+    def test_room_rows_track_room_cells(self):
+        generator = generate(seed=2, room_layout='Packed', grid_backend='numpy')
+        for r, bits in enumerate(generator.room_rows):
+            expected = sum(1 << c for c in range(generator.cell.shape[1]) if generator.cell[r, c] & generator.ROOM)
+            self.assertEqual(bits, expected)
+
+
+class TestWideRoomIds(unittest.TestCase):
+    def test_room_ids_past_the_flag_word(self):
+        generator = generate(seed=2, n_rows=121, n_cols=121, room_layout='Packed',
+                             room_min=1, room_max=3, remove_deadends=0, grid_backend='numpy')
+        self.assertGreater(generator.n_rooms, generator.ROOM_ID_MAX)
+        for room in generator.room[1:generator.n_rooms + 1]:
+            block = generator.room_cell[room['north']:room['south'] + 1, room['west']:room['east'] + 1]
+            self.assertTrue((block == room['id']).all())
+            legacy = int(generator.cell[room['north'], room['west']] & generator.ROOM_ID) >> 6
+            self.assertEqual(legacy, room['id'] if room['id'] <= generator.ROOM_ID_MAX else 0)
+        # Labels that do not fit their room are left to render_map
+        digits = (generator.cell & 0xF0000000) != 0
+        self.assertFalse((digits & ((generator.cell & generator.ROOM) == 0)).any())
+
+    def test_from_result_rebuilds_room_cell(self):
+        generator = generate(seed=4, room_layout='Packed')
+        self.assertEqual(DungeonGenerator.from_result(generator.to_result()).room_cell, generator.room_cell)
+
+
+class TestRemoveDeadends(unittest.TestCase):
+    def carved(self, seed, backend):
+        generator = DungeonGenerator({'seed': seed, 'remove_deadends': 100, 'grid_backend': backend})
+        generator.init_dungeon_size()
+        generator.init_cells()
+        generator.emplace_rooms()
+        generator.open_rooms()
+        generator.label_rooms()
+        generator.corridors()
+        generator.emplace_stairs()
+        return generator
+
+    def scan_remove_deadends(self, generator):
+        for r in range(1, generator.n_i * 2, 2):
+            for c in range(1, generator.n_j * 2, 2):
+                if not (generator.cell[r][c] & generator.OPENSPACE) or generator.cell[r][c] & generator.STAIRS:
+                    continue
+                if generator.is_adjacent_to_door(r, c):
+                    continue
+                generator.collapse(r, c, generator.close_end)
+
+    def test_worklist_matches_full_scan(self):
+        for backend in ['list', 'numpy']:
+            for seed in range(4):
+                fast = self.carved(seed, backend)
+                fast.remove_deadends()
+                scan = self.carved(seed, backend)
+                self.scan_remove_deadends(scan)
+                self.assertEqual(cells_of(fast), cells_of(scan))
+                self.assertEqual(fast.counters['collapse'], scan.counters['collapse'])
+
+    def test_no_dead_ends_left(self):
+        generator = self.carved(3, 'list')
+        generator.remove_deadends()
+        self.assertEqual(generator.dead_end_cells(), [])
+
+
+class TestConnectivity(unittest.TestCase):
+    def seal_room(self, generator, room_id):
+        room = generator.room[room_id]
+        for r in range(room['north'] - 1, room['south'] + 2):
+            for c in range(room['west'] - 1, room['east'] + 2):
+                inside = room['north'] <= r <= room['south'] and room['west'] <= c <= room['east']
+                if not inside and generator.cell[r][c] & generator.OPENSPACE:
+                    generator.cell[r][c] = generator.PERIMETER
+        generator.fix_doors()
+
+    def test_generated_dungeons_are_connected(self):
+        for seed in range(4):
+            report = generate(seed=seed, remove_deadends=100, connectivity='validate').get_stats()['connectivity']
+            self.assertTrue(report['connected'])
+            self.assertEqual(report['unreachable_rooms'], [])
+
+    def test_labels_match_open_cells(self):
+        for backend in ['list', 'numpy']:
+            generator = generate(seed=6, grid_backend=backend)
+            labels, n = generator.label_components()
+            self.assertGreaterEqual(n, 1)
+            for r, row in enumerate(labels):
+                for c, label in enumerate(row):
+                    self.assertEqual(label > 0, bool(generator.cell[r][c] & generator.OPENSPACE))
+
+    def test_sealed_room_is_reported_and_repaired(self):
+        generator = generate(seed=6, grid_backend='numpy')
+        self.seal_room(generator, 2)
+        report = generator.validate_connectivity()
+        self.assertFalse(report['connected'])
+        self.assertEqual(report['unreachable_rooms'], [2])
+
+        self.assertEqual(generator.repair_connectivity(), 1)
+        generator.fix_doors()
+        self.assertTrue(generator.validate_connectivity()['connected'])
+        archways = [door for doors in generator.room[2]['door'].values() for door in doors if door['key'] == 'arch']
+        self.assertTrue(archways)
+        self.assertIn(archways[-1], generator.doorList)
+
+    def test_repair_keeps_connected_layouts(self):
+        for seed in range(3):
+            self.assertEqual(cells_of(generate(seed=seed, connectivity='repair')), cells_of(generate(seed=seed)))
+
+
+
+def mega(workers=1, sector_size=64, **options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return DungeonGenerator(options).create_mega_dungeon(sector_size, workers=workers)
+
+
+class TestMegaDungeon(unittest.TestCase):
+    options = dict(seed=9, n_rows=161, n_cols=161, add_stairs=3, connectivity='validate')
+
+    def test_same_result_for_any_worker_count(self):
+        serial = mega(**self.options).to_result()
+        parallel = mega(workers=2, **self.options).to_result()
+        self.assertEqual(parallel, serial)
+
+    def test_backends_match(self):
+        for layout in ['None', 'Round', 'Cross']:
+            plain = mega(dungeon_layout=layout, **self.options)
+            fast = mega(dungeon_layout=layout, grid_backend='numpy', **self.options)
+            self.assertEqual(plain.grid_bytes(), fast.grid_bytes())
+            self.assertEqual(plain.graph, fast.graph)
+
+    def test_sectors_are_stitched_connected(self):
+        for layout in ['None', 'Box']:
+            generator = mega(dungeon_layout=layout, grid_backend='numpy', **self.options)
+            self.assertTrue(generator.get_stats()['connectivity']['connected'])
+            self.assertEqual([stair['key'] for stair in generator.stairs].count('down'), 1)
+            self.assertEqual([room['id'] for room in generator.room[1:]], list(range(1, generator.n_rooms + 1)))
+            for room in generator.room[1:]:
+                block = generator.room_cell[room['north']:room['south'] + 1, room['west']:room['east'] + 1]
+                self.assertTrue((block == room['id']).all())
+            for door in generator.doorList:
+                self.assertTrue(generator.cell[door['row'], door['col']] & generator.ENTRANCE)
+
+    def test_sector_cuts(self):
+        self.assertEqual(DungeonGenerator.sector_cuts(150, 64), [0, 64, 150])
+        self.assertEqual(DungeonGenerator.sector_cuts(200, 64), [0, 64, 128, 200])
+        self.assertEqual(DungeonGenerator.sector_cuts(40, 64), [0, 40])
+
+if __name__ == "__main__":
+    unittest.main()
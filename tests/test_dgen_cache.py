@@ -0,0 +1,161 @@
+# tests/test_dgen_cache.py
+import os
+import json
+import pickle
+import unittest
+from unittest import mock
+import tempfile
+from dGen import DungeonGenerator
+from dGenCache import DungeonCache, canonical_options, dungeon_handle
+import dGenFormat
+
+
+class TestHandles(unittest.TestCase):
+    def test_render_options_do_not_change_handle(self):
+        plain = dungeon_handle(canonical_options({'seed': 7}))
+        drawn = dungeon_handle(canonical_options({'seed': 7, 'cell_size': 30, 'grid_backend': 'numpy'}))
+        self.assertEqual(plain, drawn)
+
+    def test_odd_and_even_sizes_share_handle(self):
+        odd = dungeon_handle(canonical_options({'seed': 7, 'n_rows': 39, 'n_cols': 39}))
+        even = dungeon_handle(canonical_options({'seed': 7, 'n_rows': 38, 'n_cols': 38}))
+        self.assertEqual(odd, even)
+
+    def test_seed_changes_handle(self):
+        self.assertNotEqual(
+            dungeon_handle(canonical_options({'seed': 7})),
+            dungeon_handle(canonical_options({'seed': 8}))
+        )
+
+
+class TestDungeonCache(unittest.TestCase):
+    def test_second_lookup_is_a_hit(self):
+        cache = DungeonCache()
+        handle, first = cache.result({'seed': 3})
+        again, second = cache.result({'seed': 3, 'cell_size': 12})
+        self.assertEqual(handle, again)
+        self.assertEqual(first, second)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_from_result_round_trips(self):
+        _, result = DungeonCache().result({'seed': 5})
+        self.assertEqual(DungeonGenerator.from_result(result).to_result(), result)
+
+    def test_byte_budget_evicts_least_recent(self):
+        cache = DungeonCache(max_bytes=200)
+        cache.put('a', b'x' * 60)
+        cache.put('b', b'x' * 60)
+        cache.get('a')
+        cache.put('c', b'x' * 60)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertLessEqual(cache.stats()['bytes'], 200)
+
+    def test_disk_tier_survives_new_cache(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            handle, result = DungeonCache(disk_dir=disk_dir).result({'seed': 9})
+            self.assertEqual(DungeonCache(disk_dir=disk_dir).get(handle), result)
+
+    def test_disk_hit_keeps_the_profile(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = DungeonCache(disk_dir=disk_dir)
+            handle, _ = cache.result({'seed': 9})
+            profile = cache.profile(handle)
+            self.assertIn('phases_ms', profile)
+            self.assertEqual(DungeonCache(disk_dir=disk_dir).profile(handle), profile)
+
+    def test_disk_tier_stores_no_pickles(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = DungeonCache(disk_dir=disk_dir)
+            handle, result = cache.result({'seed': 9})
+            png = cache.png(handle, 12)
+            with open(os.path.join(disk_dir, f'{handle}.dgen'), 'rb') as f:
+                self.assertEqual(dGenFormat.DungeonFile(f.read()).to_result(), result)
+            with open(os.path.join(disk_dir, f'{handle}.12.png.bin'), 'rb') as f:
+                self.assertEqual(f.read(), png)
+            self.assertEqual(DungeonCache(disk_dir=disk_dir).png(handle, 12), png)
+
+    def test_pickle_in_cache_dir_is_not_loaded(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            with open(os.path.join(disk_dir, 'planted.pickle'), 'wb') as f:
+                f.write(pickle.dumps({'grid': b''}))
+            self.assertIsNone(DungeonCache(disk_dir=disk_dir).get('planted'))
+            with open(os.path.join(disk_dir, 'damaged.dgen'), 'wb') as f:
+                f.write(b'DGEN')
+            self.assertIsNone(DungeonCache(disk_dir=disk_dir).get('damaged'))
+
+    def test_tiles_are_cached_in_memory_only(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = DungeonCache(disk_dir=disk_dir)
+            handle, _ = cache.result({'seed': 9})
+            tile = cache.tile(handle, 18, 0, 0, 0)
+            self.assertTrue(tile.startswith(b'\x89PNG'))
+            self.assertEqual(cache.tile(handle, 18, 0, 0, 0), tile)
+            self.assertIsNone(cache.tile(handle, 18, 0, 5, 5))
+            self.assertEqual(sorted(os.listdir(disk_dir)), [f'{handle}.dgen', f'{handle}.profile.json'])
+
+    def test_graph_is_built_on_request_and_kept(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = DungeonCache(disk_dir=disk_dir)
+            handle, result = cache.result({'seed': 9})
+            self.assertIsNone(result['graph'])
+            graph = cache.graph(handle)
+            self.assertEqual(graph, DungeonGenerator.from_result(result).graph)
+            self.assertEqual(DungeonCache(disk_dir=disk_dir).get(handle)['graph'], graph)
+            self.assertIsNone(cache.graph('missing'))
+
+    def test_png_for_unknown_handle(self):
+        self.assertIsNone(DungeonCache().png('missing', 18))
+
+    def test_newest_dungeon_kept_over_budget(self):
+        cache = DungeonCache(max_bytes=1000)
+        handle, result = cache.result({'seed': 1})
+        self.assertEqual(cache.get(handle), result)
+        self.assertIsNotNone(cache.profile(handle))
+        self.assertTrue(cache.png(handle, 18).startswith(b'\x89PNG'))
+        self.assertIsNotNone(cache.renderer(handle))
+        self.assertIsNotNone(cache.tile(handle, 18, 0, 0, 0))
+        self.assertEqual(cache.get(handle), result)  # renders did not evict it
+
+        newer, _ = cache.result({'seed': 2})
+        self.assertIsNotNone(cache.get(newer))
+        self.assertIsNone(cache.get(handle))  # only the newest is kept past the budget
+        self.assertEqual(set(cache.entries), {newer, f"{newer}.profile"})
+
+    def test_png_from_result(self):
+        cache = DungeonCache(max_bytes=1000)
+        handle, result = cache.result({'seed': 1})
+        cache.result({'seed': 2})
+        self.assertIsNone(cache.png(handle, 18))
+        self.assertTrue(cache.png(handle, 18, result).startswith(b'\x89PNG'))
+
+
+class TestSmallCacheApp(unittest.TestCase):
+    """dGenApp routes with a cache too small to hold a single dungeon"""
+
+    def setUp(self):
+        import dGenApp
+        patcher = mock.patch.object(dGenApp, 'cache', DungeonCache(max_bytes=1000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = dGenApp.app.test_client()
+
+    def test_dungeon_png(self):
+        response = self.client.get('/dungeon.png?seed=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data.startswith(b'\x89PNG'))
+
+    def test_generated_handle_can_be_fetched(self):
+        handle = self.client.post('/generate', json={'seed': 1}).get_json()['handle']
+        for path in (f'/dungeon/{handle}.png', f'/dungeon/{handle}/tiles.json',
+                     f'/dungeon/{handle}/tiles/0/0/0.png', f'/dungeon/{handle}/stats'):
+            self.assertEqual(self.client.get(path).status_code, 200, path)
+
+    def test_streamed_handle_can_be_fetched(self):
+        events = self.client.get('/generate/stream?seed=4').get_data(as_text=True)
+        done = json.loads(events.rsplit('data: ', 1)[1])
+        self.assertEqual(self.client.get(f"/dungeon/{done['handle']}.png").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
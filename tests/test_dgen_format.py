@@ -0,0 +1,53 @@
+# tests/test_dgen_format.py
+import io
+import os
+import unittest
+import tempfile
+import contextlib
+from dGen import DungeonGenerator
+import dGenFormat
+
+
+def generate(**options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return DungeonGenerator(options).create_dungeon()
+
+
+class TestDungeonFormat(unittest.TestCase):
+    def test_round_trip_matches_result(self):
+        for room_layout in ['Scattered', 'Packed']:
+            result = generate(seed=12, room_layout=room_layout).to_result()
+            self.assertEqual(dGenFormat.DungeonFile(dGenFormat.pack(result)).to_result(), result)
+
+    def test_room_doors_share_door_dicts(self):
+        result = generate(seed=12).to_result()
+        dungeon = dGenFormat.DungeonFile(dGenFormat.pack(result))
+        doors = dungeon.doors()
+        door_ids = {id(door) for door in doors}
+        for room in dungeon.rooms(doors):
+            for room_doors in room['door'].values():
+                self.assertTrue(all(id(door) in door_ids for door in room_doors))
+
+    def test_mmap_load_reads_cells_in_place(self):
+        generator = generate(seed=12)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dungeon.dgn')
+            dGenFormat.save(generator.to_result(), path)
+            dungeon = dGenFormat.load(path)
+            cells = dungeon.cells
+            self.assertEqual(cells.shape, (39, 39))
+            self.assertEqual(cells.tolist(), generator.cell)
+            self.assertEqual(dungeon.cell_array().tolist(), generator.cell)
+            del cells
+            dungeon.buffer.release()
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            dGenFormat.DungeonFile(b'PNG\0' + bytes(64))
+        packed = dGenFormat.pack(generate(seed=12).to_result())
+        with self.assertRaises(ValueError):
+            dGenFormat.DungeonFile(packed[:100])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# tests/test_dgen_graph.py
+import io
+import unittest
+import contextlib
+from collections import deque
+from dGen import DungeonGenerator
+from dGenGraph import DungeonGraph, room_node, stair_node
+import dGenFormat
+
+
+def generate(**options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return DungeonGenerator(options).create_dungeon()
+
+
+def walk_length(generator, start, goal):
+    """Steps between two cells over open cells outside rooms"""
+    seen = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        r, c = frontier.popleft()
+        if (r, c) == goal:
+            return seen[goal]
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            value = generator.cell[nr][nc]
+            if (nr, nc) not in seen and value & generator.OPENSPACE and not value & generator.ROOM:
+                seen[(nr, nc)] = seen[(r, c)] + 1
+                frontier.append((nr, nc))
+    return None
+
+
+class TestRoomGraph(unittest.TestCase):
+    def test_backends_build_the_same_graph(self):
+        for seed in range(3):
+            self.assertEqual(generate(seed=seed).graph, generate(seed=seed, grid_backend='numpy').graph)
+
+    def test_every_room_and_stair_reaches_the_down_stair(self):
+        for seed in range(4):
+            generator = generate(seed=seed, remove_deadends=100)
+            graph = DungeonGraph(generator.graph)
+            down = graph.stairs('down')[0]
+            for room in generator.room[1:generator.n_rooms + 1]:
+                self.assertIsNotNone(graph.distance(down, room_node(room['id'])))
+            self.assertIsNotNone(graph.distance(down, stair_node(1)))
+
+    def test_door_to_door_lengths_are_real_walks(self):
+        generator = generate(seed=5)
+        for edge in generator.graph['edges']:
+            door_a, door_b = edge['doors']
+            if door_a and door_b:
+                shortest = walk_length(generator, (door_a['row'], door_a['col']), (door_b['row'], door_b['col']))
+                self.assertIsNotNone(shortest)
+                self.assertGreaterEqual(edge['length'], shortest)
+
+    def test_queries(self):
+        graph = DungeonGraph(generate(seed=5).graph)
+        for node_id, neighbors in graph.adjacency.items():
+            for other, edge in neighbors.items():
+                self.assertIs(graph.edge(other, node_id), edge)
+        exits = graph.exits(1)
+        self.assertEqual([exit['to'] for exit in exits], sorted(graph.neighbors(room_node(1))))
+        self.assertEqual(graph.connected_rooms(1), sorted(
+            graph.nodes[exit['to']]['room'] for exit in exits if exit['to'].startswith('room:')
+        ))
+        length, chain = graph.path(room_node(1), room_node(2))
+        self.assertEqual((chain[0], chain[-1]), (room_node(1), room_node(2)))
+        self.assertEqual(length, sum(graph.edge(a, b)['length'] for a, b in zip(chain, chain[1:])))
+
+    def test_graph_is_built_on_first_use(self):
+        generator = generate(seed=8)
+        self.assertNotIn('room_graph', generator.profile()['phases_ms'])
+        result = generator.to_result()
+        self.assertIsNone(result['graph'])
+        graph = generator.graph
+        self.assertIn('room_graph', generator.profile()['phases_ms'])
+        self.assertIs(generator.graph, graph)
+        self.assertEqual(DungeonGenerator.from_result(result).graph, graph)
+
+    def test_graph_is_stored_with_the_dungeon(self):
+        generator = generate(seed=8)
+        generator.graph
+        result = generator.to_result()
+        self.assertEqual(DungeonGenerator.from_result(result).graph, generator.graph)
+        stored = dGenFormat.DungeonFile(dGenFormat.pack(result)).to_result()
+        self.assertEqual(DungeonGraph.from_result(stored).graph, generator.graph)
+
+
+if __name__ == "__main__":
+    unittest.main()
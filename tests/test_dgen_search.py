@@ -0,0 +1,68 @@
+# tests/test_dgen_search.py
+import io
+import unittest
+import contextlib
+from dGen import DungeonGenerator
+from dGenSearch import SeedConstraints, search_seeds
+
+
+def generate(**options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return DungeonGenerator(options).create_dungeon()
+
+
+class TestSeedSearch(unittest.TestCase):
+    options = {'n_rows': 39, 'n_cols': 39}
+    constraints = {'min_rooms': 7, 'min_stair_distance': 30, 'max_deadend_length': 6}
+
+    def test_matches_meet_the_constraints(self):
+        found = search_seeds(self.options, self.constraints, count=2, max_tries=300, workers=1)
+        self.assertEqual(len(found['matches']), 2)
+        for match in found['matches']:
+            generator = generate(seed=match['seed'], **self.options)
+            self.assertEqual(match['stats'], SeedConstraints(self.constraints).measure(generator))
+            self.assertGreaterEqual(generator.n_rooms, 7)
+            self.assertGreaterEqual(generator.stair_distance(), 30)
+            self.assertLessEqual(generator.longest_deadend(), 6)
+        self.assertEqual(found['tried'], found['matches'][-1]['seed'] + 1)
+        self.assertEqual(sum(found['ruled_out'].values()), found['tried'] - 2)
+
+    def test_same_matches_for_any_worker_count(self):
+        serial = search_seeds(self.options, self.constraints, count=2, max_tries=300, workers=1)
+        parallel = search_seeds(self.options, self.constraints, count=2, max_tries=300, workers=2, chunk_size=5)
+        self.assertEqual(parallel, serial)
+
+    def test_room_count_prunes_after_emplace_rooms(self):
+        found = search_seeds(self.options, {'min_rooms': 500}, max_tries=20, workers=1)
+        self.assertEqual(found, {'matches': [], 'tried': 20, 'ruled_out': {'emplace_rooms': 20}})
+
+    def test_missing_stairs_prune(self):
+        found = search_seeds(dict(self.options, add_stairs=0), {'max_stair_distance': 100}, max_tries=5, workers=1)
+        self.assertEqual(found['ruled_out'], {'corridors': 5})
+
+    def test_connected_validates(self):
+        found = search_seeds(self.options, {'connected': True}, count=1, workers=1)
+        self.assertTrue(found['matches'][0]['stats']['connectivity']['connected'])
+
+    def test_unknown_constraint(self):
+        with self.assertRaises(ValueError):
+            search_seeds(self.options, {'min_treasure': 3})
+
+
+class TestMetrics(unittest.TestCase):
+    def test_stair_distance_is_at_least_manhattan(self):
+        for seed in range(5):
+            generator = generate(seed=seed)
+            down, up = generator.stairs[:2]
+            self.assertGreaterEqual(
+                generator.stair_distance(), abs(down['row'] - up['row']) + abs(down['col'] - up['col'])
+            )
+
+    def test_no_dead_ends_after_full_removal(self):
+        for seed in range(5):
+            self.assertLessEqual(generate(seed=seed, remove_deadends=100).longest_deadend(), 1)
+            self.assertGreater(generate(seed=seed, remove_deadends=0).longest_deadend(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# tests/test_dgen_stack.py
+import unittest
+from dGenStack import DungeonStack, PREFETCH_RADIUS, level_seed
+from dGenGraph import DungeonGraph
+
+
+def first_stair(generator, key):
+    return next(stair for stair in generator.stairs if stair['key'] == key)
+
+
+class TestDungeonStack(unittest.TestCase):
+    def test_up_stair_is_under_the_down_stair_above(self):
+        stack = DungeonStack('ruins', {'remove_deadends': 100}, prefetch=False)
+        for level in range(1, 5):
+            above, below = stack.level(level), stack.level(level + 1)
+            down = first_stair(above, 'down')
+            up = first_stair(below, 'up')
+            self.assertEqual((up['row'], up['col']), (down['row'], down['col']))
+            self.assertTrue(below.cell[up['row']][up['col']] & below.STAIR_UP)
+            self.assertIsNotNone(DungeonGraph(below.graph).distance('stair:0', 'room:1'))
+
+    def test_seeds_depend_on_location_and_level(self):
+        self.assertEqual(level_seed('ruins', 2, 7), level_seed('ruins', 2, 7))
+        self.assertEqual(len({level_seed('ruins', 1), level_seed('ruins', 2), level_seed('crypt', 1)}), 3)
+
+    def test_lru_rebuilds_evicted_levels(self):
+        stack = DungeonStack('crypt', max_levels=2, prefetch=False)
+        first = stack.level(1).grid_bytes()
+        stack.level(2)
+        stack.level(3)
+        self.assertEqual(list(stack.levels), [2, 3])
+        self.assertEqual(stack.level(1).grid_bytes(), first)
+        self.assertEqual(list(stack.levels), [3, 1])
+        self.assertEqual(set(stack.down_stairs), {1, 2, 3})
+
+    def test_prefetch_near_down_stair(self):
+        stack = DungeonStack('crypt')
+        try:
+            level = stack.level(1)
+            row, col = stack.down_stairs[1]
+            stack.moved(1, row + PREFETCH_RADIUS + 1, col)
+            self.assertEqual(stack.pending, {})
+            stack.moved(1, row, col)
+            self.assertIn(2, stack.pending)
+            inline = DungeonStack('crypt', prefetch=False)
+            self.assertEqual(stack.level(2).grid_bytes(), inline.level(2).grid_bytes())
+            self.assertEqual(stack.arrival(2), [row, col])
+            self.assertIs(stack.level(1), level)
+        finally:
+            stack.close()
+
+    def test_bottom_level(self):
+        stack = DungeonStack('well', depth=2, prefetch=False)
+        self.assertEqual([stair['key'] for stair in stack.level(2).stairs], ['up'])
+        self.assertIsNone(stack.level(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
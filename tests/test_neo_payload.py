@@ -0,0 +1,169 @@
+# tests/test_neo_payload.py
+import io
+import sys
+import base64
+import unittest
+import contextlib
+from array import array
+from collections import deque
+from core.dungeon import DungeonSystem
+from dungeon_neo.constants import CELL_FLAGS, ORIENTATION_CODES
+from dungeon_neo.dm_tools import DMTools
+from dungeon_neo.payload_neo import encode_dungeon, encode_delta, MAX_DELTA_CELLS
+
+
+def make_state(seed='1'):
+    dungeon = DungeonSystem({**DungeonSystem.DEFAULT_OPTIONS, 'seed': seed})
+    with contextlib.redirect_stdout(io.StringIO()):
+        dungeon.generate()
+    return dungeon.state
+
+
+def decode(payload):
+    """(flags, orientation, explored) of an encode_dungeon() payload"""
+    flags = array('I')
+    flags.frombytes(base64.b64decode(payload['flags']))
+    if sys.byteorder == 'big':
+        flags.byteswap()
+    return flags, base64.b64decode(payload['orientation']), base64.b64decode(payload['explored'])
+
+
+def door_cells(state):
+    return [(x, y) for y in range(state.height) for x in range(state.width)
+            if state.get_flags(x, y) & CELL_FLAGS['DOORSPACE']]
+
+
+class TestEncodeDungeon(unittest.TestCase):
+    def setUp(self):
+        self.state = make_state()
+        self.tools = DMTools(self.state)
+
+    def test_round_trip(self):
+        x, y = self.state.party_position
+        self.tools.add_entity(x, y, 'chest')
+        self.tools.describe_cell(x, y, 'A dusty chest')
+        payload = encode_dungeon(self.state, debug_show_all=True)  # secret doors unmasked
+        flags, orientation, explored = decode(payload)
+        self.assertEqual(len(flags), self.state.width * self.state.height)
+        for index, value in enumerate(flags):
+            cx, cy = index % self.state.width, index // self.state.width
+            self.assertEqual(value, self.state.get_flags(cx, cy))
+            if value & CELL_FLAGS['DOORSPACE']:
+                expected = ORIENTATION_CODES[self.state.get_door_orientation(cx, cy)]
+            elif value & CELL_FLAGS['STAIRS']:
+                expected = ORIENTATION_CODES[self.state.get_stair_orientation(cx, cy)]
+            else:
+                expected = 0
+            self.assertEqual(orientation[index], expected)
+        self.assertEqual(explored, bytes(self.state.visibility_system.explored))
+        self.assertEqual(payload['cells'], [{'x': x, 'y': y, 'entities': ['chest'], 'description': 'A dusty chest'}])
+        self.assertEqual(payload['party_position'], [x, y])
+
+    def test_secret_doors_masked(self):
+        x, y = door_cells(self.state)[0]
+        index = y * self.state.width + x
+        self.state.flags[index] |= CELL_FLAGS['SECRET']
+        flags, orientation, _ = decode(encode_dungeon(self.state))
+        self.assertEqual(flags[index], CELL_FLAGS['BLOCKED'])
+        self.assertEqual(orientation[index], 0)
+
+        flags, orientation, _ = decode(encode_dungeon(self.state, debug_show_all=True))
+        self.assertEqual(flags[index], self.state.flags[index])
+        self.assertNotEqual(orientation[index], 0)
+
+        since = self.state.revision
+        self.state.reveal_secret(x, y)
+        delta = encode_delta(self.state, since, self.state.visibility_system.version)
+        self.assertEqual([(cell['x'], cell['y'], cell['flags']) for cell in delta['cells']],
+                         [(x, y, self.state.flags[index])])
+        self.assertEqual(decode(encode_dungeon(self.state))[0][index], self.state.flags[index])
+
+
+class TestEncodeDelta(unittest.TestCase):
+    def setUp(self):
+        self.state = make_state()
+        self.tools = DMTools(self.state)
+        payload = encode_dungeon(self.state)
+        self.since, self.fog_since = payload['revision'], payload['fog_version']
+
+    def delta(self):
+        return encode_delta(self.state, self.since, self.fog_since)
+
+    def test_changes_since_payload(self):
+        x, y = self.state.party_position
+        self.tools.describe_cell(x, y, 'Cold air rises from below')
+        delta = self.delta()
+        self.assertFalse(delta['full'])
+        self.assertEqual([(cell['x'], cell['y'], cell['description']) for cell in delta['cells']],
+                         [(x, y, 'Cold air rises from below')])
+        self.tools.add_overlay(x, y, 'circle', 255, 0, 0)
+        cell = next(cell for cell in self.delta()['cells'] if (cell['x'], cell['y']) == (x, y))
+        self.assertEqual(cell['overlays'][0]['primitive'], 'circle')
+        self.assertEqual(cell['flags'], self.state.get_flags(x, y))
+        self.assertEqual(delta['revealed'], [])
+
+    def test_move_reveals_and_moves_party(self):
+        old = self.state.party_position
+        for direction in ('north', 'south', 'east', 'west'):
+            if self.state.movement.move(direction)['success']:
+                break
+        delta = self.delta()
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['party_position'], list(self.state.party_position))
+        changed = {(cell['x'], cell['y']) for cell in delta['cells']}
+        self.assertLessEqual({tuple(old), tuple(self.state.party_position)}, changed)
+        self.assertEqual(delta['revealed'], self.state.visibility_system.revealed_since(self.fog_since))
+        self.assertEqual(encode_delta(self.state, delta['revision'], delta['fog_version'])['cells'], [])
+
+    def test_full_when_change_log_overflows(self):
+        self.state.changes = deque(self.state.changes, maxlen=2)
+        for x in range(3):
+            self.state.mark_dirty(x, 1)
+        self.assertTrue(self.delta()['full'])
+
+    def test_full_when_reveal_log_overflows(self):
+        visibility = self.state.visibility_system
+        visibility.reveals.clear()
+        visibility.reveals.append((visibility.version + 2, [(1, 1)]))
+        visibility.version += 2
+        self.assertTrue(self.delta()['full'])
+
+    def test_full_when_too_many_cells_changed(self):
+        self.state.mark_dirty(0, 0, self.state.width - 1, self.state.height - 1, static=True)
+        self.assertGreater(self.state.width * self.state.height, MAX_DELTA_CELLS)
+        delta = self.delta()
+        self.assertTrue(delta['full'])
+        self.assertNotIn('cells', delta)
+
+
+class TestMoveApi(unittest.TestCase):
+    def setUp(self):
+        from flask import Flask
+        from core.game_state import GameState
+        from routes.api import api_bp
+        app = Flask(__name__)
+        with contextlib.redirect_stdout(io.StringIO()):
+            app.game_state = GameState()
+        app.register_blueprint(api_bp, url_prefix='/api')
+        self.client = app.test_client()
+        self.state = app.game_state.dungeon.state
+
+    def test_move_delta_covers_changes_since_the_clients_payload(self):
+        payload = self.client.get('/api/dungeon-data').get_json()
+        x, y = self.state.party_position
+        DMTools(self.state).describe_cell(x, y, 'Bones crunch underfoot')
+        for direction in ('north', 'south', 'east', 'west'):
+            result = self.client.post('/api/move', json={
+                'direction': direction, 'since': payload['revision'], 'fog': payload['fog_version']
+            }).get_json()
+            if result['success']:
+                break
+        delta = result['delta']
+        self.assertFalse(delta['full'])
+        described = [cell for cell in delta['cells'] if cell.get('description')]
+        self.assertEqual([(cell['x'], cell['y']) for cell in described], [(x, y)])
+        self.assertEqual(delta['party_position'], list(self.state.party_position))
+
+
+if __name__ == "__main__":
+    unittest.main()
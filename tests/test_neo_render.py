@@ -0,0 +1,136 @@
+# tests/test_neo_render.py
+import gc
+import io
+import unittest
+import contextlib
+from collections import deque
+from core.dungeon import DungeonSystem
+from dungeon_neo.constants import CELL_FLAGS
+from dungeon_neo.dm_tools import DMTools
+from dungeon_neo.renderer_neo import DungeonRendererNeo
+
+
+def make_dungeon(seed='1'):
+    """A generated DungeonSystem (the API's default options) with the party placed"""
+    dungeon = DungeonSystem({**DungeonSystem.DEFAULT_OPTIONS, 'seed': seed})
+    with contextlib.redirect_stdout(io.StringIO()):
+        dungeon.generate()
+    return dungeon
+
+
+def render(renderer, dungeon, debug=False, include_legend=True):
+    with contextlib.redirect_stdout(io.StringIO()):  # render() prints
+        return renderer.render(dungeon.state, debug, include_legend, dungeon.state.visibility_system)
+
+
+class TestFrameCache(unittest.TestCase):
+    def test_frame_follows_the_state(self):
+        renderer = DungeonRendererNeo()
+        first, second = make_dungeon('1'), make_dungeon('2')
+        for dungeon in (first, second, first):
+            self.assertEqual(render(renderer, dungeon).tobytes(),
+                             render(DungeonRendererNeo(), dungeon).tobytes())
+
+    def test_freed_state_is_not_reused(self):
+        renderer = DungeonRendererNeo()
+        render(renderer, make_dungeon('1'))
+        gc.collect()
+        self.assertIsNone(renderer._frames[False]['key'][0]())  # the frame keeps no strong reference
+        dungeon = make_dungeon('2')
+        self.assertEqual(render(renderer, dungeon).tobytes(),
+                         render(DungeonRendererNeo(), dungeon).tobytes())
+
+    def test_new_visibility_system_redraws_fog(self):
+        renderer = DungeonRendererNeo()
+        dungeon = make_dungeon()
+        before = render(renderer, dungeon).tobytes()
+        state = dungeon.state
+        fog = type(state.visibility_system)(state.grid_system, state.party_position, light_radius=1)
+        state.visibility_system = fog
+        after = render(renderer, dungeon)
+        self.assertNotEqual(after.tobytes(), before)
+        self.assertEqual(after.tobytes(), render(DungeonRendererNeo(), dungeon).tobytes())
+
+    def test_legend_background_only_kept_for_cached_icons(self):
+        renderer = DungeonRendererNeo()
+        dungeon = make_dungeon()
+        image = render(renderer, dungeon, include_legend=False)
+        icons = renderer.generate_legend_icons()
+        relabelled = {name: (icon, label.upper()) for name, (icon, label) in icons.items()}
+        plain = renderer.create_composite_image(image, renderer.legend_icons())
+        self.assertIsNotNone(renderer._legend_frame)
+        upper = renderer.create_composite_image(image, relabelled)
+        self.assertNotEqual(upper.tobytes(), plain.tobytes())
+        self.assertEqual(renderer.create_composite_image(image, renderer.legend_icons()).tobytes(), plain.tobytes())
+
+
+class TestPatches(unittest.TestCase):
+    def setUp(self):
+        self.dungeon = make_dungeon()
+        self.state = self.dungeon.state
+        self.tools = DMTools(self.state)
+        self.renderer = DungeonRendererNeo()
+        self.client = render(self.renderer, self.dungeon)
+        self.version = self.renderer.frame_version()
+
+    def room_cell(self, distance):
+        """A room cell about distance cells from the party"""
+        px, py = self.state.party_position
+        cells = [(x, y) for y in range(self.state.height) for x in range(self.state.width)
+                 if self.state.get_flags(x, y) & CELL_FLAGS['ROOM']]
+        return min(cells, key=lambda cell: abs(abs(cell[0] - px) + abs(cell[1] - py) - distance))
+
+    def assert_patched_matches_fresh(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            version, patches = self.renderer.render_patches(self.state, self.version, visibility_system=self.state.visibility_system)
+        self.assertIsNotNone(patches)
+        for patch in patches:
+            self.client.paste(patch['image'], (patch['x'], patch['y']))
+        self.version = version
+        self.assertEqual(self.client.tobytes(), render(DungeonRendererNeo(), self.dungeon).tobytes())
+
+    def test_large_overlay(self):
+        x, y = self.room_cell(1)
+        self.tools.add_overlay(x, y, 'circle', 200, 40, 40, '{"size": 2.5}')
+        self.assert_patched_matches_fresh()
+        self.tools.add_overlay(x + 1, y, 'square', 40, 40, 200, '{"size": 1.5, "rotation": 45}')
+        self.assert_patched_matches_fresh()
+        self.state.mark_changed(x - 1, y)  # a redraw next to the overlay keeps its spill
+        self.assert_patched_matches_fresh()
+
+    def test_overlay_drawn_to_its_full_size(self):
+        x, y = next((x, y) for y in range(3, self.state.height - 3) for x in range(3, self.state.width - 3)
+                    if self.state.get_flags(x, y) & CELL_FLAGS['ROOM'])
+        self.tools.add_overlay(x, y, 'circle', 250, 10, 10, '{"size": 5}')
+        self.assert_patched_matches_fresh()
+        cs = self.renderer.cell_size
+        static = self.renderer._frames[False]['static']
+        center_x, center_y = x * cs + cs // 2, y * cs + cs // 2
+        for dx, dy in ((2.2, 0), (-2.2, 0), (0, 2.2), (0, -2.2)):
+            pixel = (center_x + int(dx * cs), center_y + int(dy * cs))
+            self.assertEqual(static.getpixel(pixel), (250, 10, 10), pixel)
+
+    def test_edits_and_moves(self):
+        x, y = self.room_cell(2)
+        self.tools.add_entity(x, y, 'monster')
+        self.assert_patched_matches_fresh()
+        self.tools.add_overlay(x, y, 'line', 255, 255, 0, '{"start_x": -0.5, "end_x": 1.5}')
+        self.assert_patched_matches_fresh()
+        for direction in ('east', 'east', 'south', 'west', 'north'):
+            self.state.movement.move(direction)
+            self.assert_patched_matches_fresh()
+
+    def test_dirty_since_log_overflow(self):
+        revision = self.state.revision
+        self.state.changes = deque(self.state.changes, maxlen=4)
+        for x in range(6):
+            self.state.mark_dirty(x, 1)
+        self.assertIsNone(self.state.dirty_since(revision))
+        self.assertEqual([rect for rect, _ in self.state.dirty_since(self.state.revision - 2)], [(4, 1, 4, 1), (5, 1, 5, 1)])
+        self.assertEqual(self.state.dirty_since(self.state.revision), [])
+        # The renderer redraws in full
+        self.assert_patched_matches_fresh()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# tests/test_neo_sprites.py
+import unittest
+from PIL import Image, ImageDraw
+from dungeon_neo.cell_neo import DungeonCellNeo
+from dungeon_neo.constants import CELL_FLAGS
+from dungeon_neo.overlay import Overlay
+from dungeon_neo.renderer_neo import DungeonRendererNeo
+from dungeon_neo.sprites_neo import SpriteAtlasNeo, freeze
+
+CELL = 18
+
+
+def square(draw, x_pix, y_pix, cell_size):
+    draw.rectangle([x_pix + 2, y_pix + 2, x_pix + cell_size - 2, y_pix + cell_size - 2], fill=(200, 0, 0))
+
+
+class TestSpriteAtlas(unittest.TestCase):
+    def test_lru_bound(self):
+        atlas = SpriteAtlasNeo(max_sprites=3)
+        for kind in 'abcd':
+            atlas.sprite(kind, None, None, CELL, square)
+        self.assertEqual([key[0] for key in atlas.sprites], ['b', 'c', 'd'])
+        atlas.sprite('b', None, None, CELL, square)  # a hit refreshes b
+        atlas.sprite('e', None, None, CELL, square)
+        self.assertEqual([key[0] for key in atlas.sprites], ['d', 'b', 'e'])
+        self.assertEqual((atlas.hits, atlas.misses), (1, 5))
+        atlas.sprite('a', None, None, CELL, square)  # evicted, so drawn again
+        self.assertEqual((atlas.hits, atlas.misses), (1, 6))
+        self.assertEqual(len(atlas.sprites), 3)
+
+    def test_freeze_json_params(self):
+        params = {'color': [255, 0, 0], 'points': [[0, 0], [1, 0], [0.5, 1]], 'style': {'outline': True}}
+        reordered = {'style': {'outline': True}, 'points': [[0, 0], [1, 0], [0.5, 1]], 'color': (255, 0, 0)}
+        self.assertEqual(freeze(params), freeze(reordered))
+        self.assertEqual(hash(freeze(params)), hash(freeze(reordered)))
+        self.assertNotEqual(freeze(params), freeze({**params, 'color': [0, 255, 0]}))
+
+        atlas = SpriteAtlasNeo()
+        first = atlas.sprite('overlay', ('polygon', params), None, CELL, square)
+        self.assertIs(atlas.sprite('overlay', ('polygon', reordered), None, CELL, square), first)
+        self.assertEqual((atlas.hits, atlas.misses), (1, 1))
+
+    def test_cell_size_and_orientation_are_keys(self):
+        atlas = SpriteAtlasNeo()
+        atlas.sprite('door', 'arch', 'horizontal', CELL, square)
+        atlas.sprite('door', 'arch', 'vertical', CELL, square)
+        atlas.sprite('door', 'arch', 'horizontal', CELL * 2, square)
+        self.assertEqual(atlas.misses, 3)
+
+
+class TestSpritePixels(unittest.TestCase):
+    """Pasting a sprite gives the same pixels as drawing straight onto the image"""
+
+    def setUp(self):
+        self.renderer = DungeonRendererNeo(cell_size=CELL)
+        self.background = Image.new('RGB', (CELL * 9, CELL * 9), self.renderer.COLORS['room'])
+
+    def assert_same_pixels(self, kind, params, orientation, draw, margin=0):
+        x_pix = y_pix = CELL * 4
+        direct = self.background.copy()
+        draw(ImageDraw.Draw(direct), x_pix, y_pix, CELL)
+        pasted = self.background.copy()
+        self.renderer.sprites.paste(pasted, x_pix, y_pix, kind, params, orientation, CELL, draw, margin)
+        self.assertEqual(pasted.tobytes(), direct.tobytes(), (kind, params, orientation))
+
+    def test_stairs(self):
+        for stair_type in ('up', 'down'):
+            for orientation in ('horizontal', 'vertical'):
+                self.assert_same_pixels(
+                    'stairs', stair_type, orientation,
+                    lambda draw, x, y, size: self.renderer._draw_stairs(draw, stair_type, orientation, x, y, size))
+
+    def test_doors(self):
+        for door in ('ARCH', 'DOOR', 'LOCKED', 'PORTC'):
+            cell = DungeonCellNeo(CELL_FLAGS[door], 4, 4)
+            for orientation in ('horizontal', 'vertical'):
+                self.assert_same_pixels(
+                    'door', (cell.is_arch, cell.is_portc, cell.is_locked), orientation,
+                    lambda draw, x, y, size: self.renderer._draw_door(draw, cell, orientation, x, y, size))
+
+    def test_overlays(self):
+        overlays = [
+            Overlay('circle', color=(200, 40, 40)),
+            Overlay('square', color=(40, 200, 40), size=0.6, rotation=30),
+            Overlay('triangle', color=(40, 40, 200)),
+            Overlay('line', color=(255, 255, 0), start_x=-0.5, end_x=1.5),
+            Overlay('polygon', color=(0, 255, 255), points=[[0, 0], [1, 0], [0.5, 1]]),
+        ]
+        for overlay in overlays:
+            self.assert_same_pixels(
+                'overlay', (overlay.primitive, overlay.params), None,
+                lambda draw, x, y, size: self.renderer._draw_overlay(draw, overlay, x, y, size),
+                margin=overlay.reach() * CELL)
+
+    def test_large_overlays_are_not_clipped(self):
+        for size in (2.5, 4, 7):
+            overlay = Overlay('circle', color=(200, 40, 40), size=size)
+            self.assertGreaterEqual(overlay.reach() * 2 + 1, size)
+            self.assert_same_pixels(
+                'overlay', (overlay.primitive, overlay.params), None,
+                lambda draw, x, y, cell_size: self.renderer._draw_overlay(draw, overlay, x, y, cell_size),
+                margin=overlay.reach() * CELL)
+
+
+if __name__ == "__main__":
+    unittest.main()
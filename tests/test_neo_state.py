@@ -0,0 +1,177 @@
+# tests/test_neo_state.py
+import io
+import random
+import base64
+import unittest
+import contextlib
+from core.dungeon import DungeonSystem
+from dungeon_neo.constants import CELL_FLAGS
+from dungeon_neo.cell_neo import SIDE_TABLES
+from dungeon_neo.dm_tools import DMTools
+from dungeon_neo.grid_system import GridSystem
+from dungeon_neo.payload_neo import encode_dungeon, encode_delta
+from dungeon_neo.renderer_neo import DungeonRendererNeo
+from dungeon_neo.sprites_neo import SpriteAtlasNeo
+from dungeon_neo.visibility_neo import VisibilitySystemNeo
+
+DIRECTIONS = ['north', 'south', 'east', 'west', 'northeast', 'northwest', 'southeast', 'southwest']
+
+
+def make_state(seed='1'):
+    dungeon = DungeonSystem({**DungeonSystem.DEFAULT_OPTIONS, 'seed': seed})
+    with contextlib.redirect_stdout(io.StringIO()):
+        dungeon.generate()
+    return dungeon.state
+
+
+class TestCellViews(unittest.TestCase):
+    def setUp(self):
+        self.state = make_state()
+
+    def test_reads_do_not_fill_side_tables(self):
+        for y in range(self.state.height):
+            for x in range(self.state.width):
+                cell = self.state.get_cell(x, y)
+                for name in SIDE_TABLES:
+                    value = getattr(cell, name)
+                    self.assertFalse(value)
+                self.assertEqual(len(cell.entities), 0)
+        self.assertEqual({name: len(table) for name, table in self.state.side_tables.items()},
+                         {name: 0 for name in SIDE_TABLES})
+
+    def test_empty_values_are_read_only(self):
+        cell = self.state.get_cell(1, 1)
+        with self.assertRaises(AttributeError):
+            cell.entities.append('lost')
+        with self.assertRaises(TypeError):
+            cell.properties['lit'] = True
+        self.state.side_value('properties', 1, 1, create=True)['lit'] = True
+        self.assertEqual(dict(self.state.get_cell(1, 1).properties), {'lit': True})
+
+    def test_writes(self):
+        tools = DMTools(self.state)
+        x, y = self.state.party_position
+        tools.add_entity(x, y, 'chest')
+        tools.add_overlay(x, y, 'circle', 1, 2, 3)
+        tools.describe_cell(x, y, 'A chest')
+        cell = self.state.get_cell(x, y)
+        self.assertEqual([entity.type for entity in cell.entities], ['chest'])
+        self.assertEqual(len(cell.overlays), 1)
+        self.assertEqual(cell.description, 'A chest')
+        cell.description = ''
+        self.assertEqual(self.state.cells_with('description'), [])
+        self.assertEqual(sum(map(len, self.state.side_tables.values())), 2)
+
+    def test_views_have_no_instance_dict(self):
+        cell = self.state.get_cell(2, 3)
+        self.assertFalse(hasattr(cell, '__dict__'))
+        with self.assertRaises(AttributeError):
+            cell.visited = True
+        self.assertEqual((cell.x, cell.y, cell.base_type), (2, 3, self.state.get_flags(2, 3)))
+
+
+class ClientPayload:
+    """What a client keeps of encode_dungeon(), updated with encode_delta()"""
+
+    def __init__(self, payload):
+        self.width = payload['width']
+        self.revision, self.fog_version = payload['revision'], payload['fog_version']
+        self.party_position = payload['party_position']
+        self.flags = bytearray(base64.b64decode(payload['flags']))
+        self.orientation = bytearray(base64.b64decode(payload['orientation']))
+        self.explored = bytearray(base64.b64decode(payload['explored']))
+        self.cells = {(cell['x'], cell['y']): cell for cell in payload['cells']}
+
+    def apply(self, delta):
+        self.revision, self.fog_version = delta['revision'], delta['fog_version']
+        self.party_position = delta['party_position']
+        for x, y in delta['revealed']:
+            index = y * self.width + x
+            self.explored[index >> 3] |= 1 << (index & 7)
+        for cell in delta['cells']:
+            x, y = cell['x'], cell['y']
+            index = y * self.width + x
+            self.flags[index * 4:index * 4 + 4] = cell['flags'].to_bytes(4, 'little')
+            self.orientation[index] = cell['orientation']
+            extras = {key: value for key, value in cell.items() if key not in ('flags', 'orientation')}
+            if len(extras) > 2:
+                self.cells[(x, y)] = extras
+            else:
+                self.cells.pop((x, y), None)
+
+    def snapshot(self):
+        return (self.party_position, bytes(self.flags), bytes(self.orientation), bytes(self.explored),
+                sorted(self.cells.items()))
+
+
+class TestRandomWalk(unittest.TestCase):
+    """
+    300 random moves with DM edits in between: everything kept up to date
+    incrementally (client payload, patched frame, flag-plane visibility)
+    must match computing it from scratch.
+    """
+
+    def test_incremental_matches_full(self):
+        state = make_state('3')
+        tools = DMTools(state)
+        rnd = random.Random(5)
+
+        # Visibility over cell views (the object path of _is_blocking)
+        grid = GridSystem(state.width, state.height)
+        for y in range(state.height):
+            for x in range(state.width):
+                grid.set_cell(x, y, state.get_cell(x, y))
+        reference = VisibilitySystemNeo(grid, state.party_position)
+
+        client = ClientPayload(encode_dungeon(state))
+        renderer = DungeonRendererNeo()
+        with contextlib.redirect_stdout(io.StringIO()):
+            frame = renderer.render(state, visibility_system=state.visibility_system)
+        version = renderer.frame_version()
+
+        secrets = [(x, y) for y in range(state.height) for x in range(state.width)
+                   if state.get_flags(x, y) & CELL_FLAGS['SECRET']]
+        for step in range(300):
+            if step % 40 == 10:
+                x, y = state.party_position
+                tools.add_entity(x, y, rnd.choice(['chest', 'monster', 'trap']))
+                tools.describe_cell(x, y, f'Step {step}')
+            if step % 60 == 30:
+                x, y = state.party_position
+                tools.add_overlay(x, y, 'square', 200, 100, 0, '{"size": 1.6, "rotation": 30}')
+            if step == 150 and secrets:
+                state.reveal_secret(*secrets[0])
+                reference.invalidate_opacity(*secrets[0])
+
+            x, y = state.party_position
+            open_directions = [direction for direction in DIRECTIONS
+                               if state.movement.calculate_movement(x, y, direction)['success']]
+            self.assertTrue(state.movement.move_party(rnd.choice(open_directions))['success'])
+            reference.party_position = state.party_position
+            reference.update_visibility()
+            self.assertEqual(reference.lit, state.visibility_system.lit, step)
+
+            delta = encode_delta(state, client.revision, client.fog_version)
+            self.assertFalse(delta['full'])
+            client.apply(delta)
+            self.assertEqual(client.snapshot(), ClientPayload(encode_dungeon(state)).snapshot(), step)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                version, patches = renderer.render_patches(state, version, visibility_system=state.visibility_system)
+            for patch in patches:
+                frame.paste(patch['image'], (patch['x'], patch['y']))
+            if step % 50 == 49:
+                fresh = DungeonRendererNeo()
+                fresh.sprites = SpriteAtlasNeo(max_sprites=1)  # glyphs rasterized again each time
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = fresh.render(state, visibility_system=state.visibility_system)
+                self.assertEqual(frame.tobytes(), expected.tobytes(), step)
+
+        self.assertEqual(reference.explored, state.visibility_system.explored)
+        # Only the cells written to have side table entries
+        self.assertEqual(len(state.side_tables['entities']), len(state.cells_with('entities')))
+        self.assertLessEqual(sum(map(len, state.side_tables.values())), 3 * 8 + 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
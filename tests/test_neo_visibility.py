@@ -0,0 +1,194 @@
+# tests/test_neo_visibility.py
+import base64
+import unittest
+from collections import deque
+import importlib.util
+from dungeon_neo.constants import CELL_FLAGS
+from dungeon_neo.state_neo import DungeonStateNeo
+from dungeon_neo.visibility_neo import VisibilitySystemNeo
+
+SYMBOLS = {
+    '#': CELL_FLAGS['BLOCKED'],
+    '.': CELL_FLAGS['ROOM'],
+    '+': CELL_FLAGS['DOOR'],
+    "'": CELL_FLAGS['ARCH'],
+    's': CELL_FLAGS['SECRET'],
+}
+
+
+def make_state(rows, position, light_radius=3):
+    """DungeonStateNeo of a map drawn as text, with the party and a visibility system at position"""
+    grid = [[SYMBOLS[symbol] for symbol in row] for row in rows]
+    state = DungeonStateNeo({'n_rows': len(rows) - 1, 'n_cols': len(rows[0]) - 1, 'grid': grid})
+    state.party_position = position
+    state.visibility_system = VisibilitySystemNeo(state.grid_system, position, light_radius)
+    return state
+
+
+# A room, a wall with a closed door, an arch and a secret door in it, and a room behind
+CORRIDOR_MAP = [
+    '#########',
+    '#...#...#',
+    '#...+...#',
+    '#...#...#',
+    "#...'...#",
+    '#...#...#',
+    '#...s...#',
+    '#...#...#',
+    '#########',
+]
+
+
+class TestFieldOfView(unittest.TestCase):
+    def test_walls_block_sight(self):
+        visibility = make_state(CORRIDOR_MAP, (2, 1), light_radius=10).visibility_system
+        self.assertTrue(visibility.is_lit(3, 1))
+        self.assertTrue(visibility.is_lit(4, 1))  # the wall itself is seen
+        self.assertFalse(visibility.is_lit(5, 1))
+        self.assertFalse(visibility.is_lit(7, 1))
+
+    def test_closed_door_blocks_sight(self):
+        visibility = make_state(CORRIDOR_MAP, (3, 2), light_radius=10).visibility_system
+        self.assertTrue(visibility.is_lit(4, 2))
+        self.assertFalse(visibility.is_lit(5, 2))
+        self.assertFalse(visibility.is_lit(6, 2))
+
+    def test_arch_passes_sight(self):
+        visibility = make_state(CORRIDOR_MAP, (3, 4), light_radius=10).visibility_system
+        for x in range(4, 8):
+            self.assertTrue(visibility.is_lit(x, 4), x)
+
+    def test_secret_door_blocks_until_opened(self):
+        state = make_state(CORRIDOR_MAP, (3, 6), light_radius=10)
+        visibility = state.visibility_system
+        self.assertFalse(visibility.is_lit(5, 6))
+
+        # Opening the door alone does not reach the cached opacity
+        state.flags[6 * state.width + 4] = CELL_FLAGS['SECRET'] | CELL_FLAGS['ARCH']
+        visibility.update_visibility()
+        self.assertFalse(visibility.is_lit(5, 6))
+
+        # reveal_secret invalidates the cell
+        self.assertTrue(state.reveal_secret(4, 6))
+        revealed = visibility.update_visibility()
+        self.assertIn((5, 6), revealed)
+        self.assertTrue(visibility.is_lit(7, 6))
+
+    def test_invalidate_all_rebuilds_opacity(self):
+        state = make_state(CORRIDOR_MAP, (3, 2), light_radius=10)
+        visibility = state.visibility_system
+        state.flags[2 * state.width + 4] = CELL_FLAGS['ARCH']
+        visibility.invalidate_opacity()
+        visibility.update_visibility()
+        self.assertTrue(visibility.is_lit(6, 2))
+
+    def test_large_radius(self):
+        rows = ['#' * 43] + ['#' + '.' * 41 + '#' for _ in range(41)] + ['#' * 43]
+        for radius in (10, 15, 20):
+            visibility = make_state(rows, (21, 21), light_radius=radius).visibility_system
+            lit = visibility.visible_cells
+            self.assertIn((21 + radius, 21), lit)
+            self.assertIn((21, 21 - radius), lit)
+            self.assertNotIn((21 + radius + 1, 21), lit)
+            # round, not a diamond: the diagonal reaches past radius / 2 on both axes
+            self.assertIn((21 + radius * 2 // 3, 21 + radius * 2 // 3), lit)
+            self.assertNotIn((21 + radius, 21 + radius), lit)
+
+    def test_pillar_casts_a_shadow(self):
+        rows = ['#' * 21] + ['#' + '.' * 19 + '#' for _ in range(19)] + ['#' * 21]
+        rows[10] = rows[10][:12] + '#' + rows[10][13:]
+        visibility = make_state(rows, (10, 10), light_radius=15).visibility_system
+        self.assertTrue(visibility.is_lit(12, 10))
+        self.assertFalse(visibility.is_lit(14, 10))
+        self.assertFalse(visibility.is_lit(19, 10))
+        self.assertTrue(visibility.is_lit(14, 8))
+
+
+def unpack(mask, width, height):
+    return {(index % width, index // width) for index in range(width * height)
+            if mask[index >> 3] & (1 << (index & 7))}
+
+
+class TestVisibilityDeltas(unittest.TestCase):
+    def setUp(self):
+        rows = ['#' * 31] + ['#' + '.' * 29 + '#' for _ in range(5)] + ['#' * 31]
+        self.state = make_state(rows, (1, 3))
+        self.visibility = self.state.visibility_system
+        self.visibility.update_visibility()
+
+    def walk(self, steps):
+        for x in range(2, 2 + steps):
+            self.state.party_position = (x, 3)
+            self.visibility.update_visibility()
+
+    def test_packed_masks(self):
+        width, height = self.state.width, self.state.height
+        self.assertEqual(len(self.visibility.explored), (width * height + 7) // 8)
+        explored = unpack(self.visibility.explored, width, height)
+        self.assertEqual(explored, self.visibility.visible_cells)
+        self.assertIn((1, 3), explored)
+        self.assertTrue(all(self.visibility.is_visible(x, y) for x, y in explored))
+
+        self.walk(10)
+        lit = unpack(self.visibility.lit, width, height)
+        self.assertIn((11, 3), lit)
+        self.assertNotIn((1, 3), lit)  # out of the light now, still explored
+        self.assertTrue(self.visibility.is_visible(1, 3))
+        self.assertLess(lit, unpack(self.visibility.explored, width, height))
+
+    def test_revealed_since(self):
+        version = self.visibility.version
+        before = self.visibility.visible_cells
+        self.walk(5)
+        revealed = self.visibility.revealed_since(version)
+        self.assertEqual(set(revealed), self.visibility.visible_cells - before)
+        self.assertEqual(len(revealed), len(set(revealed)))
+        self.assertEqual(self.visibility.revealed_since(self.visibility.version), [])
+
+    def test_revealed_since_too_old(self):
+        self.visibility.reveals = deque(maxlen=2)
+        version = self.visibility.version
+        self.walk(5)
+        self.assertIsNone(self.visibility.revealed_since(version))
+        self.assertIsNotNone(self.visibility.revealed_since(self.visibility.version - 2))
+
+
+@unittest.skipUnless(importlib.util.find_spec('ollama'), 'routes.api imports the ollama client')
+class TestDebugStateApi(unittest.TestCase):
+    def setUp(self):
+        from flask import Flask
+        from core.game_state import GameState
+        from routes.api import api_bp
+        app = Flask(__name__)
+        app.game_state = GameState()
+        app.register_blueprint(api_bp, url_prefix='/api')
+        self.client = app.test_client()
+        self.state = app.game_state.dungeon.state
+
+    def test_full_then_delta(self):
+        fog = self.client.get('/api/debug-state').get_json()['visibility_system']
+        width, height = fog['width'], fog['height']
+        explored = unpack(base64.b64decode(fog['explored']), width, height)
+        self.assertEqual(explored, self.state.visibility_system.visible_cells)
+
+        for direction in ('east', 'south', 'west', 'north'):
+            self.client.post('/api/move', json={'direction': direction})
+        delta = self.client.get(f"/api/debug-state?since={fog['version']}").get_json()['visibility_system']
+        self.assertNotIn('explored', delta)
+        self.assertGreater(delta['version'], fog['version'])
+        self.assertEqual(explored | {tuple(cell) for cell in delta['revealed']},
+                         self.state.visibility_system.visible_cells)
+        self.assertEqual(delta['version'], self.state.visibility_system.version)
+
+    def test_too_old_falls_back_to_masks(self):
+        visibility = self.state.visibility_system
+        visibility.reveals.clear()
+        visibility.reveals.append((visibility.version + 2, []))
+        visibility.version += 2
+        fog = self.client.get('/api/debug-state?since=0').get_json()['visibility_system']
+        self.assertIn('explored', fog)
+        self.assertIn('lit', fog)
+
+
+if __name__ == "__main__":
+    unittest.main()
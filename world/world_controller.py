@@ -6,7 +6,7 @@ import uuid
 import numpy as np
 from scipy.ndimage import gaussian_filter
 from typing import Dict, List, Optional, Set, Any
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from dnd_character import CLASSES
 from world.db import Database
@@ -19,6 +19,10 @@ from world.character import Character
 from world.persistence import WorldManager
 from world.ai_integration import WorldAI, DungeonAI # <---- soon we have to work on dungeon too
 from world.world_session import SessionManager
+from dGenStack import DungeonStack
+
+# Dungeon stacks kept open (LRU); evicted stacks are closed and rebuilt from their seeds
+DUNGEON_STACK_SLOTS = 4
 
 import warnings
 warnings.filterwarnings("ignore", message=".*Triton.*")
@@ -118,6 +122,10 @@ class WorldController:
         self.world_ai = WorldAI(world_state=self)
         self.dungeon_ai = None  # Will be initialized when entering dungeon
         self.session_manager = SessionManager()
+        self.dungeon_stacks = OrderedDict()  # location id: DungeonStack, levels built lazily
+        self.dungeon_stack = None
+        self.dungeon_level = 0
+        self.dungeon_position = None  # [row, col] of the party on dungeon_level
 
     def setup_world(self, world_data):
         """Load world data into game systems"""
@@ -305,6 +313,8 @@ class WorldController:
     def travel_to_location(self, location_id: str) -> bool:
         if self.world_map.travel_to(location_id):
             location = self.world_map.get_location(location_id)
+            if self.dungeon_stack is not None and location is not self.current_location:
+                self.leave_dungeon()
             self.current_location = location
             
             # Reveal location when traveled to
@@ -1448,8 +1458,18 @@ class WorldController:
         dungeon_type = self.current_location.dungeon_type
         dungeon_level = self.current_location.dungeon_level
         
-        # Placeholder for actual dungeon generation
-        print(f"Generating {dungeon_type} dungeon (Level {dungeon_level})")
+        # Levels are generated on demand and reused on the next visit
+        self.dungeon_stack = self._dungeon_stack(self.current_location.id)
+        level = dungeon_level or 1
+        dungeon = self.dungeon_stack.level(level)
+        if dungeon is None:
+            self.leave_dungeon()
+            return False
+        self.dungeon_level = level
+        arrival = self.dungeon_stack.arrival(level)
+        if arrival:
+            self.dungeon_moved(*arrival)
+        print(f"Generated {dungeon_type} dungeon (Level {level}): {dungeon.n_rooms} rooms")
 
         # # Transfer party
         # party = self.party_system.get_active_party()
@@ -1466,6 +1486,51 @@ class WorldController:
         # Return to world map after dungeon completion
         return True
 
+    def _dungeon_stack(self, location_id):
+        """Stack of the dungeon under location_id, closing the least recently used one past DUNGEON_STACK_SLOTS"""
+        if location_id not in self.dungeon_stacks:
+            self.dungeon_stacks[location_id] = DungeonStack(location_id, world_seed=self.seed)
+        self.dungeon_stacks.move_to_end(location_id)
+        while len(self.dungeon_stacks) > DUNGEON_STACK_SLOTS:
+            _, evicted = self.dungeon_stacks.popitem(last=False)
+            evicted.close()
+        return self.dungeon_stacks[location_id]
+
+    def dungeon_moved(self, row: int, col: int):
+        """Move the party to (row, col) of the current level; prefetches the level below near a down stair"""
+        if self.dungeon_stack is None:
+            return
+        self.dungeon_position = [row, col]
+        self.dungeon_stack.moved(self.dungeon_level, row, col)
+
+    def change_dungeon_level(self, step: int) -> bool:
+        """Take the stairs step levels down (negative: up); False if there is no such level"""
+        if self.dungeon_stack is None:
+            return False
+        level = self.dungeon_level + step
+        if level < 1:
+            self.leave_dungeon()
+            return True
+        if self.dungeon_stack.level(level) is None:
+            return False
+        if step > 0:
+            position = self.dungeon_stack.arrival(level)
+        else:
+            position = self.dungeon_stack.down_stairs[level]
+        self.dungeon_level = level
+        if position:
+            self.dungeon_moved(*position)
+        return True
+
+    def leave_dungeon(self):
+        """Back to the world map; stops background generation but keeps the built levels"""
+        if self.dungeon_stack is not None:
+            self.dungeon_stack.close()
+        self.dungeon_stack = None
+        self.dungeon_ai = None
+        self.dungeon_level = 0
+        self.dungeon_position = None
+
     def process_command(self, command: str) -> dict:
         """Route commands to appropriate AI system"""
         if self.dungeon_ai:
@@ -262,7 +262,33 @@ def get_location_rumors(location_id):
 @app.route('/api/enter-dungeon', methods=['POST'])
 def enter_dungeon():
     success = world_controller.enter_dungeon()
-    return jsonify({"success": success})
+    return jsonify({
+        "success": success,
+        "level": world_controller.dungeon_level,
+        "position": world_controller.dungeon_position
+    })
+
+@app.route('/api/dungeon/move', methods=['POST'])
+def dungeon_move():
+    data = request.json
+    world_controller.dungeon_moved(data['row'], data['col'])
+    return jsonify({"success": world_controller.dungeon_stack is not None})
+
+@app.route('/api/dungeon/stairs', methods=['POST'])
+def dungeon_stairs():
+    data = request.json
+    step = 1 if data.get('direction', 'down') == 'down' else -1
+    success = world_controller.change_dungeon_level(step)
+    return jsonify({
+        "success": success,
+        "level": world_controller.dungeon_level,
+        "position": world_controller.dungeon_position
+    })
+
+@app.route('/api/leave-dungeon', methods=['POST'])
+def leave_dungeon():
+    world_controller.leave_dungeon()
+    return jsonify({"success": True})
 
 # ===== Party Management Endpoints =====
 @app.route('/api/create-party', methods=['POST'])